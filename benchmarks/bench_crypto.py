@@ -0,0 +1,109 @@
+"""Микротест производительности криптографических классов пакета "encrypted_yd".
+
+Для каждого доступного класса (CryptodomeAES - пакет "pycryptodome", CryptographyAESGCM - пакет "cryptography")
+измеряется скорость потокового шифрования и дешифрования (encrypt_stream/decrypt_stream) случайных данных: без
+исполнителя (в одном потоке) и параллельно - в пуле из заданного количества потоков или процессов. Классы, библиотеки
+которых не установлены, пропускаются. Запуск (из корня репозитория):
+
+    python -m benchmarks.bench_crypto --size-mb 256 --workers 1 2 4 8
+"""
+
+import argparse
+import io
+import json
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from encrypted_yd.cryptography import DEFAULT_SEGMENT_SIZE, CryptodomeAES, CryptographyAESGCM, CryptoInterface
+
+MB = 1024 * 1024
+PASSWORD = b'benchmark'
+BACKENDS = {'CryptodomeAES': CryptodomeAES, 'CryptographyAESGCM': CryptographyAESGCM}
+
+
+def _best_seconds(fn: Any, repeat: int) -> float:
+    """
+    Функция измерения минимального времени выполнения fn за repeat запусков.
+    """
+
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def measure(crypto: CryptoInterface, data: bytes, executor: Optional[Executor], segment_size: int,
+            repeat: int) -> Dict[str, float]:
+    """
+    Функция измерения скорости шифрования и дешифрования данных data (МБ/с).
+    """
+
+    encrypted = b''.join(crypto.encrypt_stream(io.BytesIO(data), segment_size, executor=executor))
+    if b''.join(crypto.decrypt_stream(io.BytesIO(encrypted), executor=executor)) != data:
+        raise RuntimeError('Расшифрованные данные не совпадают с исходными')
+
+    def encrypt() -> None:
+        for _ in crypto.encrypt_stream(io.BytesIO(data), segment_size, executor=executor):
+            pass
+
+    def decrypt() -> None:
+        for _ in crypto.decrypt_stream(io.BytesIO(encrypted), executor=executor):
+            pass
+
+    return {'encrypt_mb_s': len(data) / MB / _best_seconds(encrypt, repeat),
+            'decrypt_mb_s': len(data) / MB / _best_seconds(decrypt, repeat)}
+
+
+def run(backends: List[str], size: int, workers: List[int], pool: str, segment_size: int,
+        repeat: int) -> List[Dict[str, Any]]:
+    data = os.urandom(size)
+    results = []
+    for name in backends:
+        try:
+            crypto = BACKENDS[name](PASSWORD)
+        except ImportError as e:
+            print(f'{name}: пропущен ({e})')
+            continue
+        for n in workers:
+            # Один рабочий - последовательная обработка без исполнителя
+            executor: Optional[Executor] = None
+            if n > 1:
+                executor = ThreadPoolExecutor(n) if pool == 'thread' else ProcessPoolExecutor(n)
+            try:
+                r = measure(crypto, data, executor, segment_size, repeat)
+            finally:
+                if executor is not None:
+                    executor.shutdown(wait=True)
+            results.append(dict(backend=name, workers=n, pool=pool if n > 1 else '-', **r))
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backends', nargs='+', choices=sorted(BACKENDS), default=sorted(BACKENDS))
+    parser.add_argument('--size-mb', type=float, default=64, help='объем шифруемых данных, МБ')
+    parser.add_argument('--workers', type=int, nargs='+', default=sorted({1, os.cpu_count() or 1}),
+                        help='количество рабочих потоков/процессов (1 - без исполнителя)')
+    parser.add_argument('--pool', choices=('thread', 'process'), default='thread', help='вид исполнителя')
+    parser.add_argument('--segment-kb', type=int, default=DEFAULT_SEGMENT_SIZE // 1024, help='размер сегмента, КБ')
+    parser.add_argument('--repeat', type=int, default=3, help='количество запусков (берется лучший)')
+    parser.add_argument('--json', action='store_true', help='вывести результаты в формате JSON')
+    args = parser.parse_args(argv)
+
+    results = run(args.backends, int(args.size_mb * MB), args.workers, args.pool, args.segment_kb * 1024,
+                  args.repeat)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f'{"backend":<20} {"pool":<8} {"workers":>7} {"encrypt MB/s":>13} {"decrypt MB/s":>13}')
+    for r in results:
+        print(f'{r["backend"]:<20} {r["pool"]:<8} {r["workers"]:>7} {r["encrypt_mb_s"]:>13.1f} '
+              f'{r["decrypt_mb_s"]:>13.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""Тест времени импорта пакета "encrypted_yd".
+
+Каждый модуль импортируется в отдельном "холодном" процессе интерпретатора (python -X importtime) в пустой временной
+директории. Измеряется общее время импорта модуля (медиана по нескольким запускам) и выводятся модули с наибольшим
+собственным временем импорта. Кроме того, проверяется, что импорт не имеет побочных эффектов:
+
+    - не загружаются сторонние и "тяжелые" модули, которые нужны только при работе (yadisk, Crypto, requests, asyncio
+      и т. п.);
+    - в текущей директории не создаются файлы (например, журнал logger.log).
+
+При нарушении этих условий или превышении порога --max-ms процесс завершается с кодом 1, поэтому тест можно
+использовать для защиты от регрессий. Запуск (из корня репозитория):
+
+    python -m benchmarks.bench_import --repeat 5 --max-ms 150
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Any, Dict, List, Optional, Tuple
+
+# Модули, которые не должны загружаться при импорте основного модуля пакета
+FORBIDDEN_MODULES = ('yadisk', 'yadisk_async', 'aiohttp', 'requests', 'Crypto', 'cryptography', 'zstandard', 'asyncio',
+                     'sqlite3', 'email.utils', 'numpy')
+
+_PROBE = 'import sys, json; import {module}; print(json.dumps(sorted(sys.modules)))'
+
+
+def _parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    """
+    Функция разбора вывода python -X importtime: список (модуль, собственное время, общее время) в мкс.
+    """
+
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def measure(module: str, workdir: str) -> Dict[str, Any]:
+    """
+    Функция однократного импорта модуля в отдельном процессе.
+    """
+
+    env = dict(os.environ)
+    # Модули пакета берутся из корня репозитория, даже если тест запущен из другой директории
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, (env.get('PYTHONPATH'), root)))
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', _PROBE.format(module=module)],
+                               cwd=workdir, env=env, capture_output=True, text=True, check=True)
+    rows = _parse_importtime(completed.stderr)
+    return {
+        'ms': next(cumulative for name, _, cumulative in rows if name == module) / 1000,
+        'rows': rows,
+        'modules': json.loads(completed.stdout),
+        'created_files': sorted(os.listdir(workdir)),
+    }
+
+
+def run(module: str, repeat: int, top: int) -> Dict[str, Any]:
+    """
+    Функция измерения времени импорта модуля (repeat запусков) и проверки отсутствия побочных эффектов.
+    """
+
+    samples = []
+    for _ in range(repeat):
+        workdir = tempfile.mkdtemp(prefix='encrypted_yd_import_')
+        try:
+            samples.append(measure(module, workdir))
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    last = samples[-1]
+    forbidden = [f for f in FORBIDDEN_MODULES
+                 if any(name == f or name.startswith(f + '.') for name in last['modules'])]
+    slowest = sorted(last['rows'], key=lambda row: -row[1])[:top]
+    return {
+        'module': module,
+        'median_ms': statistics.median(s['ms'] for s in samples),
+        'min_ms': min(s['ms'] for s in samples),
+        'forbidden_modules': forbidden,
+        'created_files': sorted({f for s in samples for f in s['created_files']}),
+        'slowest': [{'module': name, 'self_ms': self_us / 1000} for name, self_us, _ in slowest],
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modules', nargs='+', default=['encrypted_yd.encrypted_yd'], help='импортируемые модули')
+    parser.add_argument('--repeat', type=int, default=5, help='количество запусков для каждого модуля')
+    parser.add_argument('--top', type=int, default=10, help='количество выводимых самых медленных модулей')
+    parser.add_argument('--max-ms', type=float, default=None, help='допустимое время импорта (медиана), мс')
+    parser.add_argument('--json', action='store_true', help='вывести результаты в формате JSON')
+    args = parser.parse_args(argv)
+
+    results = [run(module, args.repeat, args.top) for module in args.modules]
+    failed = False
+    for r in results:
+        r['ok'] = (not r['forbidden_modules'] and not r['created_files']
+                   and (args.max_ms is None or r['median_ms'] <= args.max_ms))
+        failed = failed or not r['ok']
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for r in results:
+            print(f'{r["module"]}: median {r["median_ms"]:.1f} ms, min {r["min_ms"]:.1f} ms'
+                  f'{"" if r["ok"] else "  FAILED"}')
+            if r['forbidden_modules']:
+                print(f'  forbidden modules loaded: {", ".join(r["forbidden_modules"])}')
+            if r['created_files']:
+                print(f'  files created in cwd: {", ".join(r["created_files"])}')
+            for row in r['slowest']:
+                print(f'  {row["self_ms"]:8.2f} ms  {row["module"]}')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
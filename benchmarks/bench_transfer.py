@@ -0,0 +1,244 @@
+"""Набор воспроизводимых тестов производительности пакета "encrypted_yd".
+
+Вместо YD используется коннектор ConnectorLocalFS (локальная директория с необязательной эмуляцией задержки
+обращений к API и ограниченной скорости передачи данных), поэтому токен и доступ к сети не требуются.
+
+Для каждого сценария (синтетического дерева файлов) измеряются операции send_files_and_dirs, list_files_and_dirs
+(обход всего дерева на YD) и receive_files_and_dirs: количество файлов и мегабайт в секунду, пиковый объем
+резидентной памяти (peak RSS) и количество обращений к API по видам. С ключом --metrics дополнительно выводится
+собственное время этапов обработки данных и обращений к API (см. модуль encrypted_yd.metrics). Каждая операция выполняется в отдельном процессе,
+чтобы пиковый объем памяти относился только к ней.
+
+Запуск (из корня репозитория):
+
+    python -m benchmarks.bench_transfer --scenarios small huge deep --workers 4 --latency 0.02
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+APP_BASE_PATH = '/Приложения/bench'
+PASSWORD = 'benchmark'
+
+MB = 1024 * 1024
+
+
+def _write_random(path: str, size: int, rng: random.Random) -> None:
+    with open(path, 'wb') as f:
+        while size > 0:
+            block = min(size, 4 * MB)
+            f.write(rng.randbytes(block))
+            size -= block
+
+
+def make_small_files(root: str, rng: random.Random, scale: float) -> None:
+    """
+    Сценарий "много мелких файлов": файлы от 1 до 8 КБ в 20 директориях.
+    """
+
+    for i in range(max(1, int(2000 * scale))):
+        d = os.path.join(root, f'dir{i % 20:02d}')
+        os.makedirs(d, exist_ok=True)
+        _write_random(os.path.join(d, f'file{i:05d}.bin'), rng.randint(1024, 8 * 1024), rng)
+
+
+def make_huge_files(root: str, rng: random.Random, scale: float) -> None:
+    """
+    Сценарий "несколько больших файлов": 3 файла по 32 МБ.
+    """
+
+    for i in range(3):
+        _write_random(os.path.join(root, f'huge{i}.bin'), max(1, int(32 * MB * scale)), rng)
+
+
+def make_deep_tree(root: str, rng: random.Random, scale: float) -> None:
+    """
+    Сценарий "глубокая вложенность": цепочка из 40 вложенных директорий с двумя файлами по 16 КБ в каждой.
+    """
+
+    d = root
+    for level in range(max(1, int(40 * scale))):
+        d = os.path.join(d, f'level{level:02d}')
+        os.makedirs(d)
+        for i in range(2):
+            _write_random(os.path.join(d, f'file{i}.bin'), 16 * 1024, rng)
+
+
+SCENARIOS: Dict[str, Callable[[str, random.Random, float], None]] = {
+    'small': make_small_files,
+    'huge': make_huge_files,
+    'deep': make_deep_tree,
+}
+
+
+def _tree_stats(root: str) -> Tuple[int, int]:
+    """
+    Функция подсчета количества и общего размера файлов в локальном дереве.
+    """
+
+    files, size = 0, 0
+    for local_root, _, names in os.walk(root):
+        for name in names:
+            files += 1
+            size += os.path.getsize(os.path.join(local_root, name))
+    return files, size
+
+
+def _peak_rss_mb() -> Optional[float]:
+    """
+    Функция получения пикового объема резидентной памяти текущего процесса в МБ (None, если недоступно).
+    """
+
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # В Linux значение возвращается в КБ, в macOS - в байтах
+    return peak / MB if sys.platform == 'darwin' else peak / 1024
+
+
+def _run_operation(operation: str, local_path: str, remote_root: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Функция выполнения одной операции (выполняется в отдельном процессе).
+    """
+
+    from loguru import logger
+
+    from encrypted_yd.connector import ConnectorLocalFS
+    from encrypted_yd.cryptography import CryptodomeAES
+    from encrypted_yd.encrypted_yd import EncryptedYandexDisk
+    from encrypted_yd.metrics import Metrics
+    from encrypted_yd.scheduler import SchedulePolicy
+
+    # Вывод отладочных сообщений по каждому файлу искажает результаты измерений
+    logger.remove()
+    logger.add(sys.stderr, level='WARNING')
+
+    connectors: List[ConnectorLocalFS] = []
+
+    def connector(token: str) -> ConnectorLocalFS:
+        c = ConnectorLocalFS(token, root=remote_root, latency=options['latency'], bandwidth=options['bandwidth'])
+        connectors.append(c)
+        return c
+
+    encrypted_token = CryptodomeAES(PASSWORD.encode('utf-8')).encrypt_data(b'local')
+    metrics = Metrics() if options['metrics'] else None
+    eyd = EncryptedYandexDisk(APP_BASE_PATH, encrypted_token, PASSWORD, connector=connector, metrics=metrics)
+
+    schedule = SchedulePolicy(options['order'], options['large_threshold'])
+
+    start = time.perf_counter()
+    failed = 0
+    if operation == 'send':
+        failed = len(eyd.send_files_and_dirs(local_path, APP_BASE_PATH, max_workers=options['workers'],
+                                             pack_threshold=options['pack_threshold'], schedule=schedule).failed)
+    elif operation == 'list':
+        pending = [APP_BASE_PATH]
+        while pending:
+            remote_dir_path = pending.pop()
+            listing = eyd.list_files_and_dirs(remote_dir_path)
+            pending.extend(remote_dir_path + '/' + uuid
+                           for uuid, (_, _, obj_type) in listing['uuids'].items() if obj_type == 'dir')
+    elif operation == 'receive':
+        failed = len(eyd.receive_files_and_dirs(local_path, APP_BASE_PATH, max_workers=options['workers'],
+                                                schedule=schedule).failed)
+    elapsed = time.perf_counter() - start
+
+    phases = {name: stats.seconds for name, stats in metrics.snapshot().items()} if metrics is not None else {}
+    return {'seconds': elapsed, 'failed': failed, 'peak_rss_mb': _peak_rss_mb(), 'calls': dict(connectors[0].calls),
+            'phases': phases}
+
+
+def run_scenario(name: str, workdir: str, options: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Функция выполнения всех операций для одного сценария.
+    """
+
+    source = os.path.join(workdir, name, 'source')
+    target = os.path.join(workdir, name, 'target')
+    remote_root = os.path.join(workdir, name, 'remote')
+    for path in (source, target):
+        os.makedirs(path)
+    os.makedirs(os.path.join(remote_root, 'disk', *APP_BASE_PATH.strip('/').split('/')))
+    SCENARIOS[name](source, random.Random(options['seed']), options['scale'])
+    files, size = _tree_stats(source)
+
+    results = []
+    for operation, local_path in (('send', source), ('list', source), ('receive', target)):
+        # Процесс создается заново для каждой операции (spawn), чтобы пиковый объем памяти не накапливался
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+            result = executor.submit(_run_operation, operation, local_path, remote_root, options).result()
+        seconds = max(result['seconds'], 1e-9)
+        result.update({
+            'scenario': name,
+            'operation': operation,
+            'files': files,
+            'mb': size / MB,
+            'files_per_s': files / seconds,
+            'mb_per_s': size / MB / seconds if operation != 'list' else None,
+        })
+        results.append(result)
+    return results
+
+
+def _format(results: List[Dict[str, Any]]) -> str:
+    lines = [f'{"scenario":<8} {"op":<8} {"files":>7} {"MB":>8} {"sec":>8} {"files/s":>10} {"MB/s":>8} '
+             f'{"RSS MB":>8}  calls']
+    for r in results:
+        mb_per_s = f'{r["mb_per_s"]:8.1f}' if r['mb_per_s'] is not None else f'{"-":>8}'
+        rss = f'{r["peak_rss_mb"]:8.1f}' if r['peak_rss_mb'] is not None else f'{"-":>8}'
+        calls = ', '.join(f'{k}={v}' for k, v in sorted(r['calls'].items()))
+        lines.append(f'{r["scenario"]:<8} {r["operation"]:<8} {r["files"]:>7} {r["mb"]:8.1f} {r["seconds"]:8.2f} '
+                     f'{r["files_per_s"]:10.1f} {mb_per_s} {rss}  {calls}')
+        if r['phases']:
+            lines.append(' ' * 18 + 'phases: ' + ', '.join(
+                f'{k}={v:.3f}s' for k, v in sorted(r['phases'].items(), key=lambda item: -item[1])))
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', nargs='+', choices=sorted(SCENARIOS), default=sorted(SCENARIOS))
+    parser.add_argument('--scale', type=float, default=1.0, help='множитель количества/размера файлов сценариев')
+    parser.add_argument('--workers', type=int, default=1, help='количество рабочих потоков (max_workers)')
+    parser.add_argument('--latency', type=float, default=0.0, help='задержка каждого обращения к API, с')
+    parser.add_argument('--bandwidth', type=float, default=None, help='скорость передачи данных, байт/с')
+    parser.add_argument('--seed', type=int, default=0, help='начальное значение генератора содержимого файлов')
+    parser.add_argument('--workdir', default=None, help='рабочая директория (по умолчанию - временная)')
+    parser.add_argument('--metrics', action='store_true', help='измерять время этапов обработки данных')
+    parser.add_argument('--pack-threshold', type=int, default=None,
+                        help='упаковывать файлы меньше указанного размера (байт) в пакеты')
+    parser.add_argument('--order', choices=('fifo', 'small_first', 'largest_first'), default='fifo',
+                        help='порядок передачи файлов')
+    parser.add_argument('--large-threshold', type=int, default=None,
+                        help='передавать файлы не меньше указанного размера (байт) в отдельной очереди')
+    parser.add_argument('--json', action='store_true', help='вывести результаты в формате JSON')
+    args = parser.parse_args(argv)
+
+    options = {'scale': args.scale, 'workers': args.workers, 'latency': args.latency,
+               'bandwidth': args.bandwidth, 'seed': args.seed, 'metrics': args.metrics,
+               'pack_threshold': args.pack_threshold, 'order': args.order, 'large_threshold': args.large_threshold}
+    workdir = args.workdir or tempfile.mkdtemp(prefix='encrypted_yd_bench_')
+    try:
+        results = []
+        for name in args.scenarios:
+            results.extend(run_scenario(name, workdir, options))
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(json.dumps(results, indent=2) if args.json else _format(results))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""Модуль для описания асинхронных коннекторов, работающих с YD.
+
+Асинхронные коннекторы предназначены для использования пакета в приложениях на основе asyncio (например, aiohttp)
+без блокировки цикла событий и без занятия потоков исполнителя на время сетевого обмена.
+В настоящее время в качестве асинхронного коннектора используется класс стороннего модуля "yadisk-async".
+"""
+
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, AsyncIterable, AsyncIterator, Callable, Dict, List, Optional
+
+if TYPE_CHECKING:
+    import aiohttp
+
+# Размер блока, которыми читается тело HTTP-ответа при потоковом скачивании
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+
+class AsyncConnectorInterface(ABC):
+    """
+    Интерфейс, который должны поддерживать асинхронные коннекторы для обеспечения необходимого функционала работы с YD.
+    """
+
+    @abstractmethod
+    def __init__(self, token: str) -> None:
+        """
+        Метод для инициализации коннектора.
+        """
+        pass
+
+    @abstractmethod
+    async def upload_stream(self, data: AsyncIterable[bytes], remote_path: str,
+                            properties: Optional[Callable[[], Dict]] = None) -> None:
+        """
+        Метод для отправки на YD данных из асинхронного итератора по блокам байтов.
+
+        Функция properties - как у ConnectorInterface.upload_stream.
+        """
+        pass
+
+    @abstractmethod
+    def download_stream(self, remote_path: str) -> AsyncIterator[bytes]:
+        """
+        Метод для скачивания файла с YD в виде асинхронного итератора по блокам байтов.
+        """
+        pass
+
+    @abstractmethod
+    async def remove(self, remote_path: str, permanently: bool) -> None:
+        """
+        Метод для удаления файла/директории на YD.
+
+        Параметр permanently указывает, удалять ли файл/директорию безвозвратно (True) или нет
+        (помещать в корзину - False).
+        """
+        pass
+
+    @abstractmethod
+    async def patch(self, remote_path: str, properties: Dict) -> Optional[Dict]:
+        """
+        Метод для получения или задания свойств файла или директории c/на YD в специальной структуре.
+        """
+        pass
+
+    @abstractmethod
+    async def mkdir(self, remote_path: str, properties: Optional[Dict] = None) -> None:
+        """
+        Метод для создания директории на YD (если задана структура properties, то она прикрепляется к директории).
+        """
+        pass
+
+    @abstractmethod
+    async def listdir(self, remote_path: str) -> List[Dict]:
+        """
+        Метод для получения списка файлов и/или директорий по указанному пути на YD.
+        """
+        pass
+
+    @abstractmethod
+    async def close(self) -> None:
+        """
+        Метод для закрытия сетевых соединений коннектора.
+        """
+        pass
+
+
+class AsyncConnectorYaDisk(AsyncConnectorInterface):
+    """
+    Класс, использующий модуль "yadisk-async" для работы с YD (модули "yadisk-async" и "aiohttp" импортируются при
+    создании коннектора).
+    """
+
+    def __init__(self, token: str) -> None:
+        import yadisk_async
+
+        self._yd = yadisk_async.YaDisk(token=token)
+        # Сессия для потоковой передачи данных по ссылкам, полученным через API YD. Создается при первом
+        # обращении, т. к. aiohttp требует наличия запущенного цикла событий.
+        self._session: Optional['aiohttp.ClientSession'] = None
+
+    def _get_session(self) -> 'aiohttp.ClientSession':
+        import aiohttp
+
+        if self._session is None:
+            self._session = aiohttp.ClientSession()
+        return self._session
+
+    async def upload_stream(self, data: AsyncIterable[bytes], remote_path: str,
+                            properties: Optional[Callable[[], Dict]] = None) -> None:
+        # Тело запроса передается по частям (chunked transfer encoding) по мере шифрования
+        link = await self._yd.get_upload_link(remote_path)
+        async with self._get_session().put(link, data=data) as response:
+            response.raise_for_status()
+        # API YD не позволяет задать свойства при загрузке файла - они задаются отдельным запросом
+        if properties is not None:
+            await self._yd.patch(remote_path, properties=properties())
+
+    async def download_stream(self, remote_path: str) -> AsyncIterator[bytes]:
+        link = await self._yd.get_download_link(remote_path)
+        async with self._get_session().get(link) as response:
+            response.raise_for_status()
+            async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                yield chunk
+
+    async def remove(self, remote_path: str, permanently: bool) -> None:
+        await self._yd.remove(remote_path, permanently=permanently)
+
+    async def patch(self, remote_path: str, properties: Dict) -> Optional[Dict]:
+        return await self._yd.patch(remote_path, properties=properties)
+
+    async def mkdir(self, remote_path: str, properties: Optional[Dict] = None) -> None:
+        await self._yd.mkdir(remote_path)
+        if properties:
+            await self._yd.patch(remote_path, properties=properties)
+
+    async def listdir(self, remote_path: str) -> List[Dict]:
+        return [_ async for _ in await self._yd.listdir(remote_path)]
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        await self._yd.close()
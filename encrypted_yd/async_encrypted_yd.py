@@ -0,0 +1,337 @@
+"""Модуль с описанием асинхронного класса "AsyncEncryptedYandexDisk" пакета "encrypted_yd".
+
+Сетевой обмен выполняется асинхронным коннектором (AsyncConnectorInterface), а ресурсоемкие операции (шифрование,
+дешифрование, чтение и запись локальных файлов, обход локального дерева) выносятся в исполнитель (executor), чтобы
+не блокировать цикл событий.
+"""
+
+import os
+import asyncio
+from concurrent.futures import Executor
+from typing import Any, AsyncIterator, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+from uuid import uuid4
+
+from loguru import logger
+
+from .async_connector import AsyncConnectorYaDisk
+from .compression import Codec, StreamDecompressor, get_codec
+from .cryptography import StreamDecryptor, iter_hashed
+from .encrypted_yd import EncryptedYandexDiskBase
+from .transfer import AsyncTransferPool, TransferResult
+
+T = TypeVar('T')
+
+# Признак исчерпания итератора, выполняемого в исполнителе
+_STOP = object()
+
+
+def _write_blocks(f: BinaryIO, decompressor: Optional[StreamDecompressor], fn: Callable[..., Any],
+                  *args: Any) -> None:
+    """
+    Функция записи в файл блоков, возвращаемых fn (выполняется в исполнителе). Если задан decompressor, то блоки
+    перед записью распаковываются.
+    """
+
+    for block in fn(*args):
+        for data in (decompressor.update(block) if decompressor is not None else [block]):
+            f.write(data)
+
+
+class AsyncEncryptedYandexDisk(EncryptedYandexDiskBase):
+    """
+    Асинхронный класс для хранения файлов на YD в зашифрованном виде.
+
+    Повторяет функционал EncryptedYandexDisk (send_files_and_dirs, receive_files_and_dirs, list_files_and_dirs,
+    remove) в виде сопрограмм. Количество одновременно передаваемых файлов ограничивается семафором (параметр
+    max_concurrency). Параметр executor задает исполнитель для ресурсоемких операций (по умолчанию используется
+    исполнитель цикла событий).
+
+    Экземпляр класса следует закрывать после использования (метод close или "async with").
+    """
+
+    default_connector = AsyncConnectorYaDisk
+
+    def __init__(self, *args: Any, executor: Optional[Executor] = None, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._executor = executor
+
+    async def __aenter__(self) -> 'AsyncEncryptedYandexDisk':
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        """
+        Функция закрытия сетевых соединений коннектора.
+        """
+
+        await self._yd.close()
+
+    async def _run_in_executor(self, fn: Callable[..., T], *args: Any) -> T:
+        """
+        Функция выполнения блокирующей функции в исполнителе.
+        """
+
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def _iterate_in_executor(self, iterator: Iterator[T]) -> AsyncIterator[T]:
+        """
+        Асинхронный генератор, получающий элементы блокирующего итератора в исполнителе.
+
+        Используется для потокового шифрования (чтение файла и шифрование очередного сегмента выполняются вне цикла
+        событий) и для обхода локального дерева.
+        """
+
+        while True:
+            item = await self._run_in_executor(next, iterator, _STOP)
+            if item is _STOP:
+                return
+            yield item  # type: ignore[misc]
+
+    async def send_files_and_dirs(self, local_path: str, remote_dir_path: str, max_concurrency: int = 4,
+                                  compression: Optional[str] = None) -> TransferResult:
+        """
+        Функция рекурсивной отправки файлов и директорий на YD.
+
+        Одновременно отправляется не более max_concurrency файлов. Директории создаются на YD до того, как начнется
+        отправка их содержимого. Ошибки при отправке отдельных файлов/директорий возвращаются в сводке TransferResult.
+        Параметр compression - как у EncryptedYandexDisk.send_files_and_dirs.
+        """
+
+        local_path = local_path.replace('\\', '/').rstrip('/')
+        remote_dir_path = self._prepare_remote_path(remote_dir_path)
+        codec = get_codec(compression) if compression else None
+
+        if (await self._yd.patch(remote_dir_path, properties={}))['type'] != 'dir':
+            error_str = 'Ошибка: Вы указали неверное имя каталога на ЯндексДиске.'
+            logger.error(error_str)
+            raise ValueError(error_str)
+
+        async with AsyncTransferPool(max_concurrency, TransferResult()) as pool:
+            # Отправляем директорию
+            if os.path.isdir(local_path):
+                # Создаем словарь соответствий путей локальных директорий их путям на YD
+                paths_dict = dict()
+                paths_dict[local_path] = remote_dir_path
+
+                async for local_root, dirs, files in self._iterate_in_executor(os.walk(local_path)):
+                    # Сразу преобразуем local_root к необходимому виду
+                    local_root = local_root.replace('\\', '/')
+
+                    try:
+                        # Получаем список файлов и каталогов на YD для конкретной директории
+                        list_files_and_dirs = await self.list_files_and_dirs(paths_dict[local_root])
+                    except Exception as e:
+                        # Содержимое директории отправить не получится - пропускаем все поддерево
+                        pool.fail(local_root, e)
+                        dirs.clear()
+                        continue
+
+                    # Директории создаются до постановки в очередь файлов из них (os.walk обходит дерево сверху вниз)
+                    for d in list(dirs):
+                        try:
+                            paths_dict[local_root + '/' + d] = await self._send_dir(
+                                local_root + '/' + d, paths_dict[local_root], list_files_and_dirs)
+                        except Exception as e:
+                            # Директорию создать не удалось - ее поддерево не обходим
+                            pool.fail(local_root + '/' + d, e)
+                            dirs.remove(d)
+
+                    for f in files:
+                        if f in list_files_and_dirs['names']:
+                            logger.debug(f'Файл "{f}" уже есть на ЯндексДиске... пропускаем.')
+                            pool.result.skipped.append(local_root + '/' + f)
+                        else:
+                            await pool.submit(local_root + '/' + f, self._send_file, local_root + '/' + f,
+                                              paths_dict[local_root], codec)
+            # Отправляем файл
+            else:
+                remote_files = await self.list_files_and_dirs(remote_dir_path)
+                if os.path.basename(local_path) in remote_files['names']:
+                    logger.debug(f'Файл "{os.path.basename(local_path)}" уже есть на ЯндексДиске... пропускаем.')
+                    pool.result.skipped.append(local_path)
+                else:
+                    await pool.submit(local_path, self._send_file, local_path, remote_dir_path, codec)
+
+        return pool.result
+
+    async def _send_dir(self, local_path: str, remote_dir_path: str, list_files_and_dirs: Dict[str, Dict]) -> str:
+        """
+        Функция создания на YD директории, соответствующей локальной директории local_path.
+
+        Возвращает путь к директории на YD (с измененным именем).
+        """
+
+        d = os.path.basename(local_path)
+        if d in list_files_and_dirs['names']:
+            logger.debug(f'Директория "{d}" уже существует на YD, она не будет создана повторно.')
+            return remote_dir_path + '/' + next(iter(list_files_and_dirs['names'][d]))
+
+        logger.debug(f'Директории "{d}" нет на YD, она будет создана с измененным именем.')
+        properties = await self._run_in_executor(self._prepare_properties, d, os.path.getsize(local_path), None, 'dir')
+        remote_root = remote_dir_path + '/' + str(uuid4())
+        await self._yd.mkdir(remote_root, properties)
+        self._manifest_add(remote_dir_path, remote_root.rsplit('/', 1)[-1], d, os.path.getsize(local_path), 'dir')
+        return remote_root
+
+    async def _send_file(self, local_path: str, remote_dir_path: str, codec: Optional[Codec]) -> bool:
+        """
+        Функция отправки одного файла на YD.
+
+        Файл читается и шифруется по сегментам в исполнителе, зашифрованные сегменты сразу передаются в тело
+        HTTP-запроса.
+        """
+
+        st = os.stat(local_path)
+        new_file_name = str(uuid4())
+        remote_path = self._prepare_remote_path(remote_dir_path + '/' + new_file_name)
+        logger.debug(f'Отправляем файл "{local_path}" (измененное имя "{new_file_name}") на YD')
+        # За тот же проход, что и шифрование, вычисляется ключевой хеш содержимого
+        hasher = self._crypto.new_keyed_hash()
+        with open(local_path, "rb") as f:
+            blocks, meta = await self._run_in_executor(self._compress_blocks, iter_hashed(f, hasher), codec)
+
+            def properties() -> Dict:
+                # Свойства формируются коннектором после передачи данных (когда известен хеш содержимого)
+                meta.update(self._file_meta(st, hasher))
+                return self._prepare_properties(os.path.basename(local_path), st.st_size, meta)
+
+            await self._yd.upload_stream(self._iterate_in_executor(self._crypto.encrypt_stream(blocks)), remote_path,
+                                         properties)
+        self._manifest_add(remote_dir_path, new_file_name, os.path.basename(local_path), st.st_size, 'file', meta)
+        return True
+
+    async def list_files_and_dirs(self, remote_path: str, refresh: bool = False) -> Dict[str, Dict]:
+        """
+        Функция получения списка файлов и директорий с YD (формат результата и использование манифеста - как у
+        EncryptedYandexDisk).
+
+        Метаданные расшифровываются в исполнителе. Члены пакетов мелких файлов (см. модуль bundle) асинхронным классом
+        в список не добавляются, поэтому список директории с пакетами в манифест не сохраняется.
+        """
+
+        remote_path = self._prepare_remote_path(remote_path)
+        if not refresh:
+            listing = await self._run_in_executor(self._listing_from_manifest, remote_path)
+            if listing is not None:
+                return listing
+
+        properties = await self._yd.listdir(remote_path)
+        listing = await self._run_in_executor(self._build_listing, remote_path, properties)
+        if all(obj_type != 'bundle' for _, _, obj_type in listing['uuids'].values()):
+            await self._run_in_executor(self._store_listing, remote_path, listing)
+        return listing
+
+    async def receive_files_and_dirs(self, local_dir_path: str, remote_path: str,
+                                     max_concurrency: int = 4) -> TransferResult:
+        """
+        Функция рекурсивного скачивания файлов и директорий с YD.
+
+        Одновременно скачивается не более max_concurrency файлов. Ошибки при скачивании отдельных файлов/директорий
+        возвращаются в сводке TransferResult.
+        """
+
+        remote_path = self._prepare_remote_path(remote_path)
+        local_dir_path = local_dir_path.replace('/', os.path.sep)
+        if not os.path.isdir(local_dir_path) or not os.path.exists(local_dir_path):
+            error_str = f'Ошибка: входной каталог "{local_dir_path}" недоступен или не существует.'
+            logger.error(error_str)
+            raise ValueError(error_str)
+
+        # Получаем структуру со свойствами файла/директории с YD (в соответствии с API YD)
+        properties = await self._yd.patch(remote_path, properties={})
+
+        async with AsyncTransferPool(max_concurrency, TransferResult()) as pool:
+            if properties['type'] == 'dir':
+                await self._receive(local_dir_path, remote_path, pool)
+            else:
+                listing = await self._run_in_executor(self._build_listing, remote_path, [properties])
+                obj_name = next(iter(listing['names']))
+                await pool.submit(os.path.join(local_dir_path, obj_name), self._receive_file,
+                                  os.path.join(local_dir_path, obj_name), remote_path,
+                                  next(iter(listing['meta'].values())))
+
+        return pool.result
+
+    async def _receive(self, local_dir_path: str, remote_path: str, pool: AsyncTransferPool) -> None:
+        """
+        Функция обхода дерева на YD (как у EncryptedYandexDisk): директории создаются локально, файлы ставятся
+        в очередь пула. Необработанные директории хранятся в стеке (локальный путь, путь на YD).
+        """
+
+        pending: List[Tuple[str, str]] = [(local_dir_path, remote_path)]
+        while pending:
+            local_path, remote_dir_path = pending.pop()
+            try:
+                await self._receive_dir(local_path, remote_dir_path, pool, pending)
+            except Exception as e:
+                pool.fail(local_path, e)
+
+    async def _receive_dir(self, local_dir_path: str, remote_path: str, pool: AsyncTransferPool,
+                           pending: List[Tuple[str, str]]) -> None:
+        """
+        Функция обработки одной директории при обходе дерева: файлы ставятся в очередь пула, вложенные директории
+        создаются локально и помещаются в стек pending.
+        """
+
+        list_files_and_dirs = await self.list_files_and_dirs(remote_path)
+
+        for _ in list_files_and_dirs['names']:
+            uuid = next(iter(list_files_and_dirs['names'][_]))
+            if list_files_and_dirs['uuids'][uuid][2] == 'dir':
+                try:
+                    logger.debug(f'Скачиваем директорию "{_}"')
+                    os.makedirs(os.path.join(local_dir_path, _), exist_ok=True)
+                except Exception as e:
+                    pool.fail(os.path.join(local_dir_path, _), e)
+                    continue
+                pending.append((os.path.join(local_dir_path, _), remote_path + '/' + uuid))
+            else:
+                await pool.submit(os.path.join(local_dir_path, _), self._receive_file,
+                                  os.path.join(local_dir_path, _), remote_path + '/' + uuid,
+                                  list_files_and_dirs['meta'].get(uuid, dict()))
+
+        # Пакеты мелких файлов не пропускаем молча - сообщаем о них как об ошибке
+        for uuid, (_, _, obj_type) in list_files_and_dirs['uuids'].items():
+            if obj_type == 'bundle':
+                pool.fail(os.path.join(local_dir_path, uuid), ValueError(
+                    f'Ошибка: пакет мелких файлов "{remote_path}/{uuid}" не поддерживается асинхронным классом, '
+                    f'используйте EncryptedYandexDisk.'))
+
+    async def _receive_file(self, local_file_path: str, remote_path: str, meta: Dict) -> bool:
+        """
+        Функция скачивания одного файла с YD.
+
+        Блоки тела HTTP-ответа дешифруются и записываются в файл в исполнителе. Файлы, отправленные в режиме
+        дедупликации или по частям, асинхронным классом не поддерживаются.
+        """
+
+        if meta.get('layout') in ('chunks', 'parts'):
+            error_str = (f'Ошибка: файл "{local_file_path}" отправлен в режиме дедупликации или по частям, '
+                         f'используйте EncryptedYandexDisk.')
+            logger.error(error_str)
+            raise ValueError(error_str)
+
+        logger.debug(f'Скачиваем файл "{local_file_path}"')
+        decryptor = StreamDecryptor(self._crypto)
+        decompressor = StreamDecompressor(get_codec(meta['codec'])) if meta.get('codec') else None
+        # Файл открывается до блока try: если его не удалось создать, то удалять нечего
+        f = open(local_file_path, mode='wb')
+        try:
+            with f:
+                async for chunk in self._yd.download_stream(remote_path):
+                    await self._run_in_executor(_write_blocks, f, decompressor, decryptor.update, chunk)
+                await self._run_in_executor(_write_blocks, f, decompressor, decryptor.finalize)
+                if decompressor is not None:
+                    await self._run_in_executor(_write_blocks, f, None, decompressor.finalize)
+        except Exception:
+            # Файл не удалось скачать полностью или он поврежден - частично записанный результат удаляем
+            logger.error(f'Ошибка скачивания файла "{local_file_path}"')
+            os.remove(local_file_path)
+            raise
+        return True
+
+    async def remove(self, remote_path: str, permanently: bool = True) -> None:
+        await self._yd.remove(remote_path, permanently)
+        self._manifest_remove(remote_path)
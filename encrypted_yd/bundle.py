@@ -0,0 +1,179 @@
+"""Модуль с описанием пакетов (bundle) мелких файлов.
+
+Каждый файл на YD - это отдельный объект: загрузка, запрос свойств (patch) и служебные данные шифрования. Для деревьев
+из множества мелких файлов это означает огромное количество обращений к API, поэтому мелкие файлы одной директории
+могут упаковываться в пакеты ограниченного размера. Пакет - обычный зашифрованный поток (см. модуль cryptography)
+с содержимым файлов-членов, записанным подряд, за которым следует индекс в формате JSON:
+
+    {"members": [[имя, смещение, размер, время модификации в нс, ключевой хеш], ...], "replaces": [ключ, ...]}
+
+Положение индекса в открытом тексте пакета хранится в зашифрованных свойствах пакета (meta['index']), поэтому для
+получения списка членов и для извлечения отдельного члена достаточно прочитать соответствующие сегменты пакета
+(см. модуль remote_file), не скачивая его целиком.
+
+В списке файлов и директорий (list_files_and_dirs) члены пакета представлены ключами вида "<имя пакета>/@<номер>".
+Измененный член отправляется в новом пакете, а его прежний ключ записывается в "replaces" индекса нового пакета и
+больше не показывается. Прежнее содержимое остается в старом пакете до его удаления (пакет удаляется только целиком).
+"""
+
+import json
+import os
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .cryptography import iter_hashed
+
+# Размер пакета (открытого текста) по умолчанию
+DEFAULT_BUNDLE_SIZE = 4 * 1024 * 1024
+# Префикс номера члена пакета в ключе
+MEMBER_PREFIX = '@'
+# Размер блока, которыми члены пакета записываются в локальные файлы при скачивании
+MEMBER_BLOCK_SIZE = 1024 * 1024
+
+
+def member_key(bundle_uuid: str, index: int) -> str:
+    """
+    Функция получения ключа члена пакета в списке файлов и директорий.
+    """
+
+    return f'{bundle_uuid}/{MEMBER_PREFIX}{index}'
+
+
+def is_member_key(key: str) -> bool:
+    """
+    Функция проверки, является ли ключ (или путь на YD) ключом члена пакета.
+    """
+
+    return key.rsplit('/', 1)[-1].startswith(MEMBER_PREFIX)
+
+
+def split_member_path(remote_path: str) -> Optional[Tuple[str, int]]:
+    """
+    Функция разбора пути к члену пакета: путь к пакету на YD и номер члена (None, если это не член пакета).
+    """
+
+    bundle_path, _, last = remote_path.rpartition('/')
+    if not last.startswith(MEMBER_PREFIX):
+        return None
+    try:
+        return bundle_path, int(last[len(MEMBER_PREFIX):])
+    except ValueError:
+        raise ValueError(f'Неверный номер члена пакета: "{last}"')
+
+
+def group_files(files: Iterable[Tuple[Any, int]], bundle_size: int) -> List[List[Any]]:
+    """
+    Функция разбиения файлов (пары: описание файла, размер) на группы суммарным размером не более bundle_size
+    (файл, размер которого превышает bundle_size, образует отдельную группу). Порядок файлов сохраняется.
+    """
+
+    groups: List[List[Any]] = []
+    total = 0
+    for item, size in files:
+        if not groups or total + size > bundle_size:
+            groups.append([])
+            total = 0
+        groups[-1].append(item)
+        total += size
+    return groups
+
+
+class BundleWriter:
+    """
+    Формирование открытого текста пакета из локальных файлов.
+
+    Блоки данных возвращаются генератором iter_blocks, сведения о членах пакета (members) и положение индекса
+    (index_range) заполняются по мере чтения файлов и известны после исчерпания генератора.
+    """
+
+    def __init__(self, crypto: Any, replaces: Iterable[str] = ()) -> None:
+        self._crypto = crypto
+        self.replaces = sorted(replaces)
+        # Члены пакета: имя, смещение, размер, время модификации (нс), ключевой хеш
+        self.members: List[List[Any]] = []
+        self.index_range: Tuple[int, int] = (0, 0)
+
+    @property
+    def size(self) -> int:
+        return sum(self.index_range)
+
+    def iter_blocks(self, local_paths: Iterable[str]) -> Iterator[bytes]:
+        offset = 0
+        for local_path in local_paths:
+            # Время модификации фиксируется до чтения: если файл изменится во время чтения, то при следующей
+            # инкрементальной отправке он будет отправлен повторно
+            st = os.stat(local_path)
+            hasher = self._crypto.new_keyed_hash()
+            size = 0
+            with open(local_path, 'rb') as f:
+                for block in iter_hashed(f, hasher):
+                    size += len(block)
+                    yield block
+            self.members.append([os.path.basename(local_path), offset, size, st.st_mtime_ns, hasher.digest().hex()])
+            offset += size
+        index = json.dumps({'members': self.members, 'replaces': self.replaces}).encode('utf-8')
+        self.index_range = (offset, len(index))
+        yield index
+
+    def meta(self) -> Dict:
+        """
+        Метод получения дополнительных сведений о пакете, сохраняемых в его свойствах на YD.
+        """
+
+        return {'layout': 'bundle', 'index': list(self.index_range)}
+
+
+def read_index(bundle_file: Any, meta: Dict) -> Dict:
+    """
+    Функция чтения индекса пакета через файловый объект с произвольным доступом (см. RemoteFile).
+    """
+
+    offset, length = meta['index']
+    bundle_file.seek(offset)
+    data = bundle_file.read(length)
+    if len(data) != length:
+        raise ValueError('Индекс пакета поврежден: недостаточно данных')
+    return json.loads(data)
+
+
+class BlockReader:
+    """
+    Последовательное чтение данных заданного размера из итератора по блокам байтов (например, из расшифрованного
+    потока пакета при скачивании его целиком).
+    """
+
+    def __init__(self, blocks: Iterable[bytes]) -> None:
+        self._blocks = iter(blocks)
+        self._buffer = b''
+        self.position = 0
+
+    def read(self, size: int) -> bytes:
+        parts = []
+        while size > 0:
+            if not self._buffer:
+                block = next(self._blocks, None)
+                if block is None:
+                    raise ValueError('Пакет поврежден: недостаточно данных')
+                self._buffer = block
+                continue
+            part, self._buffer = self._buffer[:size], self._buffer[size:]
+            parts.append(part)
+            size -= len(part)
+            self.position += len(part)
+        return b''.join(parts)
+
+    def finish(self) -> None:
+        """
+        Метод чтения оставшихся данных (при чтении расшифрованного потока до конца проверяется его целостность).
+        """
+
+        for block in self._blocks:
+            self.position += len(block)
+
+
+def member_meta(bundle_uuid: str, member: List[Any]) -> Dict:
+    """
+    Функция получения дополнительных сведений о члене пакета для списка файлов и директорий.
+    """
+
+    _, offset, _, mtime, member_hash = member
+    return {'bundle': bundle_uuid, 'offset': offset, 'hash': member_hash, 'mtime': mtime}
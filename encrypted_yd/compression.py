@@ -0,0 +1,146 @@
+"""Модуль с описанием алгоритмов сжатия данных перед шифрованием.
+
+Зашифрованные данные практически не сжимаются, поэтому сжатие (если оно включено) выполняется до шифрования.
+Поддерживаются алгоритмы стандартной библиотеки (zlib, lzma), а также zstd, если установлен пакет "zstandard".
+Название алгоритма сохраняется в зашифрованных дополнительных сведениях о файле, поэтому при скачивании данные
+распаковываются автоматически.
+
+Пакет "zstandard" импортируется при первом обращении к алгоритму zstd, а не при импорте модуля.
+
+Перед сжатием проверяется первый блок данных: если он сжимается плохо (данные уже сжаты - jpeg, zip, mp4 и т. п.),
+то файл отправляется без сжатия.
+"""
+
+import lzma
+import zlib
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from loguru import logger
+
+# Доля исходного размера, которую должен занимать сжатый первый блок, чтобы данные считались сжимаемыми
+COMPRESSIBLE_RATIO = 0.9
+
+
+class Codec:
+    """
+    Описание алгоритма сжатия: название и фабрики потоковых упаковщика и распаковщика.
+
+    Упаковщик должен поддерживать методы compress(data) и flush(), распаковщик - метод decompress(data).
+    """
+
+    def __init__(self, name: str, compressor: Callable[[], Any], decompressor: Callable[[], Any]) -> None:
+        self.name = name
+        self.compressor = compressor
+        self.decompressor = decompressor
+
+
+# Доступные алгоритмы сжатия (zstd добавляется при первом обращении, если установлен пакет "zstandard")
+CODECS: Dict[str, Codec] = {
+    'zlib': Codec('zlib', lambda: zlib.compressobj(6), zlib.decompressobj),
+    'lzma': Codec('lzma', lzma.LZMACompressor, lzma.LZMADecompressor),
+}
+
+
+def _register_zstd() -> None:
+    """
+    Функция добавления алгоритма zstd в CODECS (если установлен пакет "zstandard").
+    """
+
+    try:
+        import zstandard
+    except ImportError:
+        return
+    CODECS['zstd'] = Codec('zstd', lambda: zstandard.ZstdCompressor(level=3).compressobj(),
+                           lambda: zstandard.ZstdDecompressor().decompressobj())
+
+
+def get_codec(name: str) -> Codec:
+    """
+    Функция получения алгоритма сжатия по названию.
+    """
+
+    if name == 'zstd' and name not in CODECS:
+        _register_zstd()
+    if name not in CODECS:
+        error_str = f'Ошибка: алгоритм сжатия "{name}" не поддерживается (доступны: {", ".join(CODECS)}).'
+        logger.error(error_str)
+        raise ValueError(error_str)
+    return CODECS[name]
+
+
+def is_compressible(sample: bytes) -> bool:
+    """
+    Функция быстрой проверки (сжатием zlib с минимальным уровнем), имеет ли смысл сжимать данные, начинающиеся с sample.
+    """
+
+    return bool(sample) and len(zlib.compress(sample, 1)) < len(sample) * COMPRESSIBLE_RATIO
+
+
+def compress_stream(source: Iterable[bytes], codec: Codec) -> Iterator[bytes]:
+    """
+    Функция-генератор, возвращающая сжатые блоки данных.
+    """
+
+    compressor = codec.compressor()
+    for chunk in source:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    data = compressor.flush()
+    if data:
+        yield data
+
+
+def decompress_stream(source: Iterable[bytes], codec: Codec) -> Iterator[bytes]:
+    """
+    Функция-генератор, возвращающая распакованные блоки данных.
+    """
+
+    decompressor = StreamDecompressor(codec)
+    for chunk in source:
+        yield from decompressor.update(chunk)
+    yield from decompressor.finalize()
+
+
+def sample_compressible(source: Iterable[bytes]) -> Tuple[bool, Iterator[bytes]]:
+    """
+    Функция проверки первого блока источника на сжимаемость.
+
+    Возвращает признак сжимаемости и итератор, возвращающий все блоки источника (включая проверенный).
+    """
+
+    iterator = iter(source)
+    first = next(iterator, b'')
+
+    def chained() -> Iterator[bytes]:
+        if first:
+            yield first
+        yield from iterator
+
+    return is_compressible(first), chained()
+
+
+class StreamDecompressor:
+    """
+    Потоковый распаковщик с push-интерфейсом (как у StreamDecryptor): блоки сжатых данных передаются в update,
+    по окончании данных вызывается finalize, который проверяет, что сжатые данные не усечены.
+    """
+
+    def __init__(self, codec: Codec) -> None:
+        self._codec = codec
+        self._decompressor = codec.decompressor()
+
+    def update(self, chunk: bytes) -> List[bytes]:
+        data = self._decompressor.decompress(chunk)
+        return [data] if data else []
+
+    def finalize(self) -> List[bytes]:
+        out = []
+        flush: Optional[Callable[[], bytes]] = getattr(self._decompressor, 'flush', None)
+        if flush is not None:
+            data = flush()
+            if data:
+                out.append(data)
+        if not getattr(self._decompressor, 'eof', True):
+            raise ValueError(f'Сжатые данные ({self._codec.name}) усечены')
+        return out
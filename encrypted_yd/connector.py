@@ -1,13 +1,41 @@
 """Модуль для описания коннекторов, работающих с YD.
 
 В настоящее время в качестве коннектора используется класс стороннего модуля "yadisk".
-Однако в дальнейшем предполагается использование других модулей, в том числе, самописных.
+Однако в дальнейшем предполагается использование других модулей, в том числе, самописных. Модули "yadisk" и
+"requests" импортируются при первом использовании коннектора ConnectorYaDisk, а не при импорте этого модуля.
+
+Для тестирования и измерения производительности без доступа к сети имеется коннектор ConnectorLocalFS, эмулирующий
+используемую пакетом часть API YD на локальной директории, а обертка InstrumentedConnector измеряет обращения к API
+любого коннектора (см. модуль metrics).
 """
 
+import json
+import os
+import shutil
+import threading
+import time
 from abc import ABC, abstractmethod
-from typing import Optional, List, Dict
+from collections import Counter
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Callable, Optional, List, Dict, Iterator, Tuple
+from uuid import uuid4
+
+from .cryptography import DataSource, iter_chunks
+from .metrics import Metrics
+from .retry import RetryPolicy, Retrying, TokenBucket, parse_retry_after
+from .scheduler import report_progress
+
+# Размер блока, которыми читается тело HTTP-ответа при потоковом скачивании
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+# Время, в течение которого ссылка на скачивание файла используется повторно (для запросов частей файла), с
+DOWNLOAD_LINK_TTL = 300
+# Поля объектов, запрашиваемые у YD при постраничном получении списка файлов и директорий (listdir_page)
+LISTDIR_PAGE_FIELDS = ('name', 'type', 'custom_properties')
 
-import yadisk
+if TYPE_CHECKING:
+    import requests
+
+    from .scheduler import BandwidthLimiter
 
 
 class ConnectorInterface(ABC):
@@ -36,6 +64,48 @@ class ConnectorInterface(ABC):
         """
         pass
 
+    @abstractmethod
+    def upload_stream(self, data: DataSource, remote_path: str,
+                      properties: Optional[Callable[[], Dict]] = None) -> None:
+        """
+        Метод для отправки на YD данных из файлового объекта или итератора по блокам байтов.
+
+        Данные передаются по мере чтения, без создания промежуточных файлов. Если задана функция properties, то после
+        передачи данных к файлу прикрепляется возвращаемая ею структура свойств (функция вызывается после передачи,
+        т. к. свойства могут зависеть от переданных данных). Коннекторы, серверная сторона которых это позволяет,
+        делают это без отдельного обращения к API.
+        """
+        pass
+
+    @abstractmethod
+    def download_stream(self, remote_path: str) -> Iterator[bytes]:
+        """
+        Метод для скачивания файла с YD в виде итератора по блокам байтов (без создания промежуточных файлов).
+        """
+        pass
+
+    def download_range(self, remote_path: str, offset: int, length: int) -> bytes:
+        """
+        Метод для скачивания части файла с YD: length байт, начиная с offset (меньше, если файл короче).
+
+        Реализация по умолчанию скачивает файл потоково до конца запрошенного диапазона. Коннекторы, поддерживающие
+        запрос части файла (HTTP Range), скачивают только запрошенные байты.
+        """
+
+        out = bytearray()
+        position = 0
+        stream = self.download_stream(remote_path)
+        for chunk in stream:
+            if position + len(chunk) > offset:
+                out += chunk[max(0, offset - position):offset + length - position]
+            position += len(chunk)
+            if position >= offset + length:
+                break
+        close = getattr(stream, 'close', None)
+        if close is not None:
+            close()
+        return bytes(out)
+
     @abstractmethod
     def remove(self, remote_path: str, permanently: bool) -> None:
         """
@@ -54,43 +124,653 @@ class ConnectorInterface(ABC):
         pass
 
     @abstractmethod
-    def mkdir(self, remote_path: str) -> None:
+    def mkdir(self, remote_path: str, properties: Optional[Dict] = None) -> None:
         """
-        Метод для создания директории на YD.
+        Метод для создания директории на YD (если задана структура properties, то она прикрепляется к директории).
         """
         pass
 
     @abstractmethod
     def listdir(self, remote_path: str) -> List[Dict]:
         """
-        Метод для получения списка файлов и/или директорий по указанному пути на YD.
+        Метод для получения списка файлов и/или директорий по указанному пути на YD (при отсутствии директории
+        вызывается FileNotFoundError).
         """
         pass
 
+    def listdir_page(self, remote_path: str, offset: int, limit: int) -> List[Dict]:
+        """
+        Метод для получения части списка файлов и/или директорий по указанному пути на YD: не более limit объектов,
+        начиная с объекта с номером offset (объекты упорядочены по имени). Для каждого объекта достаточно полей
+        name, type и custom_properties.
+
+        Реализация по умолчанию получает список целиком.
+        """
+
+        return self.listdir(remote_path)[offset:offset + limit]
+
+    def reserve_sessions(self, count: int) -> None:
+        """
+        Метод подготовки коннектора к передаче данных в count одновременных запросов (например, увеличение
+        количества хранимых соединений). Вызывается перед операцией отправки/скачивания.
+
+        Реализация по умолчанию ничего не делает.
+        """
+
+        pass
+
+
+class SessionPool:
+    """
+    Пул сессий "requests" для передачи данных по ссылкам, полученным через API YD.
+
+    Сессии (и их соединения keep-alive) повторно используются рабочими потоками: каждый запрос берет свободную
+    сессию из пула, а при отсутствии свободной создается новая, поэтому количество сессий само подстраивается под
+    количество одновременно выполняемых запросов. В пуле хранится не более size свободных сессий.
+    """
+
+    def __init__(self, size: int = 4) -> None:
+        self._size = size
+        self._idle: List['requests.Session'] = []
+        self._lock = threading.Lock()
+
+    def reserve(self, size: int) -> None:
+        """
+        Метод увеличения количества хранимых свободных сессий до size (не уменьшается).
+        """
+
+        with self._lock:
+            self._size = max(self._size, size)
+
+    @contextmanager
+    def session(self) -> Iterator['requests.Session']:
+        import requests.adapters
+
+        with self._lock:
+            session = self._idle.pop() if self._idle else None
+        if session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=1)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+        try:
+            yield session
+        finally:
+            with self._lock:
+                if len(self._idle) < self._size:
+                    self._idle.append(session)
+                    session = None
+            if session is not None:
+                session.close()
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for session in idle:
+            session.close()
+
+
+def _http_status(e: BaseException) -> Optional[int]:
+    response = getattr(e, 'response', None)
+    return getattr(response, 'status_code', None)
+
+
+def classify_error(e: BaseException) -> Tuple[bool, Optional[float]]:
+    """
+    Функция классификации ошибки обращения к YD: является ли она временной (запрос можно повторить) и через сколько
+    секунд сервер разрешает повторить запрос (заголовок Retry-After).
+    """
+
+    import requests
+    import yadisk
+
+    # Сетевые сбои (обрыв соединения, тайм-аут)
+    if isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                      requests.exceptions.ChunkedEncodingError)):
+        return True, None
+    status = _http_status(e)
+    # Превышение частоты запросов и ошибки сервера (кроме нехватки места на диске)
+    if isinstance(e, (yadisk.exceptions.RetriableYaDiskError, yadisk.exceptions.TooManyRequestsError)) \
+            or status == 429 or (status is not None and 500 <= status != 507):
+        headers = getattr(getattr(e, 'response', None), 'headers', None) or dict()
+        return True, parse_retry_after(headers.get('Retry-After'))
+    return False, None
+
 
 class ConnectorYaDisk(ConnectorInterface):
     """
     Класс, использующий модуль "yadisk" для работы с YD.
+
+    Запросы к API YD при временных сбоях (обрыв соединения, ответы 429 и 5xx) повторяются с экспоненциальной
+    задержкой со случайным разбросом (параметр retry_policy); указанное сервером время ожидания (Retry-After)
+    соблюдается. Повторяются только запросы, повтор которых безопасен: получение и задание свойств, получение списка
+    файлов, получение ссылок; создание и удаление директории/файла повторяются с учетом того, что предыдущая попытка
+    могла быть выполнена. Потоковая отправка данных не повторяется, т. к. переданные данные уже прочитаны из источника
+    (для продолжения отправки больших файлов используется отправка по частям), а прерванное скачивание продолжается
+    с места обрыва (запрос с заголовком Range). Части файла (download_range) также запрашиваются с заголовком Range,
+    ссылка на скачивание при этом используется повторно в течение DOWNLOAD_LINK_TTL секунд.
+
+    Параметр rate_limit ограничивает общую частоту запросов всех рабочих потоков (запросов в секунду), pool_size -
+    количество хранимых сессий для передачи данных (EncryptedYandexDisk увеличивает его до количества одновременных
+    запросов операции, см. reserve_sessions), timeout - тайм-ауты соединения и чтения для передачи данных, с.
+
+    Коннектор создается классом EncryptedYandexDisk с единственным аргументом token, поэтому остальные параметры
+    задаются, например, через functools.partial(ConnectorYaDisk, rate_limit=10).
     """
 
-    def __init__(self, token: str) -> None:
+    def __init__(self, token: str, pool_size: int = 4, retry_policy: Optional[RetryPolicy] = None,
+                 rate_limit: Optional[float] = None, timeout: Tuple[float, float] = (10, 60)) -> None:
+        import yadisk
+
         self._yd = yadisk.YaDisk(token=token)
+        # Пул сессий для потоковой передачи данных по ссылкам, полученным через API YD
+        self._sessions = SessionPool(pool_size)
+        self._retrying = Retrying(retry_policy or RetryPolicy(), classify_error,
+                                  TokenBucket(rate_limit) if rate_limit else None)
+        self._timeout = timeout
+        # Ссылки на скачивание файлов для запросов частей файла: путь на YD - (ссылка, время получения)
+        self._links: Dict[str, Tuple[str, float]] = dict()
+
+    def close(self) -> None:
+        """
+        Метод закрытия сессий для передачи данных.
+        """
+
+        self._sessions.close()
+
+    def reserve_sessions(self, count: int) -> None:
+        # Иначе при большем количестве рабочих потоков лишние сессии закрывались бы после каждого запроса, и каждый
+        # следующий запрос устанавливал бы новое соединение
+        self._sessions.reserve(count)
+
+    def _call(self, description: str, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Метод выполнения идемпотентного запроса к API YD с повторами.
+
+        Собственные повторы модуля "yadisk" отключаются (n_retries=0), чтобы повторы не умножались.
+        """
+
+        return self._retrying.call(lambda attempt: fn(*args, n_retries=0, **kwargs), description)
+
+    def upload(self, local_path: str, remote_path: str) -> None:
+        def upload(attempt: int) -> None:
+            # Файл отправляется заново целиком; если предыдущая попытка была выполнена, то файл перезаписывается
+            with open(local_path, mode='rb') as f:
+                self._yd.upload(f, remote_path, overwrite=attempt > 0, n_retries=0)
+
+        self._retrying.call(upload, f'upload "{remote_path}"')
+
+    def download(self, remote_path: str, local_path: str) -> None:
+        self._call(f'download "{remote_path}"', self._yd.download, remote_path, local_path)
+
+    def upload_stream(self, data: DataSource, remote_path: str,
+                      properties: Optional[Callable[[], Dict]] = None) -> None:
+        link = self._call(f'get_upload_link "{remote_path}"', self._yd.get_upload_link, remote_path)
+        # Тело запроса передается по частям (chunked transfer encoding) по мере шифрования. Запрос не повторяется:
+        # данные источника уже прочитаны.
+        self._retrying.acquire()
+        with self._sessions.session() as session:
+            response = session.put(link, data=iter_chunks(data), timeout=self._timeout)
+            response.raise_for_status()
+        # API YD не позволяет задать свойства при загрузке файла - они задаются отдельным запросом
+        if properties is not None:
+            self.patch(remote_path, properties=properties())
+
+    def download_stream(self, remote_path: str) -> Iterator[bytes]:
+        # Количество уже полученных байтов: при обрыве скачивание продолжается с этого места
+        offset = 0
+        attempt = 0
+        while True:
+            try:
+                # Получение ссылки повторяется только внешним циклом, иначе повторы умножались бы
+                self._retrying.acquire()
+                link = self._yd.get_download_link(remote_path, n_retries=0)
+                self._retrying.acquire()
+                headers = {'Range': f'bytes={offset}-'} if offset else dict()
+                with self._sessions.session() as session, \
+                        session.get(link, headers=headers, stream=True, timeout=self._timeout) as response:
+                    response.raise_for_status()
+                    # Если сервер не поддерживает запрос части файла, то уже полученные байты пропускаются
+                    skip = offset if offset and response.status_code != 206 else 0
+                    for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                        if skip:
+                            chunk, skip = chunk[skip:], max(0, skip - len(chunk))
+                            if not chunk:
+                                continue
+                        offset += len(chunk)
+                        yield chunk
+                return
+            except Exception as e:
+                self._retrying.wait(e, attempt, f'download "{remote_path}"')
+                attempt += 1
+
+    def _download_link(self, remote_path: str, refresh: bool = False) -> str:
+        """
+        Метод получения ссылки на скачивание файла (ссылка, полученная не позднее DOWNLOAD_LINK_TTL секунд назад,
+        используется повторно, если не указано refresh).
+        """
+
+        cached = self._links.get(remote_path)
+        if not refresh and cached is not None and time.monotonic() - cached[1] < DOWNLOAD_LINK_TTL:
+            return cached[0]
+        self._retrying.acquire()
+        link = self._yd.get_download_link(remote_path, n_retries=0)
+        self._links[remote_path] = (link, time.monotonic())
+        return link
+
+    def download_range(self, remote_path: str, offset: int, length: int) -> bytes:
+        if length <= 0:
+            return b''
+
+        def download(attempt: int) -> bytes:
+            # При повторе ссылка запрашивается заново (ошибка могла быть вызвана истечением срока ее действия)
+            link = self._download_link(remote_path, refresh=attempt > 0)
+            with self._sessions.session() as session:
+                response = session.get(link, headers={'Range': f'bytes={offset}-{offset + length - 1}'},
+                                       timeout=self._timeout)
+                # Диапазон начинается за концом файла
+                if response.status_code == 416:
+                    return b''
+                response.raise_for_status()
+                data = response.content
+            # Если сервер не поддерживает запрос части файла, то он возвращает файл целиком
+            return data if response.status_code == 206 else data[offset:offset + length]
+
+        return self._retrying.call(download, f'download_range "{remote_path}"')
+
+    def remove(self, remote_path: str, permanently: bool) -> None:
+        import yadisk
+
+        def remove(attempt: int) -> None:
+            try:
+                self._yd.remove(remote_path, permanently=permanently, n_retries=0)
+            except yadisk.exceptions.PathNotFoundError:
+                # Объект удален предыдущей попыткой, ответ на которую не был получен
+                if not attempt:
+                    raise
+
+        self._retrying.call(remove, f'remove "{remote_path}"')
+
+    def patch(self, remote_path: str, properties: Dict) -> Optional[Dict]:
+        return self._call(f'patch "{remote_path}"', self._yd.patch, remote_path, properties=properties)
+
+    def mkdir(self, remote_path: str, properties: Optional[Dict] = None) -> None:
+        import yadisk
+
+        def mkdir(attempt: int) -> None:
+            try:
+                self._yd.mkdir(remote_path, n_retries=0)
+            except (yadisk.exceptions.DirectoryExistsError, yadisk.exceptions.PathExistsError):
+                # Директория создана предыдущей попыткой, ответ на которую не был получен
+                if not attempt:
+                    raise
+
+        self._retrying.call(mkdir, f'mkdir "{remote_path}"')
+        if properties:
+            self.patch(remote_path, properties=properties)
+
+    def listdir(self, remote_path: str) -> List[Dict]:
+        import yadisk
+
+        # Список получается целиком в рамках одной попытки (yadisk возвращает генератор с постраничными запросами)
+        try:
+            return self._retrying.call(lambda attempt: list(self._yd.listdir(remote_path, n_retries=0)),
+                                       f'listdir "{remote_path}"')
+        except yadisk.exceptions.PathNotFoundError as e:
+            raise FileNotFoundError(f'Директория "{remote_path}" не найдена') from e
+
+    def listdir_page(self, remote_path: str, offset: int, limit: int) -> List[Dict]:
+        import yadisk
+
+        # Каждая страница - отдельный запрос с повторами; запрашиваются только нужные поля вложенных объектов,
+        # что заметно сокращает объем ответа для больших директорий
+        fields = ['type'] + [f'_embedded.items.{field}' for field in LISTDIR_PAGE_FIELDS]
+        try:
+            meta = self._call(f'listdir_page "{remote_path}" ({offset}, {limit})', self._yd.get_meta, remote_path,
+                              offset=offset, limit=limit, sort='name', fields=fields)
+        except yadisk.exceptions.PathNotFoundError as e:
+            raise FileNotFoundError(f'Директория "{remote_path}" не найдена') from e
+        if meta.embedded is None:
+            raise NotADirectoryError(f'"{remote_path}" не является директорией')
+        return list(meta.embedded.items)
+
+
+class ConnectorLocalFS(ConnectorInterface):
+    """
+    Класс, эмулирующий работу с YD на локальной директории (для тестов и измерения производительности).
+
+    Внутри корневой директории root файлы и директории "диска" хранятся в поддиректории "disk", пользовательские
+    свойства (custom_properties) - в JSON-файлах в поддиректории "props", удаленные не безвозвратно объекты - в
+    поддиректории "trash". Структуры, возвращаемые методами patch и listdir, содержат те же поля, что и у YD
+    (type, name, path, size, custom_properties).
+
+    Параметры latency (задержка каждого обращения к API в секундах) и bandwidth (скорость передачи данных в байтах
+    в секунду) позволяют приблизить поведение коннектора к работе с YD по сети. Количество обращений к API по видам
+    накапливается в счетчике calls.
+
+    Коннектор создается классом EncryptedYandexDisk с единственным аргументом token, поэтому остальные параметры
+    задаются, например, через functools.partial(ConnectorLocalFS, root='...').
+    """
+
+    def __init__(self, token: str = '', root: str = 'encrypted_yd_local', latency: float = 0.0,
+                 bandwidth: Optional[float] = None) -> None:
+        self._root = os.path.abspath(root)
+        self._latency = latency
+        self._bandwidth = bandwidth
+        self._lock = threading.Lock()
+        self.calls: Counter = Counter()
+        for d in ('disk', 'props', 'trash'):
+            os.makedirs(os.path.join(self._root, d), exist_ok=True)
+
+    def _call(self, name: str) -> None:
+        """
+        Метод учета обращения к API (с эмуляцией задержки).
+        """
+
+        with self._lock:
+            self.calls[name] += 1
+        if self._latency:
+            time.sleep(self._latency)
+
+    def _throttle(self, size: int) -> None:
+        """
+        Метод эмуляции ограниченной скорости передачи size байт.
+        """
+
+        if self._bandwidth:
+            time.sleep(size / self._bandwidth)
+
+    def _local(self, remote_path: str, area: str = 'disk') -> str:
+        """
+        Метод преобразования пути на YD в локальный путь внутри области area.
+        """
+
+        parts = [_ for _ in remote_path.replace('\\', '/').split('/') if _]
+        if '..' in parts:
+            raise ValueError(f'Недопустимый путь "{remote_path}"')
+        return os.path.join(self._root, area, *parts)
+
+    def _props_path(self, remote_path: str) -> str:
+        return self._local(remote_path, 'props') + '.json'
+
+    def _read_props(self, remote_path: str) -> Dict:
+        try:
+            with open(self._props_path(remote_path), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return dict()
+
+    def _write_props(self, remote_path: str, props: Dict) -> None:
+        props_path = self._props_path(remote_path)
+        os.makedirs(os.path.dirname(props_path), exist_ok=True)
+        with open(props_path, mode='w', encoding='utf-8') as f:
+            json.dump(props, f)
+
+    def _resource(self, remote_path: str) -> Dict:
+        """
+        Метод формирования структуры со свойствами файла/директории (в том же виде, что и у YD).
+        """
+
+        local_path = self._local(remote_path)
+        if not os.path.exists(local_path):
+            raise FileNotFoundError(f'Ресурс "{remote_path}" не найден')
+        is_dir = os.path.isdir(local_path)
+        resource: Dict[str, Any] = {
+            'type': 'dir' if is_dir else 'file',
+            'name': os.path.basename(local_path),
+            'path': 'disk:/' + remote_path.strip('/'),
+            'custom_properties': self._read_props(remote_path),
+        }
+        if not is_dir:
+            resource['size'] = os.path.getsize(local_path)
+            resource['file'] = local_path
+        return resource
 
     def upload(self, local_path: str, remote_path: str) -> None:
         with open(local_path, mode='rb') as f:
-            self._yd.upload(f, remote_path)
+            self.upload_stream(f, remote_path)
+
+    def download(self, remote_path: str, local_path: str) -> None:
+        with open(local_path, mode='wb') as f:
+            for chunk in self.download_stream(remote_path):
+                f.write(chunk)
+
+    def upload_stream(self, data: DataSource, remote_path: str,
+                      properties: Optional[Callable[[], Dict]] = None) -> None:
+        self._call('upload')
+        local_path = self._local(remote_path)
+        if not os.path.isdir(os.path.dirname(local_path)):
+            raise FileNotFoundError(f'Директория для "{remote_path}" не найдена')
+        if os.path.exists(local_path):
+            raise FileExistsError(f'Ресурс "{remote_path}" уже существует')
+        # Данные записываются во временный файл, который переименовывается только после успешного получения всех
+        # данных (как и на YD, частично переданный файл не появляется)
+        tmp_path = f'{local_path}.{uuid4().hex}.part'
+        try:
+            with open(tmp_path, mode='wb') as f:
+                for chunk in iter_chunks(data):
+                    self._throttle(len(chunk))
+                    f.write(chunk)
+            os.replace(tmp_path, local_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        # Свойства сохраняются без отдельного обращения к API
+        if properties is not None:
+            self._write_props(remote_path, properties())
+
+    def download_stream(self, remote_path: str) -> Iterator[bytes]:
+        self._call('download')
+        local_path = self._local(remote_path)
+        if not os.path.isfile(local_path):
+            raise FileNotFoundError(f'Файл "{remote_path}" не найден')
+        with open(local_path, mode='rb') as f:
+            for chunk in iter_chunks(f, DOWNLOAD_CHUNK_SIZE):
+                self._throttle(len(chunk))
+                yield chunk
+
+    def download_range(self, remote_path: str, offset: int, length: int) -> bytes:
+        self._call('download_range')
+        local_path = self._local(remote_path)
+        if not os.path.isfile(local_path):
+            raise FileNotFoundError(f'Файл "{remote_path}" не найден')
+        with open(local_path, mode='rb') as f:
+            f.seek(offset)
+            data = f.read(max(0, length))
+        self._throttle(len(data))
+        return data
+
+    def remove(self, remote_path: str, permanently: bool) -> None:
+        self._call('remove')
+        local_path = self._local(remote_path)
+        if not os.path.exists(local_path):
+            raise FileNotFoundError(f'Ресурс "{remote_path}" не найден')
+        if permanently:
+            if os.path.isdir(local_path):
+                shutil.rmtree(local_path)
+            else:
+                os.remove(local_path)
+        else:
+            # В корзине объект хранится под уникальным именем (на YD в корзине также могут быть одноименные объекты)
+            shutil.move(local_path, os.path.join(self._root, 'trash', f'{os.path.basename(local_path)}_{uuid4().hex}'))
+        # Свойства удаленного объекта (и всего его поддерева) удаляются
+        props_path = self._props_path(remote_path)
+        if os.path.exists(props_path):
+            os.remove(props_path)
+        shutil.rmtree(self._local(remote_path, 'props'), ignore_errors=True)
+
+    def patch(self, remote_path: str, properties: Dict) -> Optional[Dict]:
+        self._call('patch')
+        resource = self._resource(remote_path)
+        if properties:
+            # Как и на YD, свойства дополняются; свойство со значением None удаляется
+            props = resource['custom_properties']
+            for key, value in properties.items():
+                if value is None:
+                    props.pop(key, None)
+                else:
+                    props[key] = value
+            self._write_props(remote_path, props)
+        return resource
+
+    def mkdir(self, remote_path: str, properties: Optional[Dict] = None) -> None:
+        self._call('mkdir')
+        os.mkdir(self._local(remote_path))
+        if properties:
+            self._write_props(remote_path, properties)
+
+    def listdir(self, remote_path: str) -> List[Dict]:
+        self._call('listdir')
+        local_path = self._local(remote_path)
+        if not os.path.isdir(local_path):
+            raise FileNotFoundError(f'Директория "{remote_path}" не найдена')
+        return [self._resource(remote_path.rstrip('/') + '/' + name)
+                for name in sorted(os.listdir(local_path)) if not name.endswith('.part')]
+
+    def listdir_page(self, remote_path: str, offset: int, limit: int) -> List[Dict]:
+        self._call('listdir_page')
+        local_path = self._local(remote_path)
+        if not os.path.isdir(local_path):
+            raise FileNotFoundError(f'Директория "{remote_path}" не найдена')
+        names = [name for name in sorted(os.listdir(local_path)) if not name.endswith('.part')]
+        return [self._resource(remote_path.rstrip('/') + '/' + name) for name in names[offset:offset + limit]]
+
+
+class InstrumentedConnector(ConnectorInterface):
+    """
+    Обертка коннектора, измеряющая обращения к API YD (количество, объем переданных данных, длительность) с помощью
+    реестра metrics. Операции регистрируются под именами вида "api.<метод>". Прочие атрибуты (например, счетчик
+    calls коннектора ConnectorLocalFS) берутся у исходного коннектора.
+
+    Время потоковой отправки и скачивания учитывается без времени вложенных измеряемых этапов (шифрования и т. п.),
+    выполняемых при получении/обработке блоков данных.
+    """
+
+    def __init__(self, connector: Any, metrics: Metrics) -> None:
+        self._connector = connector
+        self._metrics = metrics
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._connector, name)
+
+    def upload(self, local_path: str, remote_path: str) -> None:
+        with self._metrics.timer('api.upload') as timer:
+            self._connector.upload(local_path, remote_path)
+            timer.bytes = os.path.getsize(local_path)
+
+    def download(self, remote_path: str, local_path: str) -> None:
+        with self._metrics.timer('api.download') as timer:
+            self._connector.download(remote_path, local_path)
+            timer.bytes = os.path.getsize(local_path)
+
+    def upload_stream(self, data: DataSource, remote_path: str,
+                      properties: Optional[Callable[[], Dict]] = None) -> None:
+        with self._metrics.timer('api.upload_stream') as timer:
+
+            def counted() -> Iterator[bytes]:
+                for chunk in iter_chunks(data):
+                    timer.bytes += len(chunk)
+                    yield chunk
+
+            self._connector.upload_stream(counted(), remote_path, properties)
+
+    def download_stream(self, remote_path: str) -> Iterator[bytes]:
+        return iter(self._metrics.timed_iter('api.download_stream', self._connector.download_stream(remote_path)))
+
+    def download_range(self, remote_path: str, offset: int, length: int) -> bytes:
+        with self._metrics.timer('api.download_range') as timer:
+            data = self._connector.download_range(remote_path, offset, length)
+            timer.bytes = len(data)
+        return data
+
+    def remove(self, remote_path: str, permanently: bool) -> None:
+        with self._metrics.timer('api.remove'):
+            self._connector.remove(remote_path, permanently)
+
+    def patch(self, remote_path: str, properties: Dict) -> Optional[Dict]:
+        with self._metrics.timer('api.patch'):
+            return self._connector.patch(remote_path, properties)
+
+    def mkdir(self, remote_path: str, properties: Optional[Dict] = None) -> None:
+        with self._metrics.timer('api.mkdir'):
+            self._connector.mkdir(remote_path, properties)
+
+    def listdir(self, remote_path: str) -> List[Dict]:
+        with self._metrics.timer('api.listdir'):
+            return self._connector.listdir(remote_path)
+
+    def listdir_page(self, remote_path: str, offset: int, limit: int) -> List[Dict]:
+        with self._metrics.timer('api.listdir_page'):
+            return self._connector.listdir_page(remote_path, offset, limit)
+
+    def reserve_sessions(self, count: int) -> None:
+        self._connector.reserve_sessions(count)
+
+
+class ThrottledConnector(ConnectorInterface):
+    """
+    Обертка коннектора, учитывающая переданные данные в ходе операции (report_progress, см. модуль scheduler) и
+    ограничивающая скорость отправки и скачивания общим для всех рабочих потоков ограничителем BandwidthLimiter (если
+    он задан). Потоковая передача учитывается и ограничивается по блокам данных, передача файла целиком
+    (upload/download) - по его размеру. Прочие атрибуты берутся у исходного коннектора.
+    """
+
+    def __init__(self, connector: Any, limiter: Optional['BandwidthLimiter'] = None) -> None:
+        self._connector = connector
+        self._limiter = limiter
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._connector, name)
+
+    def _transfer(self, direction: str, size: int) -> None:
+        if self._limiter is not None:
+            self._limiter.acquire(direction, size)
+        report_progress(size)
+
+    def upload(self, local_path: str, remote_path: str) -> None:
+        self._transfer('upload', os.path.getsize(local_path))
+        self._connector.upload(local_path, remote_path)
 
     def download(self, remote_path: str, local_path: str) -> None:
-        self._yd.download(remote_path, local_path)
+        self._connector.download(remote_path, local_path)
+        self._transfer('download', os.path.getsize(local_path))
+
+    def upload_stream(self, data: DataSource, remote_path: str,
+                      properties: Optional[Callable[[], Dict]] = None) -> None:
+        def throttled() -> Iterator[bytes]:
+            for chunk in iter_chunks(data):
+                self._transfer('upload', len(chunk))
+                yield chunk
+
+        self._connector.upload_stream(throttled(), remote_path, properties)
+
+    def download_stream(self, remote_path: str) -> Iterator[bytes]:
+        for chunk in self._connector.download_stream(remote_path):
+            self._transfer('download', len(chunk))
+            yield chunk
+
+    def download_range(self, remote_path: str, offset: int, length: int) -> bytes:
+        if self._limiter is not None:
+            self._limiter.acquire('download', length)
+        data = self._connector.download_range(remote_path, offset, length)
+        report_progress(len(data))
+        return data
 
     def remove(self, remote_path: str, permanently: bool) -> None:
-        self._yd.remove(remote_path, permanently=permanently)
+        self._connector.remove(remote_path, permanently)
 
     def patch(self, remote_path: str, properties: Dict) -> Optional[Dict]:
-        return self._yd.patch(remote_path, properties=properties)
+        return self._connector.patch(remote_path, properties)
 
-    def mkdir(self, remote_path: str) -> None:
-        self._yd.mkdir(remote_path)
+    def mkdir(self, remote_path: str, properties: Optional[Dict] = None) -> None:
+        self._connector.mkdir(remote_path, properties)
 
     def listdir(self, remote_path: str) -> List[Dict]:
-        return list(self._yd.listdir(remote_path))
+        return self._connector.listdir(remote_path)
+
+    def listdir_page(self, remote_path: str, offset: int, limit: int) -> List[Dict]:
+        return self._connector.listdir_page(remote_path, offset, limit)
+
+    def reserve_sessions(self, count: int) -> None:
+        self._connector.reserve_sessions(count)
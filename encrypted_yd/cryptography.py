@@ -1,13 +1,135 @@
 """Модуль для описания криптоалгоритмов, используемых для работы с YD.
 
-В настоящее время используется сторонний пакет "pyсryptodome". Тем не менее, в дальнейшем возможно использование других,
-в том числе, самописных криптографических пакетов, модулей, алгоритмов, соответствующих описанному здесь интерфейсу.
+В настоящее время используется сторонний пакет "pyсryptodome" (CryptodomeAES) или, если он установлен, пакет
+"cryptography" (CryptographyAESGCM). Тем не менее, в дальнейшем возможно использование других, в том числе, самописных
+криптографических пакетов, модулей, алгоритмов, соответствующих описанному здесь интерфейсу.
+
+Помимо шифрования одного блока данных целиком (encrypt_data/decrypt_data) интерфейс поддерживает потоковый
+(сегментированный) формат (encrypt_stream/decrypt_stream), при котором объем используемой памяти не зависит от размера
+файла. Формат потока:
+
+    заголовок: STREAM_MAGIC (7 байт) | версия (1 байт) | алгоритм (1 байт) | размер сегмента (4 байта) |
+               идентификатор потока (16 случайных байт)
+    сегменты:  nonce | tag | шифртекст (не более "размера сегмента" байт)
+
+Каждый сегмент шифруется с собственным nonce и tag. В качестве дополнительных аутентифицируемых данных (AAD) каждого
+сегмента используются заголовок, порядковый номер сегмента и признак последнего сегмента. Поэтому перестановка
+сегментов, их подмена из другого потока, изменение заголовка или усечение потока обнаруживаются при расшифровании.
+
+Сегменты независимы друг от друга, поэтому при передаче исполнителя (executor) они шифруются/дешифруются параллельно:
+в обработке находится не более window сегментов, а результаты возвращаются в исходном порядке по мере готовности.
+Так как генератор потребляется коннектором при передаче данных, шифрование следующих сегментов выполняется
+одновременно с отправкой предыдущих.
 """
 
+import hashlib
+import hmac
+import os
+import struct
 from abc import ABC, abstractmethod
+from collections import deque
+from typing import TYPE_CHECKING, Any, BinaryIO, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple, \
+    TypeVar, Union
+
+if TYPE_CHECKING:
+    from concurrent.futures import Executor, Future
+
+T = TypeVar('T')
+
+# Сигнатура и версия потокового формата
+STREAM_MAGIC = b'EYDSTRM'
+STREAM_VERSION = 1
+# Размер сегмента открытого текста по умолчанию
+DEFAULT_SEGMENT_SIZE = 64 * 1024
+
+# Заголовок потока: сигнатура, версия, идентификатор алгоритма, размер сегмента, идентификатор потока
+_STREAM_HEADER = struct.Struct('>7sBBI16s')
+# Дополнительные аутентифицируемые данные сегмента: порядковый номер и признак последнего сегмента
+_SEGMENT_AAD = struct.Struct('>QB')
+# Количество сегментов, одновременно находящихся в обработке при параллельном шифровании/дешифровании
+DEFAULT_PARALLEL_WINDOW = 16
+
+# Тип источника данных для потокового шифрования: файловый объект или итератор по блокам байтов
+DataSource = Union[BinaryIO, Iterable[bytes]]
+
+
+def iter_chunks(source: DataSource, chunk_size: int = DEFAULT_SEGMENT_SIZE) -> Iterator[bytes]:
+    """
+    Функция-генератор, возвращающая блоки байтов произвольного размера из файлового объекта или итератора.
+    """
+
+    if hasattr(source, 'read'):
+        while True:
+            chunk = source.read(chunk_size)  # type: ignore[union-attr]
+            if not chunk:
+                return
+            yield chunk
+    else:
+        for chunk in source:
+            if chunk:
+                yield chunk
+
+
+def iter_blocks(source: DataSource, block_size: int) -> Iterator[bytes]:
+    """
+    Функция-генератор, возвращающая блоки байтов ровно по block_size байт (последний блок может быть короче).
+    """
+
+    buffer = bytearray()
+    for chunk in iter_chunks(source, block_size):
+        # Если буфер пуст и блок имеет нужный размер, то возвращаем его без копирования
+        if not buffer and len(chunk) == block_size:
+            yield bytes(chunk)
+            continue
+        buffer += chunk
+        while len(buffer) >= block_size:
+            yield bytes(buffer[:block_size])
+            del buffer[:block_size]
+    if buffer:
+        yield bytes(buffer)
+
+
+def iter_hashed(source: DataSource, hasher: Any) -> Iterator[bytes]:
+    """
+    Функция-генератор, возвращающая блоки байтов источника и попутно добавляющая их в hasher (объект с методом update).
+
+    Позволяет вычислить хеш содержимого файла за тот же проход, что и его шифрование.
+    """
+
+    for chunk in iter_chunks(source):
+        hasher.update(chunk)
+        yield chunk
 
-from Crypto.Cipher import AES
-from Crypto.Hash import SHA256
+
+def ordered_map(executor: 'Executor', fn: Callable[..., T], items: Iterable[Tuple], window: int) -> Iterator[T]:
+    """
+    Функция-генератор, применяющая fn к элементам items (кортежам аргументов) в исполнителе executor.
+
+    Одновременно в обработке находится не более window элементов, результаты возвращаются в порядке элементов.
+    Если генератор закрыт досрочно или возникла ошибка, то еще не начатые задачи отменяются.
+    """
+
+    if window < 1:
+        raise ValueError(f'Размер окна должен быть положительным, а не {window}')
+    pending: Deque['Future'] = deque()
+    try:
+        for args in items:
+            pending.append(executor.submit(fn, *args))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def is_stream_format(prefix: bytes) -> bool:
+    """
+    Функция проверки, являются ли переданные первые байты данных заголовком потокового формата.
+    """
+
+    return prefix[:len(STREAM_MAGIC)] == STREAM_MAGIC
 
 
 class CryptoInterface(ABC):
@@ -15,6 +137,11 @@ class CryptoInterface(ABC):
     Интерфейс для криптографических средств, обеспечивающий необходимый функционал работы с YD.
     """
 
+    # Идентификатор алгоритма, записываемый в заголовок потокового формата
+    stream_algorithm: int = 0
+    # Размер служебных данных (nonce и tag), добавляемых к каждому сегменту потокового формата
+    segment_overhead: int = 32
+
     @abstractmethod
     def __init__(self, key: bytes) -> None:
         pass
@@ -40,21 +167,335 @@ class CryptoInterface(ABC):
         """
         pass
 
+    @abstractmethod
+    def new_keyed_hash(self) -> Any:
+        """
+        Метод, возвращающий объект для вычисления ключевого хеша (HMAC) данных, поступающих частями.
+
+        Объект должен поддерживать методы update(data) и digest(). Ключевой хеш используется в качестве отпечатка
+        содержимого файлов: без знания ключа по нему нельзя проверить предположение о содержимом файла.
+        """
+        pass
+
+    def keyed_hash_data(self, data: bytes) -> bytes:
+        """
+        Метод для вычисления ключевого хеша (HMAC) блока данных.
+        """
+
+        hasher = self.new_keyed_hash()
+        hasher.update(data)
+        return hasher.digest()
+
+    def keyed_hash_stream(self, source: DataSource) -> bytes:
+        """
+        Метод для вычисления ключевого хеша (HMAC) данных из файлового объекта или итератора по блокам байтов.
+        """
+
+        hasher = self.new_keyed_hash()
+        for chunk in iter_chunks(source):
+            hasher.update(chunk)
+        return hasher.digest()
+
+    @abstractmethod
+    def encrypt_segment(self, data: bytes, associated_data: bytes) -> bytes:
+        """
+        Метод для шифрования сегмента потокового формата с аутентификацией дополнительных данных.
+
+        Результат должен быть длиннее исходных данных ровно на segment_overhead байт.
+        """
+        pass
+
+    @abstractmethod
+    def decrypt_segment(self, data: bytes, associated_data: bytes) -> bytes:
+        """
+        Метод для дешифрования сегмента потокового формата с проверкой дополнительных данных.
+        """
+        pass
+
+    def encrypt_stream(self, source: DataSource, segment_size: int = DEFAULT_SEGMENT_SIZE,
+                       executor: Optional['Executor'] = None,
+                       window: int = DEFAULT_PARALLEL_WINDOW) -> Iterator[bytes]:
+        """
+        Метод-генератор для потокового шифрования данных.
+
+        Возвращает заголовок, а затем зашифрованные сегменты. В памяти одновременно находится не более двух сегментов
+        (при параллельном шифровании в исполнителе executor - не более window + 1 сегментов).
+        """
+
+        if not 0 < segment_size < 2 ** 32:
+            raise ValueError(f'Недопустимый размер сегмента: {segment_size}')
+
+        header = _STREAM_HEADER.pack(STREAM_MAGIC, STREAM_VERSION, self.stream_algorithm, segment_size, os.urandom(16))
+        yield header
+
+        def segments() -> Iterator[Tuple[bytes, bytes]]:
+            blocks = iter_blocks(source, segment_size)
+            # Признак последнего сегмента становится известен только после попытки прочитать следующий блок
+            current = next(blocks, b'')
+            index = 0
+            for following in blocks:
+                yield current, header + _SEGMENT_AAD.pack(index, 0)
+                current = following
+                index += 1
+            yield current, header + _SEGMENT_AAD.pack(index, 1)
+
+        if executor is None:
+            for data, associated_data in segments():
+                yield self.encrypt_segment(data, associated_data)
+        else:
+            yield from ordered_map(executor, self.encrypt_segment, segments(), window)
+
+    def decrypt_stream(self, source: DataSource, executor: Optional['Executor'] = None,
+                       window: int = DEFAULT_PARALLEL_WINDOW) -> Iterator[bytes]:
+        """
+        Метод-генератор для потокового дешифрования данных.
+
+        Поддерживает как потоковый формат, так и формат encrypt_data (в последнем случае данные расшифровываются целиком).
+        Расшифрованные сегменты возвращаются по мере проверки; если поток поврежден или усечен, то генерируется
+        исключение ValueError, и уже полученные данные следует считать недействительными. Если задан исполнитель
+        executor, то сегменты дешифруются параллельно (не более window сегментов одновременно).
+        """
+
+        decryptor = StreamDecryptor(self)
+
+        def segments() -> Iterator[Tuple[bytes, Optional[bytes]]]:
+            for chunk in iter_chunks(source):
+                yield from decryptor.split(chunk)
+            yield from decryptor.split_final()
+
+        if executor is None:
+            for data, associated_data in segments():
+                yield decryptor.decrypt(data, associated_data)
+        else:
+            # В исполнитель передается только объект шифрования (а не дешифратор с буфером данных)
+            yield from ordered_map(executor, _decrypt, ((self, data, associated_data)
+                                                        for data, associated_data in segments()), window)
+
+
+def _parse_stream_header(crypto: CryptoInterface, header: bytes) -> int:
+    """
+    Функция проверки заголовка потока. Возвращает размер сегмента открытого текста.
+    """
+
+    magic, version, algorithm, segment_size, _ = _STREAM_HEADER.unpack(header)
+    if magic != STREAM_MAGIC:
+        raise ValueError('Данные не являются зашифрованным потоком')
+    if version != STREAM_VERSION:
+        raise ValueError(f'Неподдерживаемая версия формата зашифрованного потока: {version}')
+    if algorithm != crypto.stream_algorithm:
+        raise ValueError(f'Поток зашифрован другим алгоритмом: {algorithm}')
+    return segment_size
+
+
+class SegmentedStream:
+    """
+    Класс для произвольного доступа к сегментам зашифрованного потока с известным размером открытого текста.
+
+    Все сегменты, кроме последнего, имеют одинаковый размер, поэтому положение любого сегмента в зашифрованных данных
+    вычисляется по его номеру, и для чтения части данных достаточно получить и расшифровать только покрывающие ее
+    сегменты. Каждый сегмент проверяется так же, как при потоковом дешифровании (с учетом номера и признака
+    последнего сегмента), поэтому подмена, перестановка сегментов и усечение потока обнаруживаются.
+    """
+
+    # Размер заголовка потока
+    header_size = _STREAM_HEADER.size
+
+    def __init__(self, crypto: CryptoInterface, header: bytes, size: int) -> None:
+        if len(header) != _STREAM_HEADER.size:
+            raise ValueError('Поврежден заголовок зашифрованного потока')
+        self._crypto = crypto
+        self._header = header
+        self.segment_size = _parse_stream_header(crypto, header)
+        self.size = size
+        self.count = max(1, -(-size // self.segment_size))
+        self._wire_size = self.segment_size + crypto.segment_overhead
+
+    def segment_of(self, position: int) -> int:
+        """
+        Метод получения номера сегмента, содержащего байт открытого текста с номером position.
+        """
+
+        return min(position // self.segment_size, self.count - 1)
+
+    def wire_range(self, first: int, last: int) -> Tuple[int, int]:
+        """
+        Метод получения смещения и длины зашифрованных данных сегментов с номерами от first до last включительно.
+        """
+
+        return self.header_size + first * self._wire_size, (last - first + 1) * self._wire_size
+
+    def decrypt(self, first: int, data: bytes) -> List[bytes]:
+        """
+        Метод дешифрования подряд идущих сегментов, начиная с сегмента с номером first.
+        """
+
+        out = []
+        for index in range(first, first + max(1, -(-len(data) // self._wire_size))):
+            segment = data[(index - first) * self._wire_size:(index - first + 1) * self._wire_size]
+            final = int(index == self.count - 1)
+            expected = self.size - index * self.segment_size if final else self.segment_size
+            if index >= self.count or len(segment) != expected + self._crypto.segment_overhead:
+                raise ValueError('Зашифрованный поток усечен или не соответствует размеру файла')
+            out.append(self._crypto.decrypt_segment(segment, self._header + _SEGMENT_AAD.pack(index, final)))
+        return out
+
+
+def _decrypt(crypto: CryptoInterface, data: bytes, associated_data: Optional[bytes]) -> bytes:
+    """
+    Функция дешифрования сегмента потока (или данных, зашифрованных "одним блоком", если associated_data равно None).
+    """
+
+    if associated_data is None:
+        return crypto.decrypt_data(data)
+    return crypto.decrypt_segment(data, associated_data)
+
+
+class StreamDecryptor:
+    """
+    Класс для потокового дешифрования данных, поступающих блоками произвольного размера.
+
+    В отличие от CryptoInterface.decrypt_stream, данные не запрашиваются у источника, а передаются в метод update
+    по мере их получения (например, из тела HTTP-ответа в асинхронном коде).
+
+    Разбиение данных на сегменты (split, split_final) отделено от их дешифрования (decrypt): decrypt не изменяет
+    состояние объекта, поэтому сегменты можно дешифровать параллельно.
+    """
+
+    def __init__(self, crypto: CryptoInterface) -> None:
+        self._crypto = crypto
+        self._buffer = bytearray()
+        # Заголовок потока (None, пока он не получен полностью), размер сегмента с учетом служебных данных
+        self._header: Optional[bytes] = None
+        self._wire_size = 0
+        self._index = 0
+        # Признак того, что данные зашифрованы "одним блоком" с помощью encrypt_data
+        self._legacy = False
+
+    def update(self, chunk: bytes) -> List[bytes]:
+        """
+        Метод для передачи очередного блока зашифрованных данных. Возвращает список расшифрованных сегментов.
+        """
+
+        return [self.decrypt(data, associated_data) for data, associated_data in self.split(chunk)]
+
+    def finalize(self) -> List[bytes]:
+        """
+        Метод для завершения дешифрования. Проверяет, что поток не усечен, и возвращает последний сегмент.
+        """
+
+        return [self.decrypt(data, associated_data) for data, associated_data in self.split_final()]
+
+    def split(self, chunk: bytes) -> List[Tuple[bytes, Optional[bytes]]]:
+        """
+        Метод для передачи очередного блока зашифрованных данных. Возвращает список полностью полученных сегментов
+        в виде пар (зашифрованные данные, дополнительные аутентифицируемые данные) для передачи в decrypt.
+        """
+
+        self._buffer += chunk
+        if self._legacy:
+            return []
+        if self._header is None:
+            if len(self._buffer) < _STREAM_HEADER.size:
+                return []
+            if not self._parse_header():
+                return []
+
+        out: List[Tuple[bytes, Optional[bytes]]] = []
+        # Сегмент гарантированно не последний, если за ним в буфере есть еще данные
+        while len(self._buffer) > self._wire_size:
+            out.append(self._next_segment(bytes(self._buffer[:self._wire_size]), final=0))
+            del self._buffer[:self._wire_size]
+        return out
+
+    def split_final(self) -> List[Tuple[bytes, Optional[bytes]]]:
+        """
+        Метод для завершения разбиения на сегменты. Проверяет, что поток не усечен, и возвращает последний сегмент
+        (для данных, зашифрованных "одним блоком", - все данные с дополнительными данными None).
+        """
+
+        if self._header is None and not self._legacy and len(self._buffer) >= len(STREAM_MAGIC):
+            self._parse_header()
+        if self._legacy or self._header is None:
+            if is_stream_format(bytes(self._buffer)):
+                raise ValueError('Поврежден заголовок зашифрованного потока')
+            data = bytes(self._buffer)
+            self._buffer.clear()
+            return [(data, None)]
+
+        if not self._buffer:
+            raise ValueError('Зашифрованный поток усечен')
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return [self._next_segment(data, final=1)]
+
+    def decrypt(self, data: bytes, associated_data: Optional[bytes]) -> bytes:
+        """
+        Метод дешифрования сегмента, полученного из split/split_final.
+        """
+
+        return _decrypt(self._crypto, data, associated_data)
+
+    def _parse_header(self) -> bool:
+        """
+        Метод разбора заголовка потока. Возвращает False, если данные зашифрованы "одним блоком".
+        """
+
+        if not is_stream_format(bytes(self._buffer[:len(STREAM_MAGIC)])):
+            self._legacy = True
+            return False
+        if len(self._buffer) < _STREAM_HEADER.size:
+            raise ValueError('Поврежден заголовок зашифрованного потока')
+
+        header = bytes(self._buffer[:_STREAM_HEADER.size])
+        self._header = header
+        self._wire_size = _parse_stream_header(self._crypto, header) + self._crypto.segment_overhead
+        del self._buffer[:_STREAM_HEADER.size]
+        return True
+
+    def _next_segment(self, data: bytes, final: int) -> Tuple[bytes, bytes]:
+        assert self._header is not None
+        associated_data = self._header + _SEGMENT_AAD.pack(self._index, final)
+        self._index += 1
+        return data, associated_data
+
 
 class CryptodomeAES(CryptoInterface):
     """
     Используем алгоритм симметричной криптографии AES стороннего пакета "pycryptodome".
+
+    Пакет импортируется при создании объекта, а не при импорте модуля, чтобы импорт пакета "encrypted_yd" не требовал
+    загрузки криптографической библиотеки до начала работы с ней.
     """
 
+    # AES-EAX: nonce 16 байт + tag 16 байт
+    stream_algorithm = 1
+    segment_overhead = 32
+
     def __init__(self, key: bytes) -> None:
+        self._import()
         self._AES_key = self.hash_data(key)
+        # Для ключевого хеширования используется отдельный ключ, производный от ключа шифрования
+        self._HMAC_key = self.hash_data(b'encrypted_yd/hmac' + self._AES_key)
+
+    def _import(self) -> None:
+        from Crypto.Cipher import AES
+        from Crypto.Hash import HMAC, SHA256
+        self._aes, self._hmac, self._sha256 = AES, HMAC, SHA256
+
+    def __getstate__(self) -> Dict[str, bytes]:
+        # Модули библиотеки не сериализуются - объект можно передавать в пул процессов (ProcessPoolExecutor)
+        return {'_AES_key': self._AES_key, '_HMAC_key': self._HMAC_key}
+
+    def __setstate__(self, state: Dict[str, bytes]) -> None:
+        self.__dict__.update(state)
+        self._import()
 
     def encrypt_data(self, data: bytes) -> bytes:
         """
         Функция шифрования данных симметричным криптоалгоритмом AES.
         """
 
-        cipher = AES.new(self._AES_key, AES.MODE_EAX)
+        cipher = self._aes.new(self._AES_key, self._aes.MODE_EAX)
         nonce = cipher.nonce
         ciphertext, tag = cipher.encrypt_and_digest(data)
         return nonce + tag + ciphertext
@@ -67,7 +508,7 @@ class CryptodomeAES(CryptoInterface):
         nonce = data[:16]
         tag = data[16:32]
         ciphertext = data[32:]
-        cipher = AES.new(self._AES_key, AES.MODE_EAX, nonce=nonce)
+        cipher = self._aes.new(self._AES_key, self._aes.MODE_EAX, nonce=nonce)
         return cipher.decrypt_and_verify(ciphertext, tag)
 
     def hash_data(self, data: bytes) -> bytes:
@@ -75,4 +516,125 @@ class CryptodomeAES(CryptoInterface):
         Метод для хеширования пакета данных по алгоритму SHA256.
         """
 
-        return SHA256.new(data).digest()
+        return self._sha256.new(data).digest()
+
+    def new_keyed_hash(self) -> Any:
+        """
+        Метод, возвращающий объект HMAC-SHA256 (на основе той же хеш-функции, что и hash_data).
+        """
+
+        return self._hmac.new(self._HMAC_key, digestmod=self._sha256)
+
+    def encrypt_segment(self, data: bytes, associated_data: bytes) -> bytes:
+        """
+        Функция шифрования сегмента потока алгоритмом AES-EAX с аутентификацией дополнительных данных.
+        """
+
+        cipher = self._aes.new(self._AES_key, self._aes.MODE_EAX)
+        cipher.update(associated_data)
+        ciphertext, tag = cipher.encrypt_and_digest(data)
+        return cipher.nonce + tag + ciphertext
+
+    def decrypt_segment(self, data: bytes, associated_data: bytes) -> bytes:
+        """
+        Функция дешифрования сегмента потока алгоритмом AES-EAX с проверкой дополнительных данных.
+        """
+
+        if len(data) < self.segment_overhead:
+            raise ValueError('Поврежден сегмент зашифрованного потока')
+        cipher = self._aes.new(self._AES_key, self._aes.MODE_EAX, nonce=data[:16])
+        cipher.update(associated_data)
+        return cipher.decrypt_and_verify(data[32:], data[16:32])
+
+
+class CryptographyAESGCM(CryptoInterface):
+    """
+    Используем алгоритм AES-GCM на основе OpenSSL (сторонний пакет "cryptography"). При наличии аппаратной поддержки
+    AES (AES-NI и т. п.) шифрование выполняется значительно быстрее, чем в CryptodomeAES (см. benchmarks/bench_crypto).
+
+    Ключи шифрования и ключевого хеширования получаются из пароля так же, как в CryptodomeAES, поэтому ключевые хеши
+    содержимого совпадают. Однако данные, зашифрованные одним классом, другим не расшифровываются, поэтому класс
+    выбирается при создании хранилища на YD (в том числе для шифрования токена). Nonce каждого сегмента (96 бит)
+    выбирается случайно, поэтому одним паролем допустимо зашифровать не более 2^32 сегментов (256 ТБ при размере
+    сегмента 64 КБ).
+    """
+
+    # AES-GCM: nonce 12 байт + tag 16 байт
+    stream_algorithm = 2
+    segment_overhead = 28
+
+    def __init__(self, key: bytes) -> None:
+        self._AES_key = self.hash_data(key)
+        # Для ключевого хеширования используется отдельный ключ, производный от ключа шифрования
+        self._HMAC_key = self.hash_data(b'encrypted_yd/hmac' + self._AES_key)
+        self._import()
+
+    def _import(self) -> None:
+        from cryptography.exceptions import InvalidTag
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+        self._aesgcm, self._invalid_tag = AESGCM(self._AES_key), InvalidTag
+
+    def __getstate__(self) -> Dict[str, bytes]:
+        # Объект шифра не сериализуется - объект можно передавать в пул процессов (ProcessPoolExecutor)
+        return {'_AES_key': self._AES_key, '_HMAC_key': self._HMAC_key}
+
+    def __setstate__(self, state: Dict[str, bytes]) -> None:
+        self.__dict__.update(state)
+        self._import()
+
+    def encrypt_data(self, data: bytes) -> bytes:
+        """
+        Функция шифрования данных алгоритмом AES-GCM (формат: nonce | tag | шифртекст).
+        """
+
+        return self._encrypt(data, None)
+
+    def decrypt_data(self, data: bytes) -> bytes:
+        """
+        Функция дешифрования данных алгоритмом AES-GCM.
+        """
+
+        return self._decrypt(data, None)
+
+    def hash_data(self, data: bytes) -> bytes:
+        """
+        Метод для хеширования пакета данных по алгоритму SHA256.
+        """
+
+        return hashlib.sha256(data).digest()
+
+    def new_keyed_hash(self) -> Any:
+        """
+        Метод, возвращающий объект HMAC-SHA256 (на основе той же хеш-функции, что и hash_data).
+        """
+
+        return hmac.new(self._HMAC_key, digestmod=hashlib.sha256)
+
+    def encrypt_segment(self, data: bytes, associated_data: bytes) -> bytes:
+        """
+        Функция шифрования сегмента потока алгоритмом AES-GCM с аутентификацией дополнительных данных.
+        """
+
+        return self._encrypt(data, associated_data)
+
+    def decrypt_segment(self, data: bytes, associated_data: bytes) -> bytes:
+        """
+        Функция дешифрования сегмента потока алгоритмом AES-GCM с проверкой дополнительных данных.
+        """
+
+        return self._decrypt(data, associated_data)
+
+    def _encrypt(self, data: bytes, associated_data: Optional[bytes]) -> bytes:
+        nonce = os.urandom(12)
+        # AESGCM возвращает шифртекст, за которым следует tag; в потоке tag хранится перед шифртекстом
+        encrypted = self._aesgcm.encrypt(nonce, data, associated_data)
+        return b''.join((nonce, encrypted[-16:], encrypted[:-16]))
+
+    def _decrypt(self, data: bytes, associated_data: Optional[bytes]) -> bytes:
+        if len(data) < self.segment_overhead:
+            raise ValueError('Поврежденные зашифрованные данные')
+        try:
+            return self._aesgcm.decrypt(data[:12], data[28:] + data[12:28], associated_data)
+        except self._invalid_tag:
+            # Как и в CryptodomeAES, ошибка проверки сообщается исключением ValueError
+            raise ValueError('MAC check failed')
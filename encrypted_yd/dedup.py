@@ -0,0 +1,256 @@
+"""Модуль с описанием хранилища блоков (chunk store) для режима дедупликации.
+
+В режиме дедупликации файл разбивается на блоки переменной длины по содержимому (content-defined chunking): границы
+блоков определяются скользящим хешем (gear hash, как в FastCDC), поэтому вставка или дописывание данных меняет только
+соседние с изменением блоки. Каждый блок шифруется и хранится в отдельной директории на YD под именем, равным его
+ключевому хешу (HMAC). Одинаковые блоки (в том числе из разных файлов) хранятся один раз, а уже имеющиеся на YD блоки
+повторно не отправляются. Сам файл на YD представляется зашифрованным списком своих блоков.
+
+Поиск границ блоков выполняется с помощью пакета "numpy", если он установлен (импортируется при первом разбиении):
+скользящий хеш вычисляется сразу для участка данных векторными операциями - порядка 100 МБ/с на одно ядро. Без
+"numpy" используется реализация на чистом Python - около 5 МБ/с, что для больших файлов (образы виртуальных машин
+и т. п.) становится узким местом. Границы блоков в обоих случаях совпадают.
+
+Блоки, на которые больше не ссылается ни один файл, автоматически не удаляются.
+"""
+
+import hashlib
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+from loguru import logger
+
+from .cryptography import CryptoInterface, DataSource, iter_chunks
+
+# Размеры блоков по умолчанию: минимальный, средний и максимальный
+DEFAULT_MIN_CHUNK_SIZE = 256 * 1024
+DEFAULT_AVG_CHUNK_SIZE = 1024 * 1024
+DEFAULT_MAX_CHUNK_SIZE = 4 * 1024 * 1024
+
+_MASK_64 = (1 << 64) - 1
+# Таблица случайных 64-битных значений для каждого байта (детерминированная, чтобы границы блоков не зависели
+# от запуска)
+_GEAR = [int.from_bytes(hashlib.sha256(bytes([i])).digest()[:8], 'big') for i in range(256)]
+# Размер участка, для которого скользящий хеш вычисляется векторно за один шаг
+_SCAN_STEP = 64 * 1024
+
+# Модуль "numpy" и таблица _GEAR в виде массива (None - еще не импортировался, False - не установлен)
+_np: Any = None
+_np_gear: Any = None
+
+
+def _numpy() -> Any:
+    """
+    Функция импорта пакета "numpy" при первом обращении (False, если он не установлен).
+    """
+
+    global _np, _np_gear
+    if _np is None:
+        try:
+            import numpy
+        except ImportError:
+            logger.debug('Пакет "numpy" не установлен - границы блоков ищутся медленной реализацией на Python')
+            _np = False
+        else:
+            _np_gear = numpy.array(_GEAR, dtype=numpy.uint64)
+            _np = numpy
+    return _np
+
+
+def _mask(bits: int) -> int:
+    """
+    Функция получения маски из bits старших битов 64-битного значения.
+    """
+
+    return ((1 << bits) - 1) << (64 - bits)
+
+
+def _cut_point(data: Union[bytes, bytearray], min_size: int, avg_size: int, max_size: int, mask_s: int,
+               mask_l: int) -> int:
+    """
+    Функция поиска границы первого блока в data (нормализованный поиск, как в FastCDC).
+
+    До среднего размера используется "строгая" маска mask_s, после него - "мягкая" mask_l, что сужает разброс
+    размеров блоков. Первые min_size байт не хешируются.
+    """
+
+    n = len(data)
+    if n <= min_size:
+        return n
+    end = min(n, max_size)
+    normal = min(avg_size, end)
+    if _numpy():
+        return _cut_point_numpy(data, min_size, normal, end, mask_s, mask_l)
+    gear = _GEAR
+    h = 0
+    i = min_size
+    while i < normal:
+        h = ((h << 1) + gear[data[i]]) & _MASK_64
+        if not h & mask_s:
+            return i + 1
+        i += 1
+    while i < end:
+        h = ((h << 1) + gear[data[i]]) & _MASK_64
+        if not h & mask_l:
+            return i + 1
+        i += 1
+    return end
+
+
+def _cut_point_numpy(data: Union[bytes, bytearray], min_size: int, normal: int, end: int, mask_s: int,
+                     mask_l: int) -> int:
+    """
+    Векторный вариант поиска границы блока (см. _cut_point).
+
+    Значение скользящего хеша в позиции i - сумма gear[data[i - k]] << k по 64 последним байтам (начиная с min_size),
+    поэтому хеши участка вычисляются за 6 шагов удвоения окна: H_2s[i] = (H_s[i - s] << s) + H_s[i].
+    """
+
+    np = _np
+    view = np.frombuffer(data, dtype=np.uint8, count=end)
+    for start, stop, mask in ((min_size, normal, mask_s), (normal, end, mask_l)):
+        while start < stop:
+            step_end = min(stop, start + _SCAN_STEP)
+            # Хешу в позиции start нужны до 63 предыдущих байтов, но не раньше min_size
+            first = max(min_size, start - 63)
+            h = _np_gear[view[first:step_end]]
+            span = 1
+            while span < 64:
+                # Пересечение операндов numpy обрабатывает так, будто правая часть вычислена до присваивания
+                h[span:] += h[:-span] << np.uint64(span)
+                span *= 2
+            hits = np.flatnonzero(h[start - first:] & np.uint64(mask) == 0)
+            if hits.size:
+                return start + int(hits[0]) + 1
+            start = step_end
+    return end
+
+
+def content_defined_chunks(source: DataSource,
+                           min_size: int = DEFAULT_MIN_CHUNK_SIZE,
+                           avg_size: int = DEFAULT_AVG_CHUNK_SIZE,
+                           max_size: int = DEFAULT_MAX_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Функция-генератор, разбивающая данные на блоки переменной длины по содержимому.
+
+    В памяти одновременно находится не более max_size байт (плюс один прочитанный блок источника).
+    """
+
+    if not 0 < min_size <= avg_size <= max_size:
+        raise ValueError(f'Недопустимые размеры блоков: {min_size}, {avg_size}, {max_size}')
+    bits = max(avg_size.bit_length() - 1, 1)
+    mask_s, mask_l = _mask(bits + 2), _mask(max(bits - 2, 1))
+
+    buffer = bytearray()
+    for data in iter_chunks(source, max_size):
+        buffer += data
+        while len(buffer) >= max_size:
+            cut = _cut_point(buffer, min_size, avg_size, max_size, mask_s, mask_l)
+            yield bytes(buffer[:cut])
+            del buffer[:cut]
+    while buffer:
+        cut = _cut_point(buffer, min_size, avg_size, max_size, mask_s, mask_l)
+        yield bytes(buffer[:cut])
+        del buffer[:cut]
+
+
+class ChunkStore:
+    """
+    Хранилище зашифрованных блоков в директории remote_path на YD.
+
+    Имя блока - шестнадцатеричная запись ключевого хеша его содержимого (CryptoInterface.keyed_hash_data), поэтому
+    без знания ключа по именам блоков нельзя проверить предположение об их содержимом. Класс потокобезопасен.
+    """
+
+    def __init__(self, connector: Any, crypto: CryptoInterface, remote_path: str,
+                 min_size: int = DEFAULT_MIN_CHUNK_SIZE,
+                 avg_size: int = DEFAULT_AVG_CHUNK_SIZE,
+                 max_size: int = DEFAULT_MAX_CHUNK_SIZE) -> None:
+        self._yd = connector
+        self._crypto = crypto
+        self._remote_path = remote_path.rstrip('/')
+        self._sizes = (min_size, avg_size, max_size)
+        self._lock = threading.Lock()
+        # Имена блоков, имеющихся на YD (None - список еще не запрашивался), и блоки, отправляемые в данный момент
+        self._known: Optional[Set[str]] = None
+        self._pending: Dict[str, threading.Event] = dict()
+
+    def refresh(self) -> None:
+        """
+        Метод получения списка блоков, имеющихся на YD (при отсутствии директории хранилища она создается).
+        """
+
+        try:
+            names = {_['name'] for _ in self._yd.listdir(self._remote_path)}
+        except FileNotFoundError:
+            logger.debug(f'Хранилище блоков "{self._remote_path}" не найдено, создаем его')
+            self._yd.mkdir(self._remote_path)
+            names = set()
+        with self._lock:
+            self._known = names
+
+    def put(self, chunk: bytes) -> str:
+        """
+        Метод сохранения блока на YD (если его там еще нет). Возвращает имя блока.
+        """
+
+        if self._known is None:
+            self.refresh()
+        name = self._crypto.keyed_hash_data(chunk).hex()
+        while True:
+            with self._lock:
+                assert self._known is not None
+                if name in self._known:
+                    return name
+                event = self._pending.get(name)
+                if event is None:
+                    # Блок отправляет текущий поток
+                    event = self._pending[name] = threading.Event()
+                    break
+            # Такой же блок отправляется другим потоком - дожидаемся результата
+            event.wait()
+
+        try:
+            self._yd.upload_stream(self._crypto.encrypt_stream([chunk]), self._remote_path + '/' + name)
+            with self._lock:
+                self._known.add(name)
+        finally:
+            with self._lock:
+                del self._pending[name]
+            event.set()
+        return name
+
+    def get(self, name: str) -> bytes:
+        """
+        Метод получения блока с YD с проверкой его целостности по имени.
+        """
+
+        chunk = b''.join(self._crypto.decrypt_stream(self._yd.download_stream(self._remote_path + '/' + name)))
+        if self._crypto.keyed_hash_data(chunk).hex() != name:
+            raise ValueError(f'Содержимое блока "{name}" не соответствует его имени')
+        return chunk
+
+    def store(self, source: DataSource, hasher: Any = None) -> List[Tuple[str, int]]:
+        """
+        Метод разбиения данных на блоки и сохранения новых блоков на YD.
+
+        Возвращает список блоков (имя, размер). Если задан hasher, то в него попутно добавляются все данные.
+        """
+
+        chunks = []
+        for chunk in content_defined_chunks(source, *self._sizes):
+            if hasher is not None:
+                hasher.update(chunk)
+            chunks.append((self.put(chunk), len(chunk)))
+        return chunks
+
+    def load(self, chunks: Iterable[Tuple[str, int]]) -> Iterator[bytes]:
+        """
+        Метод-генератор, возвращающий содержимое блоков из списка (имя, размер) по порядку.
+        """
+
+        for name, size in chunks:
+            chunk = self.get(name)
+            if len(chunk) != size:
+                raise ValueError(f'Размер блока "{name}" не соответствует списку блоков')
+            yield chunk
@@ -1,45 +1,102 @@
 """Модуль с описанием основного класса "EncryptedYandexDisk" пакета "encrypted_yd"."""
 
 import os
-import sys
+import json
+import base64
+import time
+from concurrent.futures import Executor
+from dataclasses import dataclass
 from uuid import uuid4
-from typing import Union, Any
+from typing import Union, Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
 from loguru import logger
 
-from .connector import *
-from .cryptography import *
+from .bundle import (DEFAULT_BUNDLE_SIZE, MEMBER_BLOCK_SIZE, BlockReader, BundleWriter, group_files, is_member_key,
+                     member_key, member_meta, read_index, split_member_path)
+from .compression import Codec, compress_stream, decompress_stream, get_codec, sample_compressible
+from .connector import ConnectorInterface, ConnectorYaDisk, InstrumentedConnector, ThrottledConnector
+from .cryptography import CryptoInterface, CryptodomeAES, iter_hashed
+from .dedup import ChunkStore
+from .listing import DEFAULT_PAGE_SIZE, PropertiesDecoder, RemoteEntry, decode_page
+from .manifest import Manifest
+from .metadata import pack_metadata
+from .metrics import NULL_METRICS, Metrics
+from .multipart import DEFAULT_PART_SIZE, MultipartTransfer, ResumeJournal
+from .remote_file import DEFAULT_CACHE_SEGMENTS, RemoteFile, stream_objects
+from .scheduler import BandwidthLimiter, ProgressCallback, SchedulePolicy
+from .transfer import ListingCache, PathFilter, TransferPool, TransferResult
 
-logger.remove()
-logger.add(sys.stderr, level="DEBUG")
-logger.add('logger.log', format='{time} {level} {message}', level='INFO', rotation='10 MB', compression='zip')
+# Интерфейсы и реализации коннектора и криптографического объекта по-прежнему можно импортировать из этого модуля
+__all__ = ['EncryptedYandexDiskBase', 'EncryptedYandexDisk', 'ConnectorInterface', 'ConnectorYaDisk',
+           'CryptoInterface', 'CryptodomeAES']
 
+# Количество задач скачивания в очереди пула на один рабочий поток (см. receive_files_and_dirs)
+RECEIVE_PENDING_PER_WORKER = 4
 
-class EncryptedYandexDisk:
+
+@dataclass
+class _SendRun:
+    """
+    Параметры и состояние одной операции отправки (send_files_and_dirs), передаваемые в рабочие потоки.
     """
-    Класс для хранения файлов на YD в зашифрованном виде.
 
-    Содержимое файлов перед отправкой на YD шифруются. Имена файлов и/или директорий преобразуются в произвольные
-    названия, получаемые с помощью uuid4(), при этом исходные имена сохраняются в специальные структуры,
-    ассоциированные, соответственно, с файлами и директориями на YD (архитектура YD предусматривает возможность
-    прикрепления к пользовательскому файлу или директории дополнительной пользовательской информации, хранимой
-    в специальной структуре). При скачивании на локальный диск содержимое фалов, их имена, а также имена директорий
-    восстанавливаются (преобразуются к исходному виду).
+    # Кеш списков файлов и директорий на YD на время операции
+    listings: ListingCache
+    # Отправлять ли повторно измененные файлы
+    incremental: bool = False
+    # Отправлять ли файлы в режиме дедупликации
+    dedup: bool = False
+    # Алгоритм сжатия содержимого перед шифрованием (None - без сжатия)
+    codec: Optional[Codec] = None
+    # Размер, начиная с которого файлы отправляются по частям (None - всегда целиком)
+    multipart_threshold: Optional[int] = None
+    # Размер, меньше которого файлы упаковываются в пакеты (None - не упаковываются), и размер пакета
+    pack_threshold: Optional[int] = None
+    bundle_size: int = DEFAULT_BUNDLE_SIZE
 
+
+class EncryptedYandexDiskBase:
+    """
+    Общая часть синхронного (EncryptedYandexDisk) и асинхронного (AsyncEncryptedYandexDisk) классов для хранения
+    файлов на YD в зашифрованном виде: проверка аргументов, подготовка путей и свойств файлов/директорий, разбор
+    списка файлов и директорий, полученного с YD.
     """
 
+    # Класс коннектора, используемый, если коннектор не указан явно
+    default_connector: Any = None
+
     def __init__(self
                  , app_base_path: str
                  , encrypted_token: bytes
                  , password: str
-                 , connector: ConnectorInterface = ConnectorYaDisk
-                 , crypto: CryptoInterface = CryptodomeAES
+                 , connector: Any = None
+                 , crypto: Any = CryptodomeAES
                  # Ниже указываем названия полей в прикрепляемой к файлу/директории структуре на YD, в которых
                  # хранятся в зашифрованном виде исходные имена файлов/директорий, а также их размер. Такие
                  # "неговорящие" названия полей, заданные по умолчанию, выбраны специально, чтобы третьим лицам
                  # было сложнее понять, что в них хранится.
                  , field_name_for_path: str = 'my1'
                  , field_name_for_len: str = 'my2'
+                 # Название поля, в котором в зашифрованном виде хранятся дополнительные сведения о файле (ключевой
+                 # хеш содержимого, время модификации и т. п.) в формате JSON
+                 , field_name_for_meta: str = 'my3'
+                 # Название поля, в котором хранятся все сведения о файле/директории в упакованном формате (см. модуль
+                 # metadata), и признак использования этого формата для новых файлов/директорий. Свойства в прежнем
+                 # формате (в трех полях, указанных выше) читаются в любом случае.
+                 , field_name_for_packed: str = 'my0'
+                 , packed_metadata: bool = True
+                 # Путь к файлу локального зашифрованного манифеста дерева на YD (если не задан, то манифест не
+                 # используется) и время в секундах, в течение которого содержимое директорий берется из манифеста
+                 # без сверки с YD
+                 , manifest_path: Optional[str] = None
+                 , manifest_ttl: float = 3600
+                 # Путь на YD (относительно app_base_path) к хранилищу блоков для режима дедупликации
+                 , chunk_store_path: str = '.chunks'
+                 # Путь к файлу локального журнала передачи больших файлов по частям (если не задан, то журнал
+                 # хранится в памяти), размер части и количество одновременно передаваемых частей одного файла
+                 , journal_path: Optional[str] = None
+                 , part_size: int = DEFAULT_PART_SIZE
+                 , part_workers: int = 4
                  ) -> None:
 
         # Валидируем значение аргумента app_base_path
@@ -55,9 +112,15 @@ class EncryptedYandexDisk:
 
         self._field_name_for_path = field_name_for_path
         self._field_name_for_len = field_name_for_len
+        self._field_name_for_meta = field_name_for_meta
+        self._field_name_for_packed = field_name_for_packed
+        self._packed_metadata = packed_metadata
 
         # Создаем экземпляр класса, поддерживающий CryptoInterface, для получения доступа к криптографическим функциям
         self._crypto = crypto(password.encode('utf-8'))
+        # Расшифрование свойств файлов/директорий, полученных с YD
+        self._decoder = PropertiesDecoder(self._crypto, field_name_for_path, field_name_for_len, field_name_for_meta,
+                                          field_name_for_packed)
 
         # Пробуем расшифровать токен
         try:
@@ -66,7 +129,13 @@ class EncryptedYandexDisk:
             logger.error("Внимание: ошибака расшифрования токена! Возможно Вы ввели неверный пароль!")
             raise ValueError
         else:
-            self._yd = connector(token=self._token)
+            self._yd = (connector or self.default_connector)(token=self._token)
+
+        self._manifest = Manifest(manifest_path, self._crypto, manifest_ttl) if manifest_path else None
+        self._chunk_store_path = chunk_store_path
+        self._journal_path = journal_path
+        self._part_size = part_size
+        self._part_workers = part_workers
 
     def _prepare_remote_path(self, path: str) -> str:
         """
@@ -81,119 +150,110 @@ class EncryptedYandexDisk:
         else:
             return path.rstrip('/')
 
-    def _prepare_properties(self, path: str, file_or_dir_len: Union[int, str]) -> Dict:
+    def _prepare_properties(self, path: str, file_or_dir_len: Union[int, str], meta: Optional[Dict] = None,
+                            obj_type: str = 'file') -> Dict:
         """
         Функция подготовки словаря свойств, который прикрепляется к файлу/директории на YD (в соответствии с API YD).
 
         В словарь свойств включается зашифрованное имя исходного файла/директории, его/ее размер. Название полей берется
         из "self._field_name_for_path" и "self._field_name_for_len", соответственно. Эти названия имеет смысл делать
-        "неговорящими" для того, чтобы третьи лица не могли легко определить их содержимое.
+        "неговорящими" для того, чтобы третьи лица не могли легко определить их содержимое. Если задан словарь meta
+        (дополнительные сведения о файле), то он также включается в свойства (поле "self._field_name_for_meta").
+
+        Если используется упакованный формат, то все сведения (включая тип объекта obj_type) шифруются одним блоком
+        и записываются в поле "self._field_name_for_packed".
         """
 
+        if self._packed_metadata:
+            packed = pack_metadata(path, int(file_or_dir_len), obj_type, meta or dict())
+            return {self._field_name_for_packed: base64.b85encode(self._crypto.encrypt_data(packed)).decode('ascii')}
+
         properties = {
             self._field_name_for_path: self._crypto.encrypt_data(path.encode('utf-8')).hex(),
             self._field_name_for_len: self._crypto.encrypt_data(str(file_or_dir_len).encode('utf-8')).hex()
         }
+        if meta:
+            properties[self._field_name_for_meta] = self._crypto.encrypt_data(json.dumps(meta).encode('utf-8')).hex()
         return properties
 
-    def send_files_and_dirs(self, local_path: str, remote_dir_path: str) -> None:
+    def _file_meta(self, st: os.stat_result, hasher: Any) -> Dict:
         """
-        Функция рекурсивной отправки файлов и директорий на YD.
+        Функция формирования дополнительных сведений о файле: ключевой хеш содержимого и время модификации (в нс).
         """
 
-        local_path = local_path.replace('\\', '/').rstrip('/')
-        remote_dir_path = self._prepare_remote_path(remote_dir_path)
+        return {'hash': hasher.digest().hex(), 'mtime': st.st_mtime_ns}
 
-        if self._yd.patch(remote_dir_path, properties={})['type'] != 'dir':
-            error_str = 'Ошибка: Вы указали неверное имя каталога на ЯндексДиске.'
-            logger.error(error_str)
-            raise ValueError(error_str)
+    def _compress_blocks(self, blocks: Iterable[bytes], codec: Optional[Codec]) -> Tuple[Iterator[bytes], Dict]:
+        """
+        Функция подготовки содержимого файла к шифрованию: если задан алгоритм сжатия и первый блок данных сжимается
+        хорошо, то данные сжимаются.
 
-        # Создаем структуру со свойствами файла/директории, которая будет храниться на YD (в соответствии с API YD):
-        # в поле "self._field_name_for_path" будет храниться исходное имя файла/директории в зашифрованном виде;
-        # в поле "self._field_name_for_len" будет храниться размер файла/директории в зашифрованном виде.
-        properties = self._prepare_properties(os.path.basename(local_path), os.path.getsize(local_path))
-
-        # Отправляем директорию
-        if os.path.isdir(local_path):
-            # Создаем словарь соответствий путей локальных директорий их путям на YD
-            paths_dict = dict()
-            paths_dict[local_path] = remote_dir_path
-
-            for local_root, dirs, files in os.walk(local_path):
-                # Сразу преобразуем local_root к необходимому виду
-                local_root = local_root.replace('\\', '/')
-
-                # Получаем список файлов и каталогов на YD для конкретной директории
-                list_files_and_dirs = self.list_files_and_dirs(paths_dict[local_root])
-
-                for d in dirs:
-                    # Для каждой директории проверяем, нет ли ее уже на YD (с измененным именем)
-                    # Если нет, то создаем соответствующую директорию с измененным именем
-                    if d not in list_files_and_dirs['names']:
-                        logger.debug(f'Директории "{d}" нет на YD, она будет создана с измененным именем.')
-
-                        # Подготавливаем структуру свойств для данной директории
-                        properties = self._prepare_properties(d, os.path.getsize(os.path.join(local_root, d)))
-
-                        # Формируем имя для данной директории, под которым она будет храниться на YD
-                        new_dir_name = str(uuid4())
-
-                        # Формируем полное имя директории на YD с учетом ее нового имени
-                        remote_root = paths_dict[local_root] + '/' + new_dir_name
-                        # Сохраняем в словарь соответствий локальных и удаленных путей полученный remote_root
-                        paths_dict[local_root + '/' + d] = remote_root
-
-                        # Создаем директорию на YD с новым именем
-                        self._yd.mkdir(remote_root)
-                        # Прикрепляем к ней структуру со свойствами (описана выше)
-                        self._yd.patch(remote_root, properties)
-                    else:
-                        logger.debug(f'Директория "{d}" уже существует на YD, она не будет создана повторно.')
-                        # Получаем путь к директории на YD с ее измененным именем.
-                        # Используем итератор, т. к. нужно достать значение из множества, не удаляя его в множестве.
-                        dir_path_in_yd = paths_dict[local_root] + '/' + next(iter(list_files_and_dirs['names'][d]))
-                        paths_dict[local_root + '/' + d] = dir_path_in_yd
-
-                for f in files:
-                    # Для каждого файла проверяем, нет ли его уже на YD (с измененным именем)
-                    # Если нет, то отправляем (рекурсивно) его на YD сизмененным именем
-                    if f in list_files_and_dirs['names']:
-                        logger.debug(f'Файл "{f}" уже есть на ЯндексДиске... пропускаем.')
-                    else:
-                        self.send_files_and_dirs(local_root + '/' + f, paths_dict[local_root])
-        # Отправляем файл
-        else:
-            remote_files = self.list_files_and_dirs(remote_dir_path)
-            if os.path.basename(local_path) in remote_files['names']:
-                logger.debug(f'Файл "{os.path.basename(local_path)}" уже есть на ЯндексДиске... пропускаем.')
-            else:
-                # Открываем файл локально
-                with open(local_path, "rb") as f:
-                    # Формируем для него имя, под которым он будет храниться на YD
-                    new_file_name = str(uuid4())
-                    # Создаем шифрованную версию исходного файла с new_file_name
-                    with open(new_file_name, mode='wb') as fw:
-                        fw.write(self._crypto.encrypt_data(f.read()))
-
-                    # Формируем для файла полный путь на YD
-                    remote_path = self._prepare_remote_path(remote_dir_path + '/' + new_file_name)
-                    logger.debug(f'Отправляем файл "{local_path}" (измененное имя "{new_file_name}") на YD')
-                    # Отправляем файл на YD
-                    self._yd.upload(new_file_name, remote_path)
-                    # Прикрепляем к нему структуру со свойствами (описана выше)
-                    self._yd.patch(remote_path, properties=properties)
-                    # Удаляем локальную шифрованную версию файла
-                    os.remove(new_file_name)
-
-    def list_files_and_dirs(self, remote_path: str) -> Dict[str, Dict]:
+        Возвращает итератор по блокам данных и словарь дополнительных сведений о файле (название алгоритма сжатия).
         """
-        Функция получения списка файлов и директорий с YD.
+
+        if codec is None:
+            return iter(blocks), dict()
+        compressible, blocks = sample_compressible(blocks)
+        if not compressible:
+            logger.debug('Данные сжимаются плохо (вероятно, уже сжаты) - отправляем их без сжатия')
+            return blocks, dict()
+        return compress_stream(blocks, codec), {'codec': codec.name}
+
+    def _listing_from_manifest(self, remote_path: str) -> Optional[Dict[str, Dict]]:
         """
+        Функция получения списка файлов и директорий (см. list_files_and_dirs) из манифеста.
 
-        remote_path = self._prepare_remote_path(remote_path)
-        # Получаем структуру со свойствами файлов/директорий для указанного пути на YD (в соответствии с API YD):
-        properties = self._yd.listdir(remote_path)
+        Возвращает None, если манифест не используется или директория давно не сверялась с YD.
+        """
+
+        if self._manifest is None:
+            return None
+        records = self._manifest.listing(remote_path)
+        if records is None:
+            return None
+
+        out_dict: Dict[str, Dict] = {'uuids': dict(), 'names': dict(), 'meta': dict()}
+        for uuid, record in records:
+            out_dict['uuids'][uuid] = (record['name'], record['size'], record['type'])
+            if record['type'] != 'bundle':
+                out_dict['names'].setdefault(record['name'], set()).add(uuid)
+            out_dict['meta'][uuid] = record.get('meta', dict())
+        return out_dict
+
+    def _store_listing(self, remote_path: str, listing: Dict[str, Dict]) -> None:
+        """
+        Функция сохранения в манифест результата сверки содержимого директории с YD.
+        """
+
+        if self._manifest is not None:
+            self._manifest.replace_dir(remote_path, [
+                (uuid, {'name': obj_name, 'size': obj_len, 'type': obj_type, 'meta': listing['meta'].get(uuid, {})})
+                for uuid, (obj_name, obj_len, obj_type) in listing['uuids'].items()
+            ])
+
+    def _manifest_add(self, remote_dir_path: str, uuid: str, name: str, size: Union[int, str], obj_type: str,
+                      meta: Optional[Dict] = None) -> None:
+        """
+        Функция добавления (обновления) в манифесте файла/директории, созданной на YD.
+        """
+
+        if self._manifest is not None:
+            self._manifest.add(remote_dir_path, uuid,
+                               {'name': name, 'size': str(size), 'type': obj_type, 'meta': meta or dict()})
+
+    def _manifest_remove(self, remote_path: str) -> None:
+        """
+        Функция удаления из манифеста файла/директории, удаленной с YD.
+        """
+
+        if self._manifest is not None:
+            self._manifest.remove(self._prepare_remote_path(remote_path))
+
+    def _build_listing(self, remote_path: str, properties: Iterable[Dict]) -> Dict[str, Dict]:
+        """
+        Функция преобразования списка свойств файлов/директорий, полученного с YD, в словарь словарей
+        (см. list_files_and_dirs).
+        """
 
         # Создаем словарь словарей для хранения описаний файлов/директорий в удобном для использования виде
         out_dict: Dict[str, Dict] = dict()
@@ -209,29 +269,632 @@ class EncryptedYandexDisk:
         # Например, по исходному имени, можем определить измененное (наличие записи в данном словаре указывает на то,
         # что на YD имеется файл с таким же зашифрованным именем, как и в локальной директории.
         out_dict['names'] = dict()
+        # Ниже словарь, в котором ключ - имя файла/директории на YD (измененное). Значение - словарь дополнительных
+        # сведений о файле (ключевой хеш содержимого "hash", время модификации в наносекундах "mtime" и т. п.).
+        # Для директорий и файлов, отправленных на YD прежними версиями пакета, словарь пуст.
+        # Пакеты мелких файлов (см. модуль bundle) имеют тип "bundle" и в словаре 'names' не учитываются.
+        out_dict['meta'] = dict()
+
+        entries, errors = self._decoder.decode_entries(properties)
+        # Поскольку базовый путь может не содержать пользовательских зашифрованных данных в ассоциированной с ним
+        # структуре, то возможны ошибки, которые мы игнорируем в таком случае.
+        if remote_path != self._app_base_path:
+            for obj_uuid, error in errors:
+                logger.error(f'Ошибка "{error}" с файлом {remote_path}/{obj_uuid}')
+        for entry in entries:
+            out_dict['uuids'][entry.uuid] = (entry.name, entry.size, entry.type)
+            if entry.type != 'bundle':
+                out_dict['names'].setdefault(entry.name, set()).add(entry.uuid)
+            out_dict['meta'][entry.uuid] = entry.meta
+        return out_dict
+
+    def _decode_properties(self, properties: Dict) -> Tuple[str, str, Dict]:
+        """
+        Функция расшифрования структуры со свойствами файла/директории, полученной с YD.
+
+        Возвращает исходное имя, исходный размер и словарь дополнительных сведений (пустой, если их нет).
+        """
+
+        return self._decoder.decode(properties)
+
+
+class EncryptedYandexDisk(EncryptedYandexDiskBase):
+    """
+    Класс для хранения файлов на YD в зашифрованном виде.
+
+    Содержимое файлов перед отправкой на YD шифруются. Имена файлов и/или директорий преобразуются в произвольные
+    названия, получаемые с помощью uuid4(), при этом исходные имена сохраняются в специальные структуры,
+    ассоциированные, соответственно, с файлами и директориями на YD (архитектура YD предусматривает возможность
+    прикрепления к пользовательскому файлу или директории дополнительной пользовательской информации, хранимой
+    в специальной структуре). При скачивании на локальный диск содержимое фалов, их имена, а также имена директорий
+    восстанавливаются (преобразуются к исходному виду).
+
+    """
+
+    default_connector = ConnectorYaDisk
+
+    def __init__(self, *args: Any, metrics: Optional[Metrics] = None, crypto_executor: Optional[Executor] = None,
+                 bandwidth: Optional[BandwidthLimiter] = None, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        # Исполнитель для параллельного шифрования/дешифрования сегментов содержимого файлов (если не задан, то
+        # сегменты обрабатываются в потоке, передающем файл). Исполнителем управляет вызывающая сторона.
+        self._crypto_executor = crypto_executor
+        # Реестр сведений о производительности (если не задан, то сведения не собираются). Обращения к API YD
+        # измеряются оберткой коннектора, этапы обработки данных - методами этого класса.
+        self._metrics = metrics or NULL_METRICS
+        # Учет переданных данных в ходе операции и общее ограничение скорости отправки и скачивания данных (изменяется
+        # вызывающей стороной во время работы)
+        self._yd = ThrottledConnector(self._yd, bandwidth)
+        if metrics is not None:
+            self._yd = InstrumentedConnector(self._yd, metrics)
+        # Хранилище блоков для режима дедупликации (обращение к YD выполняется только при его использовании)
+        self._chunk_store = ChunkStore(self._yd, self._crypto, self._prepare_remote_path(self._chunk_store_path))
+        # Передача больших файлов по частям
+        self._multipart = MultipartTransfer(self._yd, self._crypto, ResumeJournal(self._journal_path),
+                                            self._part_size, self._part_workers, crypto_executor)
+
+    def send_files_and_dirs(self, local_path: str, remote_dir_path: str, max_workers: int = 1,
+                            incremental: bool = False, dedup: bool = False,
+                            compression: Optional[str] = None,
+                            multipart_threshold: Optional[int] = None,
+                            pack_threshold: Optional[int] = None,
+                            bundle_size: int = DEFAULT_BUNDLE_SIZE,
+                            schedule: Optional[SchedulePolicy] = None,
+                            progress: Optional[ProgressCallback] = None) -> TransferResult:
+        """
+        Функция рекурсивной отправки файлов и директорий на YD.
+
+        Файлы отправляются пулом из max_workers рабочих потоков. Директории создаются на YD до того, как начнется
+        отправка их содержимого. Ошибки при отправке отдельных файлов/директорий не прерывают работу, а возвращаются
+        в итоговой сводке TransferResult.
+
+        Каждая директория на YD запрашивается (listdir) и расшифровывается не более одного раза за вызов: списки
+        хранятся в кеше ListingCache и пополняются по мере создания новых файлов и директорий.
+
+        По умолчанию файл, имя которого уже есть на YD, пропускается. Если incremental равно True, то такой файл
+        повторно отправляется, если изменилось его содержимое (старый объект на YD при этом удаляется). Файлы, у которых
+        не изменились размер и время модификации, не перечитываются и не хешируются.
+
+        Если dedup равно True, то файлы отправляются в режиме дедупликации: содержимое разбивается на блоки по
+        содержимому, блоки хранятся в общем хранилище (chunk_store_path) по одному экземпляру, а на YD вместо файла
+        сохраняется зашифрованный список его блоков. Уже имеющиеся в хранилище блоки повторно не отправляются.
+
+        Параметр compression задает алгоритм сжатия содержимого перед шифрованием ('zlib', 'lzma' или, если
+        установлен пакет "zstandard", 'zstd'). Файлы, первый блок которых сжимается плохо, отправляются без сжатия.
+        В режиме дедупликации сжатие не применяется.
+
+        Файлы размером не менее multipart_threshold байт отправляются по частям (см. модуль multipart): части
+        передаются параллельно, а прерванная отправка при повторном вызове продолжается с недостающих частей.
+        Такие файлы не сжимаются и не дедуплицируются.
+
+        Файлы размером меньше pack_threshold байт упаковываются в пакеты (см. модуль bundle): новые мелкие файлы одной
+        директории отправляются группами суммарным размером не более bundle_size байт - одним объектом на YD
+        с зашифрованным индексом. Упакованные файлы не сжимаются и не дедуплицируются, а ошибка при отправке пакета
+        относится ко всем его файлам. Измененный файл, прежняя версия которого упакована, отправляется в пакете
+        независимо от размера (только индекс нового пакета может заменить член прежнего пакета).
+
+        Порядок отправки файлов (в порядке обхода, сначала мелкие или сначала крупные) и выделение рабочих потоков для
+        крупных файлов задаются политикой schedule (см. модуль scheduler). Функции progress по завершении отправки
+        каждого файла (пакета) и по мере отправки данных передаются сведения о ходе операции TransferProgress
+        (вызывается из рабочих потоков).
+        """
+
+        local_path = local_path.replace('\\', '/').rstrip('/')
+        remote_dir_path = self._prepare_remote_path(remote_dir_path)
+        codec = get_codec(compression) if compression else None
+        start, since = time.perf_counter(), self._metrics.snapshot()
+
+        # Если директория недавно сверялась с YD, то она заведомо существует - повторно ее не проверяем
+        if (self._manifest is None or not self._manifest.is_fresh(remote_dir_path)) \
+                and self._yd.patch(remote_dir_path, properties={})['type'] != 'dir':
+            error_str = 'Ошибка: Вы указали неверное имя каталога на ЯндексДиске.'
+            logger.error(error_str)
+            raise ValueError(error_str)
+
+        # Параметры текущей операции и кеш списков файлов и директорий на YD на время ее выполнения
+        run = _SendRun(ListingCache(self.list_files_and_dirs), incremental=incremental, dedup=dedup, codec=codec,
+                       multipart_threshold=multipart_threshold, pack_threshold=pack_threshold,
+                       bundle_size=bundle_size)
+        if dedup:
+            # Список блоков в хранилище запрашивается один раз за операцию
+            self._chunk_store.refresh()
+
+        # Каждый рабочий поток может передавать большой файл в part_workers запросов
+        self._yd.reserve_sessions(max_workers * self._part_workers)
+        with TransferPool(max_workers, TransferResult(), policy=schedule, progress=progress) as pool:
+            # Отправляем директорию
+            if os.path.isdir(local_path):
+                # Создаем словарь соответствий путей локальных директорий их путям на YD
+                paths_dict = dict()
+                paths_dict[local_path] = remote_dir_path
+
+                for local_root, dirs, files in os.walk(local_path):
+                    # Сразу преобразуем local_root к необходимому виду
+                    local_root = local_root.replace('\\', '/')
+
+                    try:
+                        # Получаем список файлов и каталогов на YD для конкретной директории (для директорий,
+                        # созданных в ходе текущей операции, запрос к YD не выполняется)
+                        list_files_and_dirs = run.listings.get(paths_dict[local_root])
+                    except Exception as e:
+                        # Содержимое директории отправить не получится - пропускаем все поддерево
+                        pool.fail(local_root, e)
+                        dirs.clear()
+                        continue
+
+                    # Директории создаются в текущем потоке: os.walk обходит дерево сверху вниз, поэтому директория
+                    # на YD гарантированно создается раньше, чем в пул попадают файлы из нее
+                    for d in list(dirs):
+                        try:
+                            paths_dict[local_root + '/' + d] = self._send_dir(
+                                local_root + '/' + d, paths_dict[local_root], run)
+                        except Exception as e:
+                            # Директорию создать не удалось - ее поддерево не обходим
+                            pool.fail(local_root + '/' + d, e)
+                            dirs.remove(d)
+
+                    # Мелкие файлы директории собираются для упаковки и ставятся в очередь пакетами
+                    packed: List[Tuple[str, Set[str], int]] = []
+                    for f in files:
+                        self._schedule_file(pool, local_root + '/' + f, paths_dict[local_root], run, packed)
+                    self._schedule_bundles(pool, packed, paths_dict[local_root], run)
+            # Отправляем файл
+            else:
+                packed = []
+                self._schedule_file(pool, local_path, remote_dir_path, run, packed)
+                self._schedule_bundles(pool, packed, remote_dir_path, run)
+
+        pool.result.report = self._metrics.report(since, time.perf_counter() - start)
+        return pool.result
+
+    def _schedule_file(self, pool: TransferPool, local_path: str, remote_dir_path: str, run: '_SendRun',
+                       packed: Optional[List[Tuple[str, Set[str], int]]] = None) -> None:
+        """
+        Функция принятия решения об отправке файла и постановки его в очередь пула.
+
+        Если задан список packed и файл подлежит упаковке, то вместо постановки в очередь файл (путь, ключи прежних
+        версий на YD, размер) добавляется в этот список.
+        """
+
+        f = os.path.basename(local_path)
+        list_files_and_dirs = run.listings.get(remote_dir_path)
+        # Для каждого файла проверяем, нет ли его уже на YD (с измененным именем)
+        # Если нет, то отправляем его на YD с измененным именем
+        if f not in list_files_and_dirs['names']:
+            old_uuids: Set[str] = set()
+        elif not run.incremental or not self._is_modified(local_path, list_files_and_dirs):
+            logger.debug(f'Файл "{f}" уже есть на ЯндексДиске... пропускаем.')
+            pool.result.skipped.append(local_path)
+            return
+        else:
+            old_uuids = set(list_files_and_dirs['names'][f])
+
+        size = os.path.getsize(local_path)
+        if packed is not None:
+            # Прежнюю версию, упакованную в пакет, можно заменить только индексом нового пакета, поэтому такой файл
+            # упаковывается независимо от размера
+            if any(is_member_key(uuid) for uuid in old_uuids) \
+                    or run.pack_threshold is not None and size < run.pack_threshold:
+                packed.append((local_path, old_uuids, size))
+                return
+        if old_uuids:
+            pool.submit(local_path, self._update_file, local_path, remote_dir_path, run, old_uuids, size=size)
+        else:
+            pool.submit(local_path, self._send_file, local_path, remote_dir_path, run, size=size)
+
+    def _schedule_bundles(self, pool: TransferPool, packed: List[Tuple[str, Set[str], int]], remote_dir_path: str,
+                          run: '_SendRun') -> None:
+        """
+        Функция разбиения мелких файлов одной директории на пакеты и постановки пакетов в очередь пула.
+        """
+
+        sizes = {local_path: size for local_path, _, size in packed}
+        for group in group_files((((local_path, old_uuids), size) for local_path, old_uuids, size in packed),
+                                 run.bundle_size):
+            pool.submit_group([local_path for local_path, _ in group], self._send_bundle, group, remote_dir_path, run,
+                              size=sum(sizes[local_path] for local_path, _ in group))
+
+    @staticmethod
+    def _is_modified(local_path: str, list_files_and_dirs: Dict[str, Dict]) -> bool:
+        """
+        Функция быстрой проверки (без чтения файла), мог ли измениться файл, уже имеющийся на YD.
+
+        Файл считается неизменным, если размер и время модификации совпадают с сохраненными на YD.
+        """
+
+        st = os.stat(local_path)
+        for uuid in list_files_and_dirs['names'][os.path.basename(local_path)]:
+            meta = list_files_and_dirs['meta'].get(uuid, dict())
+            if list_files_and_dirs['uuids'][uuid][1] == str(st.st_size) and meta.get('mtime') == st.st_mtime_ns:
+                return False
+        return True
+
+    def _send_dir(self, local_path: str, remote_dir_path: str, run: '_SendRun') -> str:
+        """
+        Функция создания на YD директории, соответствующей локальной директории local_path.
+
+        Возвращает путь к директории на YD (с измененным именем). Если директория уже есть на YD, то она повторно
+        не создается.
+        """
+
+        d = os.path.basename(local_path)
+        list_files_and_dirs = run.listings.get(remote_dir_path)
+        # Для директории проверяем, нет ли ее уже на YD (с измененным именем)
+        if d in list_files_and_dirs['names']:
+            logger.debug(f'Директория "{d}" уже существует на YD, она не будет создана повторно.')
+            # Получаем путь к директории на YD с ее измененным именем.
+            # Используем итератор, т. к. нужно достать значение из множества, не удаляя его в множестве.
+            return remote_dir_path + '/' + next(iter(list_files_and_dirs['names'][d]))
+
+        # Если нет, то создаем соответствующую директорию с измененным именем
+        logger.debug(f'Директории "{d}" нет на YD, она будет создана с измененным именем.')
+
+        # Подготавливаем структуру свойств для данной директории
+        size = os.path.getsize(local_path)
+        properties = self._prepare_properties(d, size, obj_type='dir')
+
+        # Формируем полное имя директории на YD с учетом ее нового имени, полученного с помощью uuid4()
+        new_dir_name = str(uuid4())
+        remote_root = remote_dir_path + '/' + new_dir_name
+
+        # Создаем директорию на YD с новым именем и прикрепляем к ней структуру со свойствами (описана выше)
+        self._yd.mkdir(remote_root, properties)
+        # Добавляем директорию в кеш списков (ее собственный список заведомо пуст) и в манифест
+        run.listings.add(remote_dir_path, new_dir_name, d, size, 'dir')
+        self._manifest_add(remote_dir_path, new_dir_name, d, size, 'dir')
+        return remote_root
+
+    def _send_file(self, local_path: str, remote_dir_path: str, run: '_SendRun') -> bool:
+        """
+        Функция отправки одного файла на YD (выполняется в рабочем потоке).
+
+        Наличие файла на YD проверяется вызывающей стороной по кешу списков run.listings; после отправки файл
+        добавляется в кеш.
+        """
+
+        st = os.stat(local_path)
+        if run.multipart_threshold is not None and st.st_size >= run.multipart_threshold:
+            return self._send_large_file(local_path, remote_dir_path, run, st)
+
+        # Формируем для файла имя, под которым он будет храниться на YD, и полный путь на YD
+        new_file_name = str(uuid4())
+        remote_path = self._prepare_remote_path(remote_dir_path + '/' + new_file_name)
+        logger.debug(f'Отправляем файл "{local_path}" (измененное имя "{new_file_name}") на YD')
+        # Открываем файл локально и отправляем его на YD. За тот же проход вычисляется ключевой хеш содержимого.
+        hasher = self._crypto.new_keyed_hash()
+        with open(local_path, "rb") as f:
+            blocks, meta = self._prepare_content(f, hasher, run)
+
+            def properties() -> Dict:
+                # Создаем структуру со свойствами файла, которая будет храниться на YD (в соответствии с API YD):
+                # исходное имя файла, его размер, ключевой хеш содержимого и время модификации файла в зашифрованном
+                # виде. Хеш известен только после чтения всего файла, поэтому структура формируется коннектором после
+                # передачи данных.
+                with self._metrics.timer('metadata'):
+                    meta.update(self._file_meta(st, hasher))
+                    return self._prepare_properties(os.path.basename(local_path), st.st_size, meta)
+
+            # Содержимое шифруется потоково (по сегментам) и сразу передается в тело HTTP-запроса, промежуточные
+            # файлы не создаются
+            self._yd.upload_stream(self._metrics.timed_iter('encrypt', self._encrypt_stream(blocks)),
+                                   remote_path, properties)
+
+        run.listings.add(remote_dir_path, new_file_name, os.path.basename(local_path), st.st_size, 'file', meta)
+        self._manifest_add(remote_dir_path, new_file_name, os.path.basename(local_path), st.st_size, 'file', meta)
+        return True
+
+    def _send_large_file(self, local_path: str, remote_dir_path: str, run: '_SendRun', st: os.stat_result) -> bool:
+        """
+        Функция отправки большого файла на YD по частям (выполняется в рабочем потоке).
+        """
+
+        name = os.path.basename(local_path)
+        logger.debug(f'Отправляем файл "{local_path}" на YD по частям')
+
+        def properties(meta: Dict) -> Dict:
+            return self._prepare_properties(name, st.st_size, dict(meta, mtime=st.st_mtime_ns))
+
+        new_file_name, meta = self._multipart.upload(
+            local_path, self._prepare_remote_path(remote_dir_path), st, str(uuid4()), properties)
+        meta['mtime'] = st.st_mtime_ns
+        run.listings.add(remote_dir_path, new_file_name, name, st.st_size, 'file', meta)
+        self._manifest_add(remote_dir_path, new_file_name, name, st.st_size, 'file', meta)
+        return True
+
+    def _send_bundle(self, files: List[Tuple[str, Set[str]]], remote_dir_path: str, run: '_SendRun') -> bool:
+        """
+        Функция отправки пакета мелких файлов на YD (выполняется в рабочем потоке).
+
+        files - список пар: путь к локальному файлу и ключи его прежних версий на YD, которые заменяются отправляемой
+        версией. Прежние версии, хранящиеся отдельными объектами, удаляются после отправки пакета, а упакованные
+        в другие пакеты - перечисляются в индексе пакета как замененные.
+        """
+
+        bundle_uuid = str(uuid4())
+        remote_path = self._prepare_remote_path(remote_dir_path + '/' + bundle_uuid)
+        logger.debug(f'Отправляем пакет из {len(files)} файлов (измененное имя "{bundle_uuid}") на YD')
+        old_uuids = {uuid for _, uuids in files for uuid in uuids}
+        writer = BundleWriter(self._crypto, (uuid for uuid in old_uuids if is_member_key(uuid)))
+
+        def properties() -> Dict:
+            # Размер пакета и положение индекса известны только после чтения всех файлов
+            with self._metrics.timer('metadata'):
+                return self._prepare_properties('', writer.size, writer.meta())
 
-        for _ in properties:
+        blocks = self._metrics.timed_iter('read', writer.iter_blocks(local_path for local_path, _ in files))
+        self._yd.upload_stream(self._metrics.timed_iter('encrypt', self._encrypt_stream(blocks)),
+                               remote_path, properties)
+
+        run.listings.add(remote_dir_path, bundle_uuid, '', writer.size, 'bundle', writer.meta())
+        self._manifest_add(remote_dir_path, bundle_uuid, '', writer.size, 'bundle', writer.meta())
+        for index, member in enumerate(writer.members):
+            key, meta = member_key(bundle_uuid, index), member_meta(bundle_uuid, member)
+            run.listings.add(remote_dir_path, key, member[0], member[2], 'file', meta)
+            self._manifest_add(remote_dir_path, key, member[0], member[2], 'file', meta)
+        # Замененные версии файлов больше не показываются (содержимое упакованных версий остается в прежних пакетах)
+        for uuid in old_uuids:
+            if is_member_key(uuid):
+                self._manifest_remove(remote_dir_path + '/' + uuid)
+            else:
+                self.remove(remote_dir_path + '/' + uuid, permanently=True)
+            run.listings.discard(remote_dir_path, uuid)
+        return True
+
+    def _encrypt_stream(self, blocks: Iterable[bytes]) -> Iterator[bytes]:
+        """
+        Функция потокового шифрования содержимого файла (параллельно, если задан исполнитель crypto_executor).
+
+        Сегменты шифруются в исполнителе, пока коннектор отправляет на YD уже зашифрованные, поэтому шифрование
+        и передача данных по сети выполняются одновременно.
+        """
+
+        return self._crypto.encrypt_stream(blocks, executor=self._crypto_executor)
+
+    def _decrypt_stream(self, blocks: Iterable[bytes]) -> Iterator[bytes]:
+        """
+        Функция потокового дешифрования содержимого файла (параллельно, если задан исполнитель crypto_executor).
+        """
+
+        return self._crypto.decrypt_stream(blocks, executor=self._crypto_executor)
+
+    def _prepare_content(self, f: BinaryIO, hasher: Any, run: '_SendRun') -> Tuple[Iterator[bytes], Dict]:
+        """
+        Функция подготовки содержимого файла к отправке на YD в формате, соответствующем параметрам операции.
+
+        Возвращает итератор по блокам отправляемых (до шифрования) данных и словарь дополнительных сведений о формате
+        хранения (сохраняется в метаданных файла).
+        """
+
+        if run.dedup:
+            # Содержимое сохраняется блоками в хранилище, а на YD отправляется список блоков
+            chunks = self._chunk_store.store(f, hasher)
+            return iter([json.dumps({'chunks': chunks}).encode('utf-8')]), {'layout': 'chunks'}
+
+        # Содержимое при необходимости сжимается
+        blocks, meta = self._compress_blocks(self._metrics.timed_iter('read', iter_hashed(f, hasher)), run.codec)
+        if meta.get('codec'):
+            blocks = iter(self._metrics.timed_iter('compress', blocks))
+        return blocks, meta
+
+    def _update_file(self, local_path: str, remote_dir_path: str, run: '_SendRun', old_uuids: Set[str]) -> bool:
+        """
+        Функция повторной отправки на YD измененного файла (выполняется в рабочем потоке).
+
+        Если размер файла совпадает с сохраненным на YD, то сначала сравниваются ключевые хеши содержимого: при
+        совпадении на YD обновляется только время модификации. Иначе файл отправляется на YD как новый объект, а
+        прежние объекты (old_uuids) удаляются.
+        """
+
+        st = os.stat(local_path)
+        list_files_and_dirs = run.listings.get(remote_dir_path)
+        for uuid in old_uuids:
+            obj_name, obj_len, obj_type = list_files_and_dirs['uuids'][uuid]
+            meta = list_files_and_dirs['meta'].get(uuid, dict())
+            if obj_len != str(st.st_size) or not meta.get('hash'):
+                continue
+            with open(local_path, "rb") as f:
+                # Хеш файла, отправленного по частям, вычисляется по хешам частей
+                if meta.get('layout') == 'parts':
+                    local_hash = self._multipart.hash_file(f, meta['part_size'])
+                else:
+                    local_hash = self._crypto.keyed_hash_stream(f).hex()
+                if local_hash != meta['hash']:
+                    break
+            # Содержимое не изменилось - обновляем только время модификации
+            logger.debug(f'Содержимое файла "{local_path}" не изменилось, обновляем время модификации на YD')
+            meta = dict(meta, mtime=st.st_mtime_ns)
+            self._yd.patch(remote_dir_path + '/' + uuid,
+                           properties=self._prepare_properties(obj_name, obj_len, meta, obj_type))
+            run.listings.add(remote_dir_path, uuid, obj_name, obj_len, obj_type, meta)
+            self._manifest_add(remote_dir_path, uuid, obj_name, obj_len, obj_type, meta)
+            return False
+
+        logger.debug(f'Файл "{local_path}" изменился, отправляем его на YD повторно')
+        self._send_file(local_path, remote_dir_path, run)
+        # Удаляем прежние версии файла только после успешной отправки новой
+        for uuid in old_uuids:
+            self.remove(remote_dir_path + '/' + uuid, permanently=True)
+            run.listings.discard(remote_dir_path, uuid)
+        return True
+
+    def list_files_and_dirs(self, remote_path: str, refresh: bool = False) -> Dict[str, Dict]:
+        """
+        Функция получения списка файлов и директорий с YD.
+
+        Если используется манифест и директория сверялась с YD не позднее manifest_ttl секунд назад, то список
+        берется из манифеста без обращения к YD. Параметр refresh принудительно запрашивает список с YD
+        (с обновлением манифеста).
+        """
+
+        remote_path = self._prepare_remote_path(remote_path)
+        if not refresh:
+            listing = self._listing_from_manifest(remote_path)
+            if listing is not None:
+                return listing
+
+        # Получаем структуру со свойствами файлов/директорий для указанного пути на YD (в соответствии с API YD)
+        # и преобразуем ее в словарь словарей
+        with self._metrics.timer('listing'):
+            listing = self._build_listing(remote_path, self._yd.listdir(remote_path))
+            self._expand_bundles(remote_path, listing)
+        self._store_listing(remote_path, listing)
+        return listing
+
+    def iter_files_and_dirs(self, remote_path: str, page_size: int = DEFAULT_PAGE_SIZE,
+                            decode_executor: Optional[Executor] = None, refresh: bool = False) -> Iterator[RemoteEntry]:
+        """
+        Функция постраничного получения списка файлов и директорий с YD (генератор записей RemoteEntry).
+
+        В отличие от list_files_and_dirs, список не собирается целиком: у YD запрашивается page_size объектов за раз
+        (только нужные поля), и записи страницы возвращаются сразу после ее расшифрования. Если задан исполнитель
+        decode_executor (например, ProcessPoolExecutor), то свойства объектов большой страницы расшифровываются им
+        параллельно (см. модуль listing). Исполнителем управляет вызывающая сторона.
+
+        Члены пакетов мелких файлов возвращаются после всех остальных записей (какие члены заменены более новыми
+        пакетами, известно только после чтения индексов всех пакетов директории), сами пакеты не возвращаются.
+        Если содержимое директории изменяется во время получения списка, то отдельные записи могут быть пропущены
+        или возвращены повторно.
+
+        Если используется манифест и директория сверялась с YD не позднее manifest_ttl секунд назад, то записи берутся
+        из манифеста (параметр refresh принудительно запрашивает список с YD). Полученный с YD список в манифест
+        не сохраняется.
+        """
+
+        if page_size < 1:
+            error_str = f'Размер страницы должен быть положительным, а не {page_size}'
+            logger.error(error_str)
+            raise ValueError(error_str)
+
+        remote_path = self._prepare_remote_path(remote_path)
+        if not refresh:
+            listing = self._listing_from_manifest(remote_path)
+            if listing is not None:
+                for uuid, (obj_name, obj_len, obj_type) in listing['uuids'].items():
+                    if obj_type != 'bundle':
+                        yield RemoteEntry(uuid, obj_name, obj_len, obj_type, listing['meta'][uuid])
+                return
+
+        bundles: List[RemoteEntry] = []
+        offset = 0
+        while True:
+            with self._metrics.timer('listing'):
+                page = self._yd.listdir_page(remote_path, offset, page_size)
+                entries, errors = decode_page(self._decoder, page, decode_executor)
+            # Базовый путь может не содержать пользовательских зашифрованных данных (см. _build_listing)
+            if remote_path != self._app_base_path:
+                for obj_uuid, error in errors:
+                    logger.error(f'Ошибка "{error}" с файлом {remote_path}/{obj_uuid}')
+            for entry in entries:
+                if entry.type == 'bundle':
+                    bundles.append(entry)
+                else:
+                    yield entry
+            if len(page) < page_size:
+                break
+            offset += len(page)
+
+        if bundles:
+            with self._metrics.timer('listing'):
+                members, replaced = self._read_bundle_members(remote_path, bundles)
+            for entry in members:
+                if entry.uuid not in replaced:
+                    yield entry
+
+    def _expand_bundles(self, remote_path: str, listing: Dict[str, Dict]) -> None:
+        """
+        Функция добавления в список файлов и директорий членов пакетов мелких файлов.
+
+        Члены, замененные более новыми пакетами, в список не добавляются.
+        """
+
+        bundles = [RemoteEntry(uuid, obj_name, obj_len, obj_type, listing['meta'][uuid])
+                   for uuid, (obj_name, obj_len, obj_type) in listing['uuids'].items() if obj_type == 'bundle']
+        if not bundles:
+            return
+        members, replaced = self._read_bundle_members(remote_path, bundles)
+        for entry in members:
+            listing['uuids'][entry.uuid] = (entry.name, entry.size, entry.type)
+            listing['names'].setdefault(entry.name, set()).add(entry.uuid)
+            listing['meta'][entry.uuid] = entry.meta
+
+        for key in replaced & set(listing['uuids']):
+            name = listing['uuids'].pop(key)[0]
+            listing['meta'].pop(key)
+            listing['names'][name].discard(key)
+            if not listing['names'][name]:
+                del listing['names'][name]
+
+    def _read_bundle_members(self, remote_path: str,
+                             bundles: Iterable[RemoteEntry]) -> Tuple[List[RemoteEntry], Set[str]]:
+        """
+        Функция чтения индексов пакетов мелких файлов директории remote_path: записи членов пакетов и ключи членов,
+        замененных этими пакетами.
+
+        Индекс каждого пакета читается с YD без скачивания пакета целиком.
+        """
+
+        members: List[RemoteEntry] = []
+        replaced: Set[str] = set()
+        for bundle in bundles:
             try:
-                # Получаем исходный путь для объекта на YD (исходное имя файла или директории на локальном диске)
-                obj_name = self._crypto.decrypt_data(
-                    bytearray.fromhex(_['custom_properties'][self._field_name_for_path])).decode()
-                # Получаем исходный размер файла или директории
-                obj_len = self._crypto.decrypt_data(
-                    bytearray.fromhex(_['custom_properties'][self._field_name_for_len])).decode()
-                # Получаем тип объекта на YD (определяем, является объект файлом или директорией)
-                obj_type = _['type']
-                out_dict['uuids'][_['name']] = (obj_name, obj_len, obj_type)
-                out_dict['names'].setdefault(obj_name, set()).add(_['name'])
+                index = self._read_bundle_index(remote_path + '/' + bundle.uuid, int(bundle.size), bundle.meta)
             except Exception as e:
-                # Поскольку базовый путь может не содержать пользовательских зашифрованных данных в ассоциированной
-                # с ним структуре, то возможно исключение, которое мы игнорируем в таком случае.
-                if remote_path != self._app_base_path:
-                    logger.error(f'Ошибка "{e}" с файлом {_["file"]}')
-        return out_dict
+                logger.error(f'Ошибка "{e}" при чтении индекса пакета {remote_path}/{bundle.uuid}')
+                continue
+            for i, member in enumerate(index['members']):
+                members.append(RemoteEntry(member_key(bundle.uuid, i), member[0], str(member[2]), 'file',
+                                           member_meta(bundle.uuid, member)))
+            replaced.update(index.get('replaces', ()))
+        return members, replaced
 
-    def receive_files_and_dirs(self, local_dir_path: str, remote_path: str) -> None:
+    def _read_bundle_index(self, bundle_path: str, size: int, meta: Dict) -> Dict:
+        """
+        Функция чтения индекса пакета мелких файлов с YD (запрашиваются только сегменты, содержащие индекс).
+        """
+
+        with RemoteFile(self._yd, self._crypto, '', [(bundle_path, size)]) as bundle_file:
+            return read_index(bundle_file, meta)
+
+    def refresh_manifest(self, remote_path: str = '', recursive: bool = True) -> None:
+        """
+        Функция сверки манифеста с YD для директории remote_path (по умолчанию - базовый путь приложения) и, если
+        recursive равно True, для всех вложенных директорий.
+        """
+
+        pending = [self._prepare_remote_path(remote_path) if remote_path else self._app_base_path]
+        while pending:
+            remote_dir_path = pending.pop()
+            listing = self.list_files_and_dirs(remote_dir_path, refresh=True)
+            if recursive:
+                pending.extend(remote_dir_path + '/' + uuid
+                               for uuid, (_, _, obj_type) in listing['uuids'].items() if obj_type == 'dir')
+
+    def receive_files_and_dirs(self, local_dir_path: str, remote_path: str, max_workers: int = 1,
+                               include: Optional[Iterable[str]] = None, exclude: Optional[Iterable[str]] = None,
+                               max_depth: Optional[int] = None, schedule: Optional[SchedulePolicy] = None,
+                               progress: Optional[ProgressCallback] = None) -> TransferResult:
         """
         Функция рекурсивного скачивания файлов и директорий с YD.
+
+        Файлы скачиваются пулом из max_workers рабочих потоков. Ошибки при скачивании отдельных файлов/директорий
+        не прерывают работу, а возвращаются в итоговой сводке TransferResult.
+
+        Дерево на YD обходится без рекурсии, списки директорий получаются постранично (см. iter_files_and_dirs),
+        а сведения о файлах берутся из них же (без отдельного запроса свойств каждого файла). Количество задач
+        скачивания в очереди пула ограничено, поэтому объем занимаемой памяти не зависит от размера дерева.
+
+        Для частичного восстановления можно задать шаблоны include/exclude путей относительно remote_path и
+        максимальную глубину обхода max_depth (см. PathFilter): директории, которые не могут содержать отбираемых
+        файлов, не обходятся. Если заданы шаблоны include, то локально создаются только директории, в которые
+        скачиваются файлы, и директории, отобранные целиком.
+
+        Упакованные файлы одной директории скачиваются одной задачей на пакет (пакет скачивается одним запросом, члены,
+        замененные более новыми версиями или не отобранные, пропускаются). Путь remote_path может указывать и на
+        отдельный член пакета - тогда с YD запрашиваются только сегменты пакета, содержащие этот член.
+
+        Порядок скачивания и выделение рабочих потоков для крупных файлов задаются политикой schedule, ход операции
+        сообщается функции progress (см. send_files_and_dirs). Размеры файлов берутся из их зашифрованных свойств.
+        Порядок применяется к задачам в очереди пула, объем которой ограничен.
         """
 
         remote_path = self._prepare_remote_path(remote_path)
@@ -240,68 +903,276 @@ class EncryptedYandexDisk:
             error_str = f'Ошибка: входной каталог "{local_dir_path}" недоступен или не существует.'
             logger.error(error_str)
             raise ValueError(error_str)
+        path_filter = PathFilter(include, exclude, max_depth)
+
+        start, since = time.perf_counter(), self._metrics.snapshot()
+        self._yd.reserve_sessions(max_workers * self._part_workers)
+        with TransferPool(max_workers, TransferResult(), pending_per_worker=RECEIVE_PENDING_PER_WORKER, policy=schedule,
+                          progress=progress) as pool:
+            self._receive(local_dir_path, remote_path, pool, path_filter)
+        pool.result.report = self._metrics.report(since, time.perf_counter() - start)
+        return pool.result
+
+    def _receive(self, local_dir_path: str, remote_path: str, pool: TransferPool, path_filter: PathFilter) -> None:
+        """
+        Функция обхода дерева на YD: директории создаются локально, файлы ставятся в очередь пула.
+
+        Необработанные директории хранятся в стеке (локальный путь, путь на YD, путь относительно корня обхода,
+        признак того, что директория отобрана целиком).
+        """
+
+        # Член пакета мелких файлов не является объектом на YD и извлекается из пакета
+        if split_member_path(remote_path) is not None:
+            pool.submit(remote_path, self._receive_member, local_dir_path, remote_path)
+            return
 
         # Получаем структуру со свойствами файла/директории с YD (в соответствии с API YD)
-        properties = self._yd.patch(self._prepare_remote_path(remote_path), properties={})
-
-        # Скачиваем директорию
-        if properties['type'] == 'dir':
-            # Получаем список файлов и директорий, находящихся в директории remote_path
-            list_files_and_dirs = self.list_files_and_dirs(remote_path)
-
-            # Проходим по полученному списку и отдельно обрабатываем файлы и директории
-            for _ in list_files_and_dirs['names']:
-                # Получаем параметр "тип" (может быть файл или директория)
-                # Если тип - директория, - то обрабатываем как директорию
-                if list_files_and_dirs['uuids'][next(iter(list_files_and_dirs['names'][_]))][2] == 'dir':
-                    # Создаем локально директорию с восстановленным исходным именем
-                    logger.debug(f'Скачиваем директорию "{_}"')
-                    os.makedirs(os.path.join(local_dir_path, _), exist_ok=True)
-                    # Рекурсивно скачиваем содержимое текущей директории
-                    self.receive_files_and_dirs(
-                        os.path.join(local_dir_path, _),
-                        os.path.join(remote_path, next(iter(list_files_and_dirs['names'][_])))
-                    )
-                # Иначе обрабатываем как файл (рекурсивно).
-                else:
-                    self.receive_files_and_dirs(
-                        local_dir_path,
-                        remote_path + '/' + next(iter(list_files_and_dirs['names'][_]))
-                    )
+        properties = self._yd.patch(remote_path, properties={})
 
-        # Скачиваем файл
-        else:
-            # Достаем исходное имя файла из прикрепленной к нему структуры на YD (в соответствии с API YD)
-            # Оно хранится в зашифрованном виде в словаре "custom_properties" с ключом "self._field_name_for_path"
-            obj_name = self._crypto.decrypt_data(
-                bytearray.fromhex(properties['custom_properties'][self._field_name_for_path])
-            )
-            # Преобразуем из байтового в строковый вид
-            obj_name = obj_name.decode()
-
-            # Достаем исходный размер файла из прикрепленной к нему структуры на YD (в соответствии с API YD)
-            # Он хранится в зашифрованном виде в словаре "custom_properties" с ключом "self._field_name_for_len"
-            # Пока не используется
-            obj_len = self._crypto.decrypt_data(
-                bytearray.fromhex(properties['custom_properties'][self._field_name_for_len])
-            )
-            obj_len = obj_len.decode()
-
-            # Получаем имя файла в виде, хранимом на YD
-            name = properties['name']
-            logger.debug(f'Скачиваем файл "{os.path.join(local_dir_path, obj_name)}"')
-            # Скачиваем файл "как есть"
-            self._yd.download(self._prepare_remote_path(remote_path), os.path.join(local_dir_path, name))
-            # Читаем содержимое файла в переменную data
-            with open(os.path.join(local_dir_path, name), mode='rb') as f:
-                data = f.read()
-            # Удаляем скачанный файл
-            os.remove(os.path.join(local_dir_path, name))
-            # Дешифруем содержимое скачанного файла
-            data = self._crypto.decrypt_data(data)
-            # Сохраняем полученный результат в файл с его исходным именем
-            with open(os.path.join(local_dir_path, obj_name), mode='wb') as f:
-                f.write(data)
+        # Скачиваем файл (в том числе большой файл, хранящийся на YD по частям в виде директории)
+        if properties['type'] != 'dir' or self._is_multipart(properties):
+            with self._metrics.timer('metadata'):
+                obj_name, obj_len, obj_meta = self._decode_properties(properties)
+            pool.submit(os.path.join(local_dir_path, obj_name), self._receive_file, local_dir_path, remote_path,
+                        obj_name, obj_meta, size=int(obj_len))
+            return
+
+        pending: List[Tuple[str, str, str, bool]] = [(local_dir_path, remote_path, '', path_filter.selects_all)]
+        while pending:
+            local_path, remote_dir_path, rel_dir_path, selected = pending.pop()
+            try:
+                self._receive_dir(local_path, remote_dir_path, rel_dir_path, selected, pool, path_filter, pending)
+            except Exception as e:
+                pool.fail(local_path, e)
+
+    def _receive_dir(self, local_dir_path: str, remote_dir_path: str, rel_dir_path: str, selected: bool,
+                     pool: TransferPool, path_filter: PathFilter, pending: List[Tuple[str, str, str, bool]]) -> None:
+        """
+        Функция обработки одной директории при обходе дерева: отобранные файлы ставятся в очередь пула, вложенные
+        директории, которые нужно обойти, - в стек pending.
+        """
+
+        # Директория, отобранная целиком, уже создана; иначе она создается перед скачиванием первого файла
+        created = selected
+        # Имена, уже встреченные в директории (на YD может оказаться несколько версий одного файла/директории)
+        seen: Set[str] = set()
+        # Упакованные файлы собираются по пакетам: имя пакета -> список (исходное имя, размер, сведения о члене)
+        bundles: Dict[str, List[Tuple[str, int, Dict]]] = dict()
+        for entry in self.iter_files_and_dirs(remote_dir_path):
+            if entry.name in seen:
+                continue
+            seen.add(entry.name)
+            rel_path = rel_dir_path + '/' + entry.name if rel_dir_path else entry.name
+            local_path = os.path.join(local_dir_path, entry.name)
+            if path_filter.is_excluded(rel_path):
+                continue
+
+            if entry.type == 'dir':
+                if not path_filter.enters(rel_path):
+                    continue
+                dir_selected = selected or path_filter.is_included(rel_path)
+                if not dir_selected and not path_filter.may_contain(rel_path):
+                    continue
+                if dir_selected:
+                    try:
+                        # Создаем локально директорию с восстановленным исходным именем
+                        logger.debug(f'Скачиваем директорию "{entry.name}"')
+                        os.makedirs(local_path, exist_ok=True)
+                    except Exception as e:
+                        pool.fail(local_path, e)
+                        continue
+                pending.append((local_path, remote_dir_path + '/' + entry.uuid, rel_path, dir_selected))
+                continue
+
+            if not selected and not path_filter.is_included(rel_path):
+                continue
+            if not created:
+                os.makedirs(local_dir_path, exist_ok=True)
+                created = True
+            # Упакованный файл скачивается вместе с другими членами его пакета
+            if entry.meta.get('bundle'):
+                bundles.setdefault(entry.meta['bundle'], []).append((entry.name, int(entry.size), entry.meta))
+            # Иначе ставим файл в очередь на скачивание
+            else:
+                pool.submit(local_path, self._receive_file, local_dir_path, remote_dir_path + '/' + entry.uuid,
+                            entry.name, entry.meta, size=int(entry.size))
+
+        for bundle_uuid, members in bundles.items():
+            pool.submit_group([os.path.join(local_dir_path, name) for name, _, _ in members], self._receive_bundle,
+                              local_dir_path, remote_dir_path + '/' + bundle_uuid, members,
+                              size=sum(size for _, size, _ in members))
+
+    def _receive_file(self, local_dir_path: str, remote_path: str, obj_name: str, obj_meta: Dict) -> bool:
+        """
+        Функция скачивания одного файла с YD (выполняется в рабочем потоке).
+
+        Исходное имя файла и дополнительные сведения о нем (в том числе формат хранения содержимого) берутся из списка
+        файлов и директорий.
+        """
+
+        remote_path = self._prepare_remote_path(remote_path)
+        local_file_path = os.path.join(local_dir_path, obj_name)
+        logger.debug(f'Скачиваем файл "{local_file_path}"')
+        if obj_meta.get('layout') == 'parts':
+            # При ошибке уже скачанные части сохраняются для продолжения скачивания при повторном вызове
+            self._multipart.download(remote_path, local_file_path)
+            return True
+        # Файл открывается до блока try: если его не удалось создать, то удалять нечего
+        f = open(local_file_path, mode='wb')
+        try:
+            # Время записи учитывается без времени скачивания и дешифрования (они измеряются отдельно)
+            with f, self._metrics.timer('write') as timer:
+                for block in self._download_content(remote_path, obj_meta):
+                    f.write(block)
+                    timer.bytes += len(block)
+        except Exception:
+            # Файл не удалось скачать полностью или он поврежден - частично записанный результат удаляем
+            logger.error(f'Ошибка скачивания файла "{local_file_path}"')
+            os.remove(local_file_path)
+            raise
+        return True
+
+    def _receive_bundle(self, local_dir_path: str, remote_path: str, members: List[Tuple[str, int, Dict]]) -> bool:
+        """
+        Функция скачивания членов пакета мелких файлов (выполняется в рабочем потоке).
+
+        Пакет скачивается одним запросом и дешифруется потоково, члены записываются в файлы по мере получения данных.
+        """
+
+        blocks = self._metrics.timed_iter('decrypt', self._decrypt_stream(
+            self._yd.download_stream(self._prepare_remote_path(remote_path))))
+        reader = BlockReader(blocks)
+        for name, size, meta in sorted(members, key=lambda member: member[2]['offset']):
+            # Данные замененных членов пропускаются
+            reader.read(meta['offset'] - reader.position)
+            self._write_member(os.path.join(local_dir_path, name), reader, size, meta['hash'])
+        reader.finish()
+        return True
+
+    def _receive_member(self, local_dir_path: str, remote_path: str) -> bool:
+        """
+        Функция скачивания одного члена пакета мелких файлов (выполняется в рабочем потоке).
+        """
+
+        member_file, member = self._open_member(self._prepare_remote_path(remote_path), DEFAULT_CACHE_SEGMENTS)
+        with member_file:
+            self._write_member(os.path.join(local_dir_path, member_file.name), member_file, member_file.size,
+                               member[4])
+        return True
+
+    def _write_member(self, local_file_path: str, source: Any, size: int, member_hash: str) -> None:
+        """
+        Функция записи члена пакета размером size из source (объект с методом read) в локальный файл с проверкой
+        ключевого хеша содержимого.
+        """
+
+        logger.debug(f'Скачиваем файл "{local_file_path}"')
+        hasher = self._crypto.new_keyed_hash()
+        # Файл открывается до блока try: если его не удалось создать, то удалять нечего
+        f = open(local_file_path, mode='wb')
+        try:
+            with f:
+                while size:
+                    block = source.read(min(size, MEMBER_BLOCK_SIZE))
+                    if not block:
+                        raise ValueError('Пакет поврежден: недостаточно данных')
+                    hasher.update(block)
+                    with self._metrics.timer('write') as timer:
+                        f.write(block)
+                        timer.bytes = len(block)
+                    size -= len(block)
+            if hasher.digest().hex() != member_hash:
+                raise ValueError(f'Ключевой хеш содержимого файла "{local_file_path}" не совпадает с сохраненным')
+        except Exception:
+            logger.error(f'Ошибка скачивания файла "{local_file_path}"')
+            os.remove(local_file_path)
+            raise
+
+    def _is_multipart(self, properties: Dict) -> bool:
+        """
+        Функция проверки, является ли директория на YD большим файлом, хранящимся по частям.
+        """
+
+        try:
+            return self._decode_properties(properties)[2].get('layout') == 'parts'
+        except Exception:
+            # Директория без свойств (например, базовый путь приложения)
+            return False
+
+    def _download_content(self, remote_path: str, meta: Dict) -> Iterator[bytes]:
+        """
+        Функция-генератор, возвращающая расшифрованное содержимое файла на YD в соответствии с форматом его хранения.
+        """
+
+        if meta.get('layout') == 'chunks':
+            # На YD хранится список блоков - содержимое собирается из хранилища блоков
+            chunk_list = json.loads(b''.join(self._crypto.decrypt_stream(self._yd.download_stream(remote_path))))
+            return self._chunk_store.load(chunk_list['chunks'])
+        # Тело HTTP-ответа сразу дешифруется (и распаковывается) по мере получения
+        blocks = self._metrics.timed_iter('decrypt', self._decrypt_stream(self._yd.download_stream(remote_path)))
+        if meta.get('codec'):
+            blocks = self._metrics.timed_iter('decompress', decompress_stream(blocks, get_codec(meta['codec'])))
+        return iter(blocks)
+
+    def open_remote(self, remote_path: str, cache_segments: int = DEFAULT_CACHE_SEGMENTS) -> RemoteFile:
+        """
+        Функция открытия файла на YD для чтения с произвольным доступом (без скачивания файла целиком).
+
+        Возвращает файловый объект (read, seek, tell), который при чтении запрашивает с YD только сегменты
+        зашифрованных данных, покрывающие запрошенный диапазон, и хранит до cache_segments расшифрованных сегментов.
+        Сжатые и дедуплицированные файлы так читать нельзя. Член пакета мелких файлов (путь вида
+        "<путь к пакету>/@<номер>", см. list_files_and_dirs) читается из пакета.
+        """
+
+        remote_path = self._prepare_remote_path(remote_path)
+        if split_member_path(remote_path) is not None:
+            return self._open_member(remote_path, cache_segments)[0]
+        properties = self._yd.patch(remote_path, properties={})
+        with self._metrics.timer('metadata'):
+            obj_name, obj_len, obj_meta = self._decode_properties(properties)
+        try:
+            if properties['type'] == 'dir' and obj_meta.get('layout') != 'parts':
+                raise ValueError('это директория')
+            objects = stream_objects(remote_path, int(obj_len), obj_meta)
+        except ValueError as e:
+            error_str = f'Ошибка: файл "{obj_name}" нельзя открыть для чтения с произвольным доступом ({e}).'
+            logger.error(error_str)
+            raise ValueError(error_str)
+        return RemoteFile(self._yd, self._crypto, obj_name, objects, cache_segments)
+
+    def _open_member(self, remote_path: str, cache_segments: int) -> Tuple[RemoteFile, List]:
+        """
+        Функция открытия члена пакета мелких файлов для чтения с произвольным доступом.
+
+        Возвращает файловый объект и сведения о члене из индекса пакета (имя, смещение, размер, время модификации,
+        ключевой хеш).
+        """
+
+        member = split_member_path(remote_path)
+        if member is None:
+            error_str = f'Ошибка: путь "{remote_path}" не указывает на файл в пакете мелких файлов.'
+            logger.error(error_str)
+            raise ValueError(error_str)
+        bundle_path, index = member
+        with self._metrics.timer('metadata'):
+            _, obj_len, obj_meta = self._decode_properties(self._yd.patch(bundle_path, properties={}))
+        if obj_meta.get('layout') != 'bundle':
+            error_str = f'Ошибка: объект "{bundle_path}" не является пакетом мелких файлов.'
+            logger.error(error_str)
+            raise ValueError(error_str)
+        objects = [(bundle_path, int(obj_len))]
+        members = self._read_bundle_index(bundle_path, int(obj_len), obj_meta)['members']
+        if not 0 <= index < len(members):
+            error_str = f'Ошибка: в пакете "{bundle_path}" нет файла с номером {index}.'
+            logger.error(error_str)
+            raise ValueError(error_str)
+        name, offset, size = members[index][:3]
+        return RemoteFile(self._yd, self._crypto, name, objects, cache_segments, offset, size), members[index]
 
     def remove(self, remote_path: str, permanently: bool = True) -> None:
+        if split_member_path(remote_path) is not None:
+            error_str = f'Ошибка: файл "{remote_path}" упакован в пакет, пакет удаляется только целиком.'
+            logger.error(error_str)
+            raise ValueError(error_str)
         self._yd.remove(remote_path, permanently)
+        self._manifest_remove(remote_path)
@@ -0,0 +1,128 @@
+"""Модуль расшифрования свойств файлов и директорий, полученных с YD, и постраничного получения их списка.
+
+Список содержимого большой директории (сотни тысяч объектов) можно получать постранично (см. iter_files_and_dirs):
+у YD запрашивается page_size объектов за раз и только нужные поля (см. ConnectorInterface.listdir_page), а записи
+возвращаются по мере расшифрования страниц, не дожидаясь получения всего списка.
+
+Расшифрование свойств - операция, нагружающая процессор, поэтому записи большой страницы можно расшифровывать
+в пуле процессов (ProcessPoolExecutor): страница делится на части по chunk_size объектов, каждая часть
+расшифровывается в отдельном процессе (в процесс передаются ее свойства и PropertiesDecoder с криптографическим
+объектом). Порядок записей при этом сохраняется.
+"""
+
+import base64
+import json
+from concurrent.futures import Executor
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from .connector import LISTDIR_PAGE_FIELDS
+from .metadata import unpack_metadata
+
+# Количество объектов, запрашиваемых у YD за одно обращение, по умолчанию
+DEFAULT_PAGE_SIZE = 1000
+# Количество объектов страницы, расшифровываемых одной задачей исполнителя, по умолчанию
+DEFAULT_DECODE_CHUNK_SIZE = 256
+
+
+class RemoteEntry(NamedTuple):
+    """
+    Запись списка файлов и директорий на YD (поля соответствуют словарям list_files_and_dirs).
+    """
+
+    # Имя объекта на YD (измененное), для члена пакета - ключ вида "<имя пакета>/@<номер>"
+    uuid: str
+    # Исходное имя файла/директории
+    name: str
+    # Исходный размер файла/директории (строка, как и в list_files_and_dirs)
+    size: str
+    # Тип: "file", "dir" или "bundle"
+    type: str
+    # Дополнительные сведения (ключевой хеш содержимого, время модификации и т. п.)
+    meta: Dict
+
+
+class PropertiesDecoder:
+    """
+    Расшифрование структур со свойствами файлов/директорий, полученных с YD.
+
+    Объект не ссылается на коннектор и может передаваться в другие процессы (если сериализуем криптографический
+    объект, см. CryptoInterface).
+    """
+
+    def __init__(self, crypto: Any, field_name_for_path: str, field_name_for_len: str, field_name_for_meta: str,
+                 field_name_for_packed: str) -> None:
+        self._crypto = crypto
+        self._field_name_for_path = field_name_for_path
+        self._field_name_for_len = field_name_for_len
+        self._field_name_for_meta = field_name_for_meta
+        self._field_name_for_packed = field_name_for_packed
+
+    def decode(self, properties: Dict) -> Tuple[str, str, Dict]:
+        """
+        Метод расшифрования структуры со свойствами файла/директории.
+
+        Возвращает исходное имя, исходный размер и словарь дополнительных сведений (пустой, если их нет).
+        """
+
+        crypto = self._crypto
+        custom_properties = properties['custom_properties']
+        # Свойства в упакованном формате расшифровываются за одну операцию
+        packed = custom_properties.get(self._field_name_for_packed)
+        if packed:
+            obj_name, size, _, obj_meta = unpack_metadata(crypto.decrypt_data(base64.b85decode(packed)))
+            return obj_name, str(size), obj_meta
+
+        # Получаем исходный путь для объекта на YD (исходное имя файла или директории на локальном диске)
+        obj_name = crypto.decrypt_data(bytearray.fromhex(custom_properties[self._field_name_for_path])).decode()
+        # Получаем исходный размер файла или директории
+        obj_len = crypto.decrypt_data(bytearray.fromhex(custom_properties[self._field_name_for_len])).decode()
+        # Получаем дополнительные сведения о файле, если они есть
+        obj_meta = custom_properties.get(self._field_name_for_meta)
+        obj_meta = json.loads(crypto.decrypt_data(bytearray.fromhex(obj_meta))) if obj_meta else dict()
+        return obj_name, obj_len, obj_meta
+
+    def decode_entries(self, properties: Iterable[Dict]) -> Tuple[List[RemoteEntry], List[Tuple[str, str]]]:
+        """
+        Метод расшифрования списка структур со свойствами файлов/директорий.
+
+        Возвращает записи и ошибки расшифрования (пары: имя объекта на YD, описание ошибки). Объекты без свойств
+        (например, не до конца отправленные по частям файлы) пропускаются.
+        """
+
+        entries: List[RemoteEntry] = []
+        errors: List[Tuple[str, str]] = []
+        for _ in properties:
+            if not _.get('custom_properties'):
+                continue
+            try:
+                obj_name, obj_len, obj_meta = self.decode(_)
+            except Exception as e:
+                errors.append((_['name'], str(e)))
+                continue
+            # Получаем тип объекта на YD (определяем, является объект файлом или директорией). Большой файл,
+            # отправленный по частям, хранится на YD в виде директории.
+            layout: str = obj_meta.get('layout') or ''
+            obj_type: str = {'parts': 'file', 'bundle': 'bundle'}.get(layout, _['type'])
+            entries.append(RemoteEntry(_['name'], obj_name, obj_len, obj_type, obj_meta))
+        return entries, errors
+
+
+def decode_page(decoder: PropertiesDecoder, properties: List[Dict], executor: Optional[Executor] = None,
+                chunk_size: int = DEFAULT_DECODE_CHUNK_SIZE) -> Tuple[List[RemoteEntry], List[Tuple[str, str]]]:
+    """
+    Функция расшифрования страницы списка: без исполнителя (или если страница не больше chunk_size объектов) -
+    в текущем потоке, иначе - частями по chunk_size объектов с помощью исполнителя executor.
+    """
+
+    if executor is None or len(properties) <= chunk_size:
+        return decoder.decode_entries(properties)
+    # В другие процессы передаются только нужные поля (объекты "yadisk" заменяются словарями)
+    plain = [{field: _.get(field) for field in LISTDIR_PAGE_FIELDS} for _ in properties]
+    chunks = [plain[i:i + chunk_size] for i in range(0, len(plain), chunk_size)]
+    entries: List[RemoteEntry] = []
+    errors: List[Tuple[str, str]] = []
+    for chunk_entries, chunk_errors in executor.map(decoder.decode_entries, chunks):
+        entries.extend(chunk_entries)
+        errors.extend(chunk_errors)
+    return entries, errors
+
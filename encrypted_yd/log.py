@@ -0,0 +1,25 @@
+"""Модуль настройки журналирования пакета "encrypted_yd".
+
+Пакет выводит сообщения через "loguru", но при импорте не изменяет его настройки (не удаляет и не добавляет приемники
+сообщений) и не создает файлов. Приемники сообщений настраивает приложение - самостоятельно или вызовом setup_logging.
+"""
+
+import sys
+from typing import Optional
+
+from loguru import logger
+
+
+def setup_logging(level: str = 'DEBUG', log_file: Optional[str] = 'logger.log', file_level: str = 'INFO',
+                  rotation: str = '10 MB', compression: str = 'zip') -> None:
+    """
+    Функция настройки журналирования: сообщения уровня не ниже level выводятся в stderr, а уровня не ниже file_level -
+    в файл log_file с ротацией по размеру rotation и сжатием ротированных файлов (если log_file равен None, то файл
+    не ведется). Ранее добавленные приемники сообщений "loguru" удаляются.
+    """
+
+    logger.remove()
+    logger.add(sys.stderr, level=level)
+    if log_file is not None:
+        logger.add(log_file, format='{time} {level} {message}', level=file_level, rotation=rotation,
+                   compression=compression)
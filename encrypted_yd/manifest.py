@@ -0,0 +1,154 @@
+"""Модуль с описанием локального зашифрованного индекса (манифеста) дерева файлов и директорий на YD.
+
+Манифест хранится в файле SQLite и для каждого объекта на YD (путь с измененным именем) содержит зашифрованную
+запись с исходным именем, размером, типом и хешем содержимого. Кроме того, для каждой директории на YD хранится время
+последней сверки ее содержимого с YD (listdir). Пока это время не старше заданного TTL, список файлов и директорий
+берется из манифеста без обращения к YD.
+"""
+
+import json
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from loguru import logger
+
+from .cryptography import CryptoInterface
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS entries (
+    remote_path TEXT PRIMARY KEY,
+    parent TEXT NOT NULL,
+    payload BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_parent ON entries (parent);
+CREATE TABLE IF NOT EXISTS dirs (
+    remote_path TEXT PRIMARY KEY,
+    synced_at REAL NOT NULL
+);
+'''
+
+
+class Manifest:
+    """
+    Локальный зашифрованный индекс дерева файлов и директорий на YD.
+
+    Записи шифруются переданным экземпляром CryptoInterface; в открытом виде хранятся только пути на YD (состоящие
+    из измененных имен). Класс потокобезопасен.
+    """
+
+    def __init__(self, path: str, crypto: CryptoInterface, ttl: float = 3600) -> None:
+        self._crypto = crypto
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        import sqlite3
+
+        # Соединение используется из рабочих потоков пула, доступ к нему защищен блокировкой
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        """
+        Метод закрытия файла манифеста.
+        """
+
+        with self._lock:
+            self._db.close()
+
+    def _encrypt(self, record: Dict[str, Any]) -> bytes:
+        return self._crypto.encrypt_data(json.dumps(record, ensure_ascii=False).encode('utf-8'))
+
+    def _decrypt(self, payload: bytes) -> Dict[str, Any]:
+        return json.loads(self._crypto.decrypt_data(payload).decode('utf-8'))
+
+    def is_fresh(self, remote_dir_path: str) -> bool:
+        """
+        Метод проверки, сверялось ли содержимое директории на YD с манифестом не ранее чем ttl секунд назад.
+        """
+
+        with self._lock:
+            row = self._db.execute('SELECT synced_at FROM dirs WHERE remote_path = ?', (remote_dir_path,)).fetchone()
+        return row is not None and time.time() - row[0] < self._ttl
+
+    def listing(self, remote_dir_path: str) -> Optional[List[Tuple[str, Dict[str, Any]]]]:
+        """
+        Метод получения содержимого директории на YD из манифеста.
+
+        Возвращает список пар (измененное имя, запись) или None, если директория не сверялась с YD или сверка устарела.
+        """
+
+        if not self.is_fresh(remote_dir_path):
+            return None
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT remote_path, payload FROM entries WHERE parent = ?', (remote_dir_path,)).fetchall()
+        try:
+            # Измененное имя может содержать "/" (например, ключ члена пакета мелких файлов, см. модуль bundle)
+            return [(remote_path[len(remote_dir_path) + 1:], self._decrypt(payload)) for remote_path, payload in rows]
+        except (ValueError, KeyError) as e:
+            # Манифест создан с другим паролем или поврежден - содержимое директории придется запросить с YD
+            logger.warning(f'Ошибка "{e}" при чтении манифеста для "{remote_dir_path}", он будет обновлен')
+            self.invalidate(remote_dir_path)
+            return None
+
+    def replace_dir(self, remote_dir_path: str, records: Iterable[Tuple[str, Dict[str, Any]]]) -> None:
+        """
+        Метод замены содержимого директории в манифесте результатом сверки с YD (пары: измененное имя, запись).
+        """
+
+        rows = [(remote_dir_path + '/' + name, remote_dir_path, self._encrypt(record)) for name, record in records]
+        with self._lock:
+            self._db.execute('BEGIN')
+            try:
+                self._db.execute('DELETE FROM entries WHERE parent = ?', (remote_dir_path,))
+                self._db.executemany('INSERT OR REPLACE INTO entries VALUES (?, ?, ?)', rows)
+                self._db.execute('INSERT OR REPLACE INTO dirs VALUES (?, ?)', (remote_dir_path, time.time()))
+                self._db.execute('COMMIT')
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+
+    def add(self, remote_dir_path: str, name: str, record: Dict[str, Any]) -> None:
+        """
+        Метод добавления (замены) записи о файле/директории name, созданной на YD в директории remote_dir_path.
+
+        Директория, созданная на YD, заведомо пуста, поэтому она сразу считается сверенной.
+        """
+
+        payload = self._encrypt(record)
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?)',
+                             (remote_dir_path + '/' + name, remote_dir_path, payload))
+            if record.get('type') == 'dir':
+                self._db.execute('INSERT OR REPLACE INTO dirs VALUES (?, ?)',
+                                 (remote_dir_path + '/' + name, time.time()))
+
+    def remove(self, remote_path: str) -> None:
+        """
+        Метод удаления из манифеста записи об объекте на YD и всего его поддерева.
+        """
+
+        prefix = remote_path + '/'
+        with self._lock:
+            self._db.execute('BEGIN')
+            try:
+                for table in ('entries', 'dirs'):
+                    self._db.execute(f'DELETE FROM {table} WHERE remote_path = ? OR substr(remote_path, 1, ?) = ?',
+                                     (remote_path, len(prefix), prefix))
+                self._db.execute('COMMIT')
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+
+    def invalidate(self, remote_dir_path: Optional[str] = None) -> None:
+        """
+        Метод, помечающий директорию (или, если она не указана, все директории) как требующую сверки с YD.
+        """
+
+        with self._lock:
+            if remote_dir_path is None:
+                self._db.execute('DELETE FROM dirs')
+            else:
+                self._db.execute('DELETE FROM dirs WHERE remote_path = ?', (remote_dir_path,))
@@ -0,0 +1,75 @@
+"""Модуль с описанием компактного (упакованного) формата свойств файлов и директорий на YD.
+
+Исходно имя и размер файла/директории шифруются по отдельности и хранятся в двух полях в шестнадцатеричном виде,
+а дополнительные сведения - в третьем поле в виде JSON. В упакованном формате все сведения об объекте хранятся в одном
+поле: они упаковываются в двоичную структуру, которая шифруется один раз и записывается в кодировке base85.
+Это сокращает объем свойств (служебные данные шифрования добавляются один раз, base85 компактнее шестнадцатеричной
+записи) и количество операций расшифрования при получении списка файлов и директорий.
+
+Структура (до шифрования):
+
+    версия (1 байт) | тип объекта (1 байт) | размер (8 байт) | время модификации в нс (8 байт, -1 - нет сведений) |
+    длина хеша (1 байт) | ключевой хеш содержимого | длина имени (2 байта) | имя (UTF-8) |
+    прочие дополнительные сведения (JSON, может отсутствовать)
+"""
+
+import json
+import struct
+from typing import Any, Dict, Tuple
+
+PACKED_VERSION = 1
+
+# Версия, тип объекта, размер, время модификации, длина хеша
+_HEADER = struct.Struct('>BBQqB')
+_NAME_LENGTH = struct.Struct('>H')
+# Коды типов объектов
+_OBJ_TYPES = ('file', 'dir')
+
+
+def pack_metadata(name: str, size: int, obj_type: str, meta: Dict[str, Any]) -> bytes:
+    """
+    Функция упаковки сведений об объекте на YD в двоичную структуру.
+    """
+
+    meta = dict(meta)
+    obj_hash = bytes.fromhex(meta.pop('hash', ''))
+    mtime = meta.pop('mtime', -1)
+    encoded_name = name.encode('utf-8')
+    extra = json.dumps(meta, separators=(',', ':')).encode('utf-8') if meta else b''
+    return b''.join((
+        _HEADER.pack(PACKED_VERSION, _OBJ_TYPES.index(obj_type), int(size), mtime, len(obj_hash)),
+        obj_hash,
+        _NAME_LENGTH.pack(len(encoded_name)),
+        encoded_name,
+        extra,
+    ))
+
+
+def unpack_metadata(data: bytes) -> Tuple[str, int, str, Dict[str, Any]]:
+    """
+    Функция распаковки сведений об объекте на YD.
+
+    Возвращает имя, размер, тип объекта и словарь дополнительных сведений (в том же виде, что и в формате JSON).
+    """
+
+    try:
+        version, type_code, size, mtime, hash_length = _HEADER.unpack_from(data)
+        if version != PACKED_VERSION:
+            raise ValueError(f'Неподдерживаемая версия упакованных свойств: {version}')
+        offset = _HEADER.size
+        obj_hash = data[offset:offset + hash_length]
+        offset += hash_length
+        (name_length,) = _NAME_LENGTH.unpack_from(data, offset)
+        offset += _NAME_LENGTH.size
+        name = data[offset:offset + name_length].decode('utf-8')
+        offset += name_length
+        meta = json.loads(data[offset:]) if offset < len(data) else dict()
+        obj_type = _OBJ_TYPES[type_code]
+    except (struct.error, IndexError, UnicodeDecodeError) as e:
+        raise ValueError(f'Упакованные свойства повреждены: {e}')
+
+    if obj_hash:
+        meta['hash'] = obj_hash.hex()
+    if mtime >= 0:
+        meta['mtime'] = mtime
+    return name, size, obj_type, meta
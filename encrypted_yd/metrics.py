@@ -0,0 +1,268 @@
+"""Модуль со средствами измерения производительности: счетчики вызовов, объема данных и гистограммы длительности
+по видам операций.
+
+Операции делятся на обращения к API YD (имена вида "api.upload_stream", "api.patch" и т. п., измеряются оберткой
+коннектора InstrumentedConnector) и этапы обработки данных ("read", "compress", "encrypt", "decrypt", "write",
+"metadata" и т. п., измеряются классом EncryptedYandexDisk). Этапы обработки данных выполняются потоково: блоки
+передаются по цепочке генераторов (чтение -> сжатие -> шифрование -> отправка), поэтому учитывается собственное время
+каждого этапа - из длительности этапа вычитается время вложенных в него измеряемых этапов того же потока.
+
+Накопленные значения можно получить в виде словаря (snapshot), JSON или текстового формата Prometheus, а также
+получать сведения о каждой завершенной операции через функции обратного вызова (add_hook). Если сбор отключен
+(enabled=False), то измерение сводится к проверке одного признака.
+"""
+
+import json
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Границы интервалов гистограммы длительности операций, с
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0)
+
+# Функция обратного вызова: имя операции, длительность (с), объем данных (байт), исключение (None - без ошибки)
+MetricsHook = Callable[[str, float, int, Optional[BaseException]], None]
+
+
+@dataclass
+class OperationStats:
+    """
+    Накопленные сведения об операциях одного вида.
+    """
+
+    # Количество операций, из них завершившихся ошибкой
+    count: int = 0
+    errors: int = 0
+    # Объем переданных/обработанных данных, байт
+    bytes: int = 0
+    # Суммарная длительность, с
+    seconds: float = 0.0
+    # Количество операций по интервалам гистограммы (последний элемент - длительность больше последней границы)
+    buckets: List[int] = field(default_factory=list)
+
+    def minus(self, other: 'OperationStats') -> 'OperationStats':
+        """
+        Метод вычисления приращения значений относительно более раннего снимка other.
+        """
+
+        return OperationStats(self.count - other.count, self.errors - other.errors, self.bytes - other.bytes,
+                              self.seconds - other.seconds,
+                              [a - b for a, b in zip(self.buckets, other.buckets or [0] * len(self.buckets))])
+
+
+@dataclass
+class TransferReport:
+    """
+    Сводка по производительности одного вызова send_files_and_dirs/receive_files_and_dirs: общая длительность и
+    сведения об операциях, выполненных за время вызова (пусто, если сбор сведений отключен).
+
+    Сведения вычисляются как разность накопленных значений в конце и в начале вызова, поэтому при одновременном
+    выполнении нескольких вызовов с одним объектом Metrics в сводку попадают операции всех этих вызовов.
+    """
+
+    seconds: float = 0.0
+    operations: Dict[str, OperationStats] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class _NullTimer:
+    """
+    Измеритель-заглушка для отключенного сбора сведений.
+    """
+
+    __slots__ = ()
+
+    @property
+    def bytes(self) -> int:
+        return 0
+
+    @bytes.setter
+    def bytes(self, value: int) -> None:
+        pass
+
+    def __enter__(self) -> '_NullTimer':
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    """
+    Измеритель длительности операции (контекстный менеджер). Объем данных операции задается атрибутом bytes.
+    """
+
+    __slots__ = ('_metrics', '_name', '_start', 'bytes')
+
+    def __init__(self, metrics: 'Metrics', name: str) -> None:
+        self._metrics = metrics
+        self._name = name
+        self.bytes = 0
+
+    def __enter__(self) -> '_Timer':
+        self._start = self._metrics._enter()
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Optional[BaseException], traceback: Any) -> None:
+        self._metrics.record(self._name, self._metrics._exit(self._start), self.bytes, exc)
+
+
+class Metrics:
+    """
+    Потокобезопасный реестр сведений об операциях.
+    """
+
+    def __init__(self, enabled: bool = True, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.enabled = enabled
+        self._buckets = tuple(buckets)
+        self._stats: Dict[str, OperationStats] = dict()
+        self._hooks: List[MetricsHook] = []
+        self._lock = threading.Lock()
+        # Стек времени вложенных измерений для каждого потока (для вычисления собственного времени этапов)
+        self._local = threading.local()
+
+    def add_hook(self, hook: MetricsHook) -> None:
+        """
+        Метод добавления функции, вызываемой по завершении каждой измеренной операции (в потоке, выполнявшем ее).
+        """
+
+        self._hooks.append(hook)
+
+    def record(self, name: str, seconds: float, nbytes: int = 0, error: Optional[BaseException] = None) -> None:
+        """
+        Метод регистрации завершенной операции.
+        """
+
+        if not self.enabled:
+            return
+        index = next((i for i, bound in enumerate(self._buckets) if seconds <= bound), len(self._buckets))
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = OperationStats(buckets=[0] * (len(self._buckets) + 1))
+            stats.count += 1
+            stats.errors += error is not None
+            stats.bytes += nbytes
+            stats.seconds += seconds
+            stats.buckets[index] += 1
+        for hook in self._hooks:
+            hook(name, seconds, nbytes, error)
+
+    def _enter(self) -> float:
+        stack = self._local.__dict__.setdefault('stack', [])
+        stack.append(0.0)
+        return time.perf_counter()
+
+    def _exit(self, start: float) -> float:
+        """
+        Метод завершения измерения: возвращает собственное время измерения (без вложенных) и добавляет полное время
+        к объемлющему измерению.
+        """
+
+        elapsed = time.perf_counter() - start
+        stack = self._local.stack
+        nested = stack.pop()
+        if stack:
+            stack[-1] += elapsed
+        return elapsed - nested
+
+    def timer(self, name: str) -> Any:
+        """
+        Метод получения контекстного менеджера, измеряющего длительность операции name.
+        """
+
+        return _Timer(self, name) if self.enabled else _NULL_TIMER
+
+    def timed_iter(self, name: str, iterable: Iterable[bytes]) -> Iterable[bytes]:
+        """
+        Метод получения обертки итератора блоков данных, измеряющей время получения блоков и их объем (этап name).
+
+        Операция регистрируется один раз - по исчерпании итератора, ошибке или закрытии обертки.
+        """
+
+        return self._timed_iter(name, iterable) if self.enabled else iterable
+
+    def _timed_iter(self, name: str, iterable: Iterable[bytes]) -> Iterator[bytes]:
+        iterator = iter(iterable)
+        seconds, nbytes, error = 0.0, 0, None
+        try:
+            while True:
+                start = self._enter()
+                try:
+                    block = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    seconds += self._exit(start)
+                nbytes += len(block)
+                yield block
+        except BaseException as e:
+            if not isinstance(e, GeneratorExit):
+                error = e
+            raise
+        finally:
+            self.record(name, seconds, nbytes, error)
+
+    def snapshot(self) -> Dict[str, OperationStats]:
+        """
+        Метод получения копии накопленных сведений по видам операций.
+        """
+
+        with self._lock:
+            return {name: OperationStats(s.count, s.errors, s.bytes, s.seconds, list(s.buckets))
+                    for name, s in self._stats.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+    def report(self, since: Dict[str, OperationStats], seconds: float) -> TransferReport:
+        """
+        Метод формирования сводки TransferReport по операциям, выполненным после снимка since.
+        """
+
+        operations = dict()
+        for name, stats in self.snapshot().items():
+            delta = stats.minus(since.get(name, OperationStats()))
+            if delta.count:
+                operations[name] = delta
+        return TransferReport(seconds, operations)
+
+    def to_json(self) -> str:
+        """
+        Метод выгрузки накопленных сведений в формате JSON.
+        """
+
+        return json.dumps({'buckets': list(self._buckets),
+                           'operations': {name: asdict(s) for name, s in sorted(self.snapshot().items())}})
+
+    def to_prometheus(self, prefix: str = 'encrypted_yd') -> str:
+        """
+        Метод выгрузки накопленных сведений в текстовом формате Prometheus.
+        """
+
+        snapshot = sorted(self.snapshot().items())
+        lines = [f'# TYPE {prefix}_operation_seconds histogram']
+        for name, s in snapshot:
+            cumulative = 0
+            for bound, count in zip(self._buckets + (float('inf'),), s.buckets):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{prefix}_operation_seconds_bucket{{operation="{name}",le="{le}"}} {cumulative}')
+            lines.append(f'{prefix}_operation_seconds_sum{{operation="{name}"}} {s.seconds!r}')
+            lines.append(f'{prefix}_operation_seconds_count{{operation="{name}"}} {s.count}')
+        for metric, attr in (('errors', 'errors'), ('bytes', 'bytes')):
+            lines.append(f'# TYPE {prefix}_operation_{metric}_total counter')
+            lines.extend(f'{prefix}_operation_{metric}_total{{operation="{name}"}} {getattr(s, attr)}'
+                         for name, s in snapshot)
+        return '\n'.join(lines) + '\n'
+
+
+# Отключенный реестр, используемый по умолчанию
+NULL_METRICS = Metrics(enabled=False)
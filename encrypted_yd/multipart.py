@@ -0,0 +1,350 @@
+"""Модуль с описанием режима передачи больших файлов по частям с возможностью продолжения после сбоя.
+
+Большой файл хранится на YD в виде директории с измененным именем (uuid4), в которой находятся независимо
+зашифрованные части файла с номерами в качестве имен ("000000", "000001", ...) и зашифрованный список частей
+("parts") с размером и ключевым хешем каждой части. Свойства (исходное имя, размер и т. п.) прикрепляются к директории
+только после отправки всех частей, поэтому не до конца отправленный файл не виден при получении списка файлов.
+
+Ход отправки и скачивания отмечается в локальном журнале (ResumeJournal) после каждой переданной части. Если операция
+прервалась, то при повторном вызове send_files_and_dirs/receive_files_and_dirs передаются только недостающие части.
+Части передаются параллельно.
+"""
+
+import json
+import os
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+
+from loguru import logger
+
+from .cryptography import CryptoInterface
+from .scheduler import bind_progress
+
+# Размер части по умолчанию
+DEFAULT_PART_SIZE = 64 * 1024 * 1024
+# Имя зашифрованного списка частей в директории файла на YD
+PART_LIST_NAME = 'parts'
+# Суффикс временного файла, в который скачиваются части (переименовывается после скачивания всех частей)
+DOWNLOAD_SUFFIX = '.eydpart'
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS transfers (
+    kind TEXT NOT NULL,
+    local_path TEXT NOT NULL,
+    remote_path TEXT NOT NULL,
+    parent TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    part_size INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (kind, local_path, remote_path)
+);
+CREATE TABLE IF NOT EXISTS parts (
+    kind TEXT NOT NULL,
+    remote_path TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    PRIMARY KEY (kind, remote_path, idx)
+);
+'''
+
+
+class ResumeJournal:
+    """
+    Локальный журнал незавершенных передач больших файлов (SQLite).
+
+    Для каждой передачи (kind - 'upload' или 'download') хранятся локальный путь, путь к директории файла на YD,
+    размер и время модификации локального файла на момент начала отправки, размер части, а также переданные
+    части. Если путь
+    к файлу журнала не задан, то журнал хранится в памяти (передачу можно продолжить только в рамках текущего процесса).
+    Класс потокобезопасен.
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        import sqlite3
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path or ':memory:', check_same_thread=False, isolation_level=None)
+        if path:
+            self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.executescript(_SCHEMA)
+        # В журналах прежних версий нет размера части: такие передачи (размер части 0) начинаются заново
+        if 'part_size' not in {_[1] for _ in self._db.execute('PRAGMA table_info(transfers)')}:
+            self._db.execute('ALTER TABLE transfers ADD COLUMN part_size INTEGER NOT NULL DEFAULT 0')
+
+    def close(self) -> None:
+        """
+        Метод закрытия файла журнала.
+        """
+
+        with self._lock:
+            self._db.close()
+
+    def find(self, kind: str, local_path: str, remote_dir_path: str) -> Optional[Tuple[str, int, int, int]]:
+        """
+        Метод поиска незавершенной передачи локального файла в директорию (из директории) на YD.
+
+        Возвращает путь к директории файла на YD, размер и время модификации файла и размер части или None.
+        """
+
+        with self._lock:
+            row = self._db.execute(
+                'SELECT remote_path, size, mtime, part_size FROM transfers '
+                'WHERE kind = ? AND local_path = ? AND parent = ?',
+                (kind, local_path, remote_dir_path)).fetchone()
+        return tuple(row) if row is not None else None  # type: ignore[return-value]
+
+    def begin(self, kind: str, local_path: str, remote_path: str, size: int, mtime: int, part_size: int) -> None:
+        """
+        Метод регистрации новой передачи.
+        """
+
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO transfers (kind, local_path, remote_path, parent, size, mtime, '
+                             'part_size) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                             (kind, local_path, remote_path, remote_path.rsplit('/', 1)[0], size, mtime, part_size))
+
+    def parts(self, kind: str, remote_path: str) -> Dict[int, Tuple[int, str]]:
+        """
+        Метод получения переданных частей: номер части - (размер, ключевой хеш).
+        """
+
+        with self._lock:
+            rows = self._db.execute('SELECT idx, size, hash FROM parts WHERE kind = ? AND remote_path = ?',
+                                    (kind, remote_path)).fetchall()
+        return {idx: (size, part_hash) for idx, size, part_hash in rows}
+
+    def part_done(self, kind: str, remote_path: str, index: int, size: int, part_hash: str) -> None:
+        """
+        Метод отметки переданной части.
+        """
+
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO parts VALUES (?, ?, ?, ?, ?)',
+                             (kind, remote_path, index, size, part_hash))
+
+    def finish(self, kind: str, local_path: str, remote_path: str) -> None:
+        """
+        Метод удаления из журнала завершенной (или отмененной) передачи.
+        """
+
+        with self._lock:
+            self._db.execute('BEGIN')
+            try:
+                self._db.execute('DELETE FROM transfers WHERE kind = ? AND local_path = ? AND remote_path = ?',
+                                 (kind, local_path, remote_path))
+                self._db.execute('DELETE FROM parts WHERE kind = ? AND remote_path = ?', (kind, remote_path))
+                self._db.execute('COMMIT')
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+
+
+def iter_part(f: BinaryIO, offset: int, size: int) -> Iterator[bytes]:
+    """
+    Функция-генератор, возвращающая блоки байтов части файла (size байт, начиная с offset).
+    """
+
+    f.seek(offset)
+    while size > 0:
+        chunk = f.read(min(size, 1024 * 1024))
+        if not chunk:
+            return
+        size -= len(chunk)
+        yield chunk
+
+
+def part_name(index: int) -> str:
+    return f'{index:06d}'
+
+
+class MultipartTransfer:
+    """
+    Передача больших файлов по частям с использованием коннектора (ConnectorInterface) и журнала ResumeJournal.
+
+    Части передаются параллельно (max_workers); если задан исполнитель crypto_executor, то и сегменты каждой части
+    шифруются/дешифруются параллельно.
+    """
+
+    def __init__(self, connector: Any, crypto: CryptoInterface, journal: ResumeJournal,
+                 part_size: int = DEFAULT_PART_SIZE, max_workers: int = 4,
+                 crypto_executor: Optional[Executor] = None) -> None:
+        self._yd = connector
+        self._crypto = crypto
+        self._journal = journal
+        self._part_size = part_size
+        self._max_workers = max_workers
+        self._crypto_executor = crypto_executor
+
+    def content_hash(self, part_hashes: List[str]) -> str:
+        """
+        Метод вычисления ключевого хеша содержимого файла по ключевым хешам его частей.
+        """
+
+        return self._crypto.keyed_hash_data(b''.join(bytes.fromhex(_) for _ in part_hashes)).hex()
+
+    def hash_file(self, f: BinaryIO, part_size: int) -> str:
+        """
+        Метод вычисления ключевого хеша содержимого локального файла так же, как при его отправке по частям.
+        """
+
+        part_hashes: List[str] = []
+        while True:
+            hasher = self._crypto.new_keyed_hash()
+            size = 0
+            for chunk in iter_part(f, f.tell(), part_size):
+                hasher.update(chunk)
+                size += len(chunk)
+            if not size and part_hashes:
+                break
+            part_hashes.append(hasher.digest().hex())
+            if size < part_size:
+                break
+        return self.content_hash(part_hashes)
+
+    def upload(self, local_path: str, remote_dir_path: str, st: os.stat_result, new_name: str,
+               properties: Callable[[Dict], Dict]) -> Tuple[str, Dict]:
+        """
+        Метод отправки файла по частям в директорию remote_dir_path на YD.
+
+        Если в журнале есть незавершенная отправка этого же (не изменившегося) файла, то она продолжается, иначе
+        создается директория new_name. После отправки всех частей к директории прикрепляется структура свойств,
+        возвращаемая функцией properties по дополнительным сведениям о файле (ключевой хеш содержимого, формат
+        хранения и размер части). Возвращает имя директории файла на YD и эти дополнительные сведения.
+        """
+
+        local_path = os.path.abspath(local_path)
+        remote_path = None
+        found = self._journal.find('upload', local_path, remote_dir_path)
+        if found is not None:
+            if found[1:] == (st.st_size, st.st_mtime_ns, self._part_size):
+                remote_path = found[0]
+                logger.debug(f'Продолжаем отправку файла "{local_path}" по частям')
+            else:
+                # Файл изменился после прерванной отправки или изменился размер части - ранее отправленные части
+                # не годятся (части нарезаны по другим границам)
+                logger.debug(f'Файл "{local_path}" или размер части изменились, прерванная отправка начинается заново')
+                self._discard_upload(local_path, found[0])
+
+        if remote_path is None:
+            remote_path = remote_dir_path + '/' + new_name
+            self._yd.mkdir(remote_path)
+            self._journal.begin('upload', local_path, remote_path, st.st_size, st.st_mtime_ns, self._part_size)
+            done: Dict[int, Tuple[int, str]] = dict()
+        else:
+            done = self._journal.parts('upload', remote_path)
+            # Части, отправленные, но не отмеченные в журнале (сбой между отправкой и отметкой), и список частей
+            # удаляются, т. к. повторная отправка не перезаписывает файл на YD
+            for _ in self._yd.listdir(remote_path):
+                if _['name'] == PART_LIST_NAME or int(_['name']) not in done:
+                    self._yd.remove(remote_path + '/' + _['name'], True)
+
+        count = max(1, -(-st.st_size // self._part_size))
+        pending = [index for index in range(count) if index not in done]
+        # Данные частей учитываются в ходе операции, которую выполняет вызывающий поток (см. модуль scheduler)
+        upload_part = bind_progress(lambda index: self._upload_part(local_path, remote_path, index))
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            for index, size, part_hash in executor.map(upload_part, pending):
+                done[index] = (size, part_hash)
+
+        # Номер, размер и ключевой хеш каждой части
+        parts: List[Tuple[int, int, str]] = [(index, *done[index]) for index in range(count)]
+        part_list = json.dumps({'size': st.st_size, 'part_size': self._part_size, 'parts': parts}).encode('utf-8')
+        self._yd.upload_stream(self._crypto.encrypt_stream([part_list]), remote_path + '/' + PART_LIST_NAME)
+
+        meta = {'layout': 'parts', 'part_size': self._part_size, 'hash': self.content_hash([_[2] for _ in parts])}
+        # Файл становится виден при получении списка файлов только после прикрепления свойств
+        self._yd.patch(remote_path, properties=properties(meta))
+        self._journal.finish('upload', local_path, remote_path)
+        return remote_path.rsplit('/', 1)[-1], meta
+
+    def _upload_part(self, local_path: str, remote_path: str, index: int) -> Tuple[int, int, str]:
+        """
+        Метод отправки одной части файла (выполняется в рабочем потоке). Возвращает номер, размер и хеш части.
+        """
+
+        hasher = self._crypto.new_keyed_hash()
+        size = 0
+
+        def hashed(source: Iterator[bytes]) -> Iterator[bytes]:
+            nonlocal size
+            for chunk in source:
+                hasher.update(chunk)
+                size += len(chunk)
+                yield chunk
+
+        with open(local_path, 'rb') as f:
+            self._yd.upload_stream(
+                self._crypto.encrypt_stream(hashed(iter_part(f, index * self._part_size, self._part_size)),
+                                            executor=self._crypto_executor),
+                remote_path + '/' + part_name(index))
+        part_hash = hasher.digest().hex()
+        self._journal.part_done('upload', remote_path, index, size, part_hash)
+        return index, size, part_hash
+
+    def _discard_upload(self, local_path: str, remote_path: str) -> None:
+        """
+        Метод отмены прерванной отправки (с удалением уже отправленных частей на YD).
+        """
+
+        try:
+            self._yd.remove(remote_path, True)
+        except Exception as e:
+            logger.warning(f'Не удалось удалить части прерванной отправки "{remote_path}": {e}')
+        self._journal.finish('upload', local_path, remote_path)
+
+    def download(self, remote_path: str, local_file_path: str) -> None:
+        """
+        Метод скачивания файла, хранящегося на YD по частям, в local_file_path.
+
+        Части записываются во временный файл (с суффиксом DOWNLOAD_SUFFIX), который после проверки всех частей
+        переименовывается. Если скачивание прервалось, то временный файл и журнал сохраняются, и при повторном
+        вызове скачиваются только недостающие части.
+        """
+
+        local_file_path = os.path.abspath(local_file_path)
+        tmp_path = local_file_path + DOWNLOAD_SUFFIX
+        part_list = json.loads(b''.join(self._crypto.decrypt_stream(
+            self._yd.download_stream(remote_path + '/' + PART_LIST_NAME))))
+        part_size = part_list['part_size']
+
+        found = self._journal.find('download', local_file_path, remote_path.rsplit('/', 1)[0])
+        if found is not None and (found[0], found[3]) == (remote_path, part_size) and os.path.exists(tmp_path):
+            done = self._journal.parts('download', remote_path)
+            logger.debug(f'Продолжаем скачивание файла "{local_file_path}" по частям')
+        else:
+            if found is not None:
+                self._journal.finish('download', local_file_path, found[0])
+            with open(tmp_path, 'wb') as f:
+                f.truncate(part_list['size'])
+            self._journal.begin('download', local_file_path, remote_path, part_list['size'], 0, part_size)
+            done = dict()
+
+        pending = [_ for _ in part_list['parts'] if _[0] not in done or done[_[0]][1] != _[2]]
+        download_part = bind_progress(lambda part: self._download_part(remote_path, tmp_path, part_size, *part))
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            for _ in executor.map(download_part, pending):
+                pass
+
+        os.replace(tmp_path, local_file_path)
+        self._journal.finish('download', local_file_path, remote_path)
+
+    def _download_part(self, remote_path: str, tmp_path: str, part_size: int, index: int, size: int,
+                       part_hash: str) -> None:
+        """
+        Метод скачивания одной части файла с проверкой ее размера и ключевого хеша (выполняется в рабочем потоке).
+        """
+
+        hasher = self._crypto.new_keyed_hash()
+        written = 0
+        with open(tmp_path, 'r+b') as f:
+            f.seek(index * part_size)
+            for block in self._crypto.decrypt_stream(self._yd.download_stream(remote_path + '/' + part_name(index)),
+                                                     executor=self._crypto_executor):
+                hasher.update(block)
+                written += len(block)
+                f.write(block)
+        if written != size or hasher.digest().hex() != part_hash:
+            raise ValueError(f'Часть {index} файла "{remote_path}" не соответствует списку частей')
+        self._journal.part_done('download', remote_path, index, size, part_hash)
@@ -0,0 +1,173 @@
+"""Модуль с описанием файлового объекта для чтения зашифрованного файла на YD с произвольным доступом.
+
+Зашифрованный поток (см. модуль cryptography) состоит из сегментов одинакового размера, поэтому для чтения части файла
+достаточно запросить у коннектора (download_range, HTTP Range) и расшифровать только сегменты, покрывающие запрошенный
+диапазон. Подряд идущие недостающие сегменты запрашиваются одним обращением, расшифрованные сегменты хранятся в кеше
+(LRU), поэтому повторное чтение тех же данных не требует обращений к YD.
+
+Файлы, хранящиеся по частям (см. модуль multipart), читаются так же: каждая часть является отдельным зашифрованным
+потоком. Целостность каждого прочитанного сегмента проверяется, однако замена части целиком другой частью,
+зашифрованной тем же ключом, при чтении фрагментов не обнаруживается (при полном скачивании части сверяются со
+списком частей).
+"""
+
+import bisect
+import io
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from .cryptography import CryptoInterface, SegmentedStream
+from .multipart import part_name
+
+# Количество расшифрованных сегментов, хранимых в кеше, по умолчанию
+DEFAULT_CACHE_SEGMENTS = 16
+
+
+class RemoteFile(io.RawIOBase):
+    """
+    Файловый объект (только чтение, с произвольным доступом) для зашифрованного файла на YD.
+
+    Файл состоит из одного или нескольких зашифрованных потоков (objects - список пар: путь на YD и размер открытого
+    текста потока). Обращение к YD за заголовком потока выполняется при первом чтении из него.
+
+    Параметры offset и size задают окно - часть открытого текста, доступную через файловый объект (например, член
+    пакета мелких файлов, см. модуль bundle). По умолчанию доступен весь текст.
+    """
+
+    def __init__(self, connector: Any, crypto: CryptoInterface, name: str, objects: List[Tuple[str, int]],
+                 cache_segments: int = DEFAULT_CACHE_SEGMENTS, offset: int = 0, size: Optional[int] = None) -> None:
+        super().__init__()
+        if cache_segments < 1:
+            raise ValueError(f'Размер кеша должен быть положительным, а не {cache_segments}')
+        self._yd = connector
+        self._crypto = crypto
+        self.name = name
+        self._objects = objects
+        # Смещения начала каждого потока в открытом тексте файла
+        self._starts: List[int] = []
+        position = 0
+        for _, object_size in objects:
+            self._starts.append(position)
+            position += object_size
+        if not 0 <= offset <= position or size is not None and not 0 <= size <= position - offset:
+            raise ValueError(f'Окно ({offset}, {size}) выходит за пределы файла размером {position}')
+        self._base = offset
+        self.size = position - offset if size is None else size
+        self._streams: Dict[int, SegmentedStream] = dict()
+        self._cache: 'OrderedDict[Tuple[int, int], bytes]' = OrderedDict()
+        self._cache_segments = cache_segments
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if self.closed:
+            raise ValueError('Файл закрыт')
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f'Недопустимое значение whence: {whence}')
+        if position < 0:
+            raise ValueError(f'Недопустимая позиция: {position}')
+        self._position = position
+        return position
+
+    def readinto(self, buffer: Any) -> int:
+        if self.closed:
+            raise ValueError('Файл закрыт')
+        view = memoryview(buffer).cast('B')
+        end = min(self.size, self._position + len(view))
+        written = 0
+        while self._position < end:
+            data = self._read_segments(self._base + self._position, self._base + end)
+            view[written:written + len(data)] = data
+            written += len(data)
+            self._position += len(data)
+        return written
+
+    def _stream(self, index: int) -> SegmentedStream:
+        """
+        Метод получения потока с номером index (при первом обращении запрашивается заголовок потока).
+        """
+
+        stream = self._streams.get(index)
+        if stream is None:
+            path, size = self._objects[index]
+            header = self._yd.download_range(path, 0, SegmentedStream.header_size)
+            stream = self._streams[index] = SegmentedStream(self._crypto, header, size)
+        return stream
+
+    def _read_segments(self, position: int, end: int) -> bytes:
+        """
+        Метод чтения данных, начиная с position: возвращает данные до end, но не дальше конца потока, содержащего
+        position, и не более чем из cache_segments сегментов.
+        """
+
+        index = bisect.bisect_right(self._starts, position) - 1
+        start = self._starts[index]
+        stream = self._stream(index)
+        first = stream.segment_of(position - start)
+        last = min(stream.segment_of(min(end, start + stream.size) - 1 - start), first + self._cache_segments - 1)
+
+        segments = []
+        segment = first
+        while segment <= last:
+            cached = self._cache.get((index, segment))
+            if cached is not None:
+                self._cache.move_to_end((index, segment))
+                segments.append(cached)
+                segment += 1
+                continue
+            # Подряд идущие отсутствующие в кеше сегменты запрашиваются одним обращением к YD
+            missing_end = segment
+            while missing_end < last and (index, missing_end + 1) not in self._cache:
+                missing_end += 1
+            offset, length = stream.wire_range(segment, missing_end)
+            for i, plaintext in enumerate(stream.decrypt(segment, self._yd.download_range(
+                    self._objects[index][0], offset, length)), segment):
+                self._cache[(index, i)] = plaintext
+                segments.append(plaintext)
+            while len(self._cache) > self._cache_segments:
+                self._cache.popitem(last=False)
+            segment = missing_end + 1
+
+        data = b''.join(segments)
+        skip = position - start - first * stream.segment_size
+        return data[skip:skip + end - position]
+
+    def close(self) -> None:
+        self._cache.clear()
+        super().close()
+
+
+def part_objects(remote_path: str, size: int, part_size: int) -> List[Tuple[str, int]]:
+    """
+    Функция получения списка частей файла, хранящегося на YD по частям: пути к частям и их размеры.
+    """
+
+    count = max(1, -(-size // part_size))
+    return [(remote_path + '/' + part_name(index), min(part_size, size - index * part_size)) for index in range(count)]
+
+
+def stream_objects(remote_path: str, size: int, meta: Optional[Dict]) -> List[Tuple[str, int]]:
+    """
+    Функция получения списка зашифрованных потоков файла в соответствии с форматом его хранения (meta).
+    """
+
+    meta = meta or dict()
+    if meta.get('codec') or meta.get('layout') == 'chunks':
+        raise ValueError('Произвольный доступ не поддерживается для сжатых и дедуплицированных файлов')
+    if meta.get('layout') == 'parts':
+        return part_objects(remote_path, size, meta['part_size'])
+    return [(remote_path, size)]
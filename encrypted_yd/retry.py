@@ -0,0 +1,179 @@
+"""Модуль со средствами повторения запросов к YD при временных сбоях и ограничения частоты запросов.
+
+RetryPolicy описывает экспоненциальную задержку со случайным разбросом (full jitter) между попытками, Retrying -
+выполнение запроса с повторами (решение о том, можно ли повторить запрос после конкретной ошибки, принимает
+переданная функция классификации ошибок), TokenBucket - общий для всех рабочих потоков ограничитель частоты запросов
+("ведро токенов"). Если сервер сообщает, через сколько секунд можно повторить запрос (заголовок Retry-After), то
+ограничитель приостанавливает отправку запросов всеми потоками на это время.
+"""
+
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional, Tuple, TypeVar
+
+from loguru import logger
+
+T = TypeVar('T')
+
+# Функция классификации ошибки: можно ли повторить запрос и через сколько секунд (по сведениям сервера)
+ErrorClassifier = Callable[[BaseException], Tuple[bool, Optional[float]]]
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    Параметры повторения запросов.
+    """
+
+    # Максимальное количество попыток (включая первую)
+    max_attempts: int = 5
+    # Базовая и максимальная задержка между попытками, с
+    base_delay: float = 0.5
+    max_delay: float = 30.0
+    # Максимальное время ожидания, указанное сервером (Retry-After), которое соблюдается, с
+    max_retry_after: float = 300.0
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        Метод вычисления задержки перед повтором после попытки с номером attempt (начиная с 0).
+        """
+
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_retry_after))
+        return delay
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Функция разбора значения заголовка Retry-After (количество секунд или дата в формате HTTP).
+    """
+
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    # Модуль email.utils импортируется только при необходимости - его загрузка заметно замедляет импорт пакета
+    from email.utils import parsedate_to_datetime
+
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Потокобезопасный ограничитель частоты операций ("ведро токенов").
+
+    В среднем выдается не более rate токенов в секунду, допускаются всплески до burst токенов. Запрос большего
+    количества токенов, чем есть в ведре, резервирует их "в долг": запросивший поток ждет, пока долг не погасится,
+    а следующие потоки ждут своей очереди. Частоту можно менять во время работы (свойство rate); если размер
+    всплеска не задан явно, то он меняется вместе с частотой.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None) -> None:
+        if rate <= 0:
+            raise ValueError(f'Частота должна быть положительной, а не {rate}')
+        self._rate = rate
+        self._auto_burst = burst is None
+        self._burst = burst if burst is not None else max(1.0, rate)
+        self._tokens = self._burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self) -> float:
+        return self._rate
+
+    @rate.setter
+    def rate(self, rate: float) -> None:
+        if rate <= 0:
+            raise ValueError(f'Частота должна быть положительной, а не {rate}')
+        with self._lock:
+            self._refill(time.monotonic())
+            self._rate = rate
+            if self._auto_burst:
+                self._burst = max(1.0, rate)
+                self._tokens = min(self._tokens, self._burst)
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        """
+        Метод получения tokens токенов (с ожиданием, если их недостаточно).
+        """
+
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= tokens
+            wait = max(0.0, -self._tokens / self._rate, self._paused_until - now)
+        if wait:
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """
+        Метод приостановки выдачи токенов на seconds секунд (например, по заголовку Retry-After).
+        """
+
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class Retrying:
+    """
+    Выполнение запросов с повторами при временных сбоях и ограничением частоты запросов.
+    """
+
+    def __init__(self, policy: RetryPolicy, classify: ErrorClassifier, limiter: Optional[TokenBucket] = None) -> None:
+        self.policy = policy
+        self.limiter = limiter
+        self._classify = classify
+
+    def acquire(self) -> None:
+        """
+        Метод ожидания разрешения ограничителя частоты на очередной запрос.
+        """
+
+        if self.limiter is not None:
+            self.limiter.acquire()
+
+    def wait(self, e: BaseException, attempt: int, description: str = '') -> None:
+        """
+        Метод ожидания перед повтором запроса после ошибки e в попытке с номером attempt (начиная с 0).
+
+        Если запрос повторять нельзя или попытки исчерпаны, то исключение e генерируется повторно.
+        """
+
+        retryable, retry_after = self._classify(e)
+        if not retryable or attempt + 1 >= self.policy.max_attempts:
+            raise e
+        if retry_after is not None and self.limiter is not None:
+            # Сервер просит подождать - приостанавливаем запросы всех потоков
+            self.limiter.pause(min(retry_after, self.policy.max_retry_after))
+        delay = self.policy.delay(attempt, retry_after)
+        logger.warning(f'Ошибка "{e}" при выполнении запроса {description}, повтор через {delay:.1f} с')
+        time.sleep(delay)
+
+    def call(self, fn: Callable[[int], T], description: str = '') -> T:
+        """
+        Метод выполнения запроса fn с повторами. В fn передается номер попытки (начиная с 0), что позволяет
+        учитывать возможное выполнение предыдущей попытки, ответ на которую не был получен.
+        """
+
+        attempt = 0
+        while True:
+            self.acquire()
+            try:
+                return fn(attempt)
+            except Exception as e:
+                self.wait(e, attempt, description)
+            attempt += 1
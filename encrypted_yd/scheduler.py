@@ -0,0 +1,373 @@
+"""Модуль с описанием планировщика задач передачи файлов и ограничения скорости передачи данных.
+
+Планировщик (TransferScheduler) выполняет задачи передачи файлов в рабочих потоках в порядке, заданном политикой
+SchedulePolicy: в порядке постановки (FIFO), сначала мелкие (SMALL_FIRST) или сначала крупные (LARGEST_FIRST)
+объекты. Чтобы один очень большой файл не задерживал передачу тысяч мелких, задачи можно разделить на две очереди
+по размеру объекта (large_threshold): для крупных объектов выделяется часть рабочих потоков (large_workers), остальные
+потоки выполняют только задачи мелких объектов. Потоки очереди крупных объектов, если она пуста, выполняют задачи
+мелких, поэтому общее количество потоков не превышает max_workers.
+
+Порядок применяется к задачам, ожидающим выполнения: задачи ставятся в очередь по мере обхода дерева, поэтому
+в начале операции (и при ограниченной очереди, см. TransferPool) упорядочивается только уже известная ее часть.
+
+BandwidthLimiter - общее для всех рабочих потоков ограничение скорости отправки и скачивания данных (байт в секунду)
+на основе "ведра токенов" (см. TokenBucket, токен - байт). Ограничение можно менять и снимать во время работы.
+Применяется оберткой коннектора ThrottledConnector (см. модуль connector).
+
+Ход операции сообщается функции обратного вызова в виде TransferProgress по завершении каждой задачи, а также
+по мере передачи данных (не чаще раза в PROGRESS_INTERVAL секунд), поэтому скорость и оценка оставшегося времени
+доступны и во время передачи одного большого файла. Общий объем данных берется из размеров файлов: при отправке -
+локальных, при скачивании - сохраненных в зашифрованных свойствах файлов на YD. Переданные байты сообщаются
+коннектором (report_progress, см. ThrottledConnector) и относятся к задаче, которую выполняет текущий поток; потоки,
+запускаемые задачей (например, для передачи частей большого файла), привязываются к ней функцией bind_progress.
+Объем, учтенный по задаче, не превышает ее размера, остаток (например, если данные были сжаты или часть их уже была
+на YD) учитывается по завершении задачи.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from loguru import logger
+
+from .retry import TokenBucket
+
+T = TypeVar('T')
+
+# Порядок выполнения задач: в порядке постановки, сначала мелкие, сначала крупные объекты
+FIFO = 'fifo'
+SMALL_FIRST = 'small_first'
+LARGEST_FIRST = 'largest_first'
+ORDERS = (FIFO, SMALL_FIRST, LARGEST_FIRST)
+
+# Минимальный интервал между сообщениями о ходе операции по мере передачи данных, с
+PROGRESS_INTERVAL = 0.5
+
+# Очереди задач мелких и крупных объектов
+_SMALL = 'small'
+_LARGE = 'large'
+
+
+@dataclass(frozen=True)
+class SchedulePolicy:
+    """
+    Параметры планирования задач передачи файлов.
+    """
+
+    # Порядок выполнения задач (FIFO, SMALL_FIRST или LARGEST_FIRST)
+    order: str = FIFO
+    # Размер объекта (байт), начиная с которого задача попадает в очередь крупных объектов (None - одна общая очередь)
+    large_threshold: Optional[int] = None
+    # Количество рабочих потоков очереди крупных объектов (None - четверть max_workers, но не менее одного)
+    large_workers: Optional[int] = None
+
+    def workers(self, max_workers: int) -> Tuple[int, int]:
+        """
+        Метод распределения max_workers рабочих потоков по очередям: потоки только для мелких объектов и потоки
+        очереди крупных объектов.
+        """
+
+        if self.order not in ORDERS:
+            error_str = f'Неизвестный порядок выполнения задач "{self.order}", допустимые значения: {ORDERS}'
+            logger.error(error_str)
+            raise ValueError(error_str)
+        if self.large_threshold is None:
+            return max_workers, 0
+        if max_workers < 2:
+            error_str = 'Для раздельных очередей мелких и крупных объектов нужно не менее 2 рабочих потоков'
+            logger.error(error_str)
+            raise ValueError(error_str)
+        large_workers = self.large_workers if self.large_workers is not None else max(1, max_workers // 4)
+        if not 1 <= large_workers < max_workers:
+            error_str = f'Значение "large_workers" должно быть от 1 до {max_workers - 1}, а не {large_workers}'
+            logger.error(error_str)
+            raise ValueError(error_str)
+        return max_workers - large_workers, large_workers
+
+    def priority(self, size: int) -> int:
+        """
+        Метод получения приоритета задачи объекта размером size (меньше - раньше).
+        """
+
+        return {FIFO: 0, SMALL_FIRST: size, LARGEST_FIRST: -size}[self.order]
+
+
+class TransferScheduler:
+    """
+    Выполнение задач передачи файлов рабочими потоками в порядке, заданном политикой SchedulePolicy.
+
+    Метод submit возвращает Future с результатом задачи. Задачи, отмененные до начала выполнения (Future.cancel),
+    не выполняются.
+    """
+
+    def __init__(self, max_workers: int, policy: SchedulePolicy = SchedulePolicy()) -> None:
+        small_workers, large_workers = policy.workers(max_workers)
+        self._policy = policy
+        # Очереди задач (кучи): приоритет, порядковый номер, Future, функция, аргументы
+        self._queues: Dict[str, List[Tuple[int, int, Future, Callable[..., Any], Tuple]]] = {_SMALL: [], _LARGE: []}
+        self._counter = itertools.count()
+        self._closed = False
+        self._condition = threading.Condition()
+        self._threads = [threading.Thread(target=self._work, args=(lane,), daemon=True,
+                                          name=f'encrypted_yd-{lane}-{i}')
+                         for i, lane in enumerate([_SMALL] * small_workers + [_LARGE] * large_workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, size: int, fn: Callable[..., Any], *args: Any) -> Future:
+        """
+        Метод постановки в очередь задачи передачи объекта размером size байт.
+        """
+
+        future: Future = Future()
+        threshold = self._policy.large_threshold
+        lane = _LARGE if threshold is not None and size >= threshold else _SMALL
+        with self._condition:
+            if self._closed:
+                raise RuntimeError('Планировщик остановлен')
+            heapq.heappush(self._queues[lane], (self._policy.priority(size), next(self._counter), future, fn, args))
+            self._condition.notify_all()
+        return future
+
+    def _next(self, lane: str) -> Optional[Tuple[Future, Callable[..., Any], Tuple]]:
+        # Потоки очереди крупных объектов при ее отсутствии задач берут задачи мелких объектов, но не наоборот
+        for queue in ((self._queues[_LARGE], self._queues[_SMALL]) if lane == _LARGE else (self._queues[_SMALL],)):
+            if queue:
+                return heapq.heappop(queue)[2:]
+        return None
+
+    def _work(self, lane: str) -> None:
+        while True:
+            with self._condition:
+                task = self._next(lane)
+                while task is None:
+                    if self._closed:
+                        return
+                    self._condition.wait()
+                    task = self._next(lane)
+            future, fn, args = task
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = fn(*args)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    def shutdown(self, cancel: bool = False) -> None:
+        """
+        Метод остановки планировщика: ожидает выполнения поставленных задач (если cancel равно True, то задачи,
+        не начавшие выполняться, отменяются).
+        """
+
+        with self._condition:
+            self._closed = True
+            if cancel:
+                for queue in self._queues.values():
+                    for task in queue:
+                        task[2].cancel()
+                    queue.clear()
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join()
+
+
+@dataclass(frozen=True)
+class TransferProgress:
+    """
+    Сведения о ходе операции отправки/скачивания.
+
+    Пока обход дерева не завершен, общее количество файлов и объем данных растут.
+    """
+
+    # Количество файлов и объем данных (байт), поставленных в очередь
+    total_files: int
+    total_bytes: int
+    # Количество файлов и объем данных завершенных задач (в том числе завершившихся ошибкой)
+    done_files: int
+    done_bytes: int
+    # Время с начала операции, с
+    elapsed: float
+
+    @property
+    def rate(self) -> float:
+        """
+        Средняя скорость передачи данных, байт в секунду.
+        """
+
+        return self.done_bytes / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def eta(self) -> Optional[float]:
+        """
+        Оценка оставшегося времени, с (None, если скорость еще неизвестна).
+        """
+
+        remaining = self.total_bytes - self.done_bytes
+        if remaining <= 0:
+            return 0.0
+        rate = self.rate
+        return remaining / rate if rate > 0 else None
+
+
+# Функция обратного вызова, получающая сведения о ходе операции (вызывается из рабочих потоков)
+ProgressCallback = Callable[[TransferProgress], None]
+
+# Задача, которую выполняет текущий поток (атрибут task), - для учета данных по мере передачи
+_current = threading.local()
+
+
+class TaskProgress:
+    """
+    Учет данных одной задачи: размер задачи и объем, уже учтенный по мере передачи.
+    """
+
+    __slots__ = ('tracker', 'size', 'counted')
+
+    def __init__(self, tracker: 'ProgressTracker', size: int) -> None:
+        self.tracker = tracker
+        self.size = size
+        self.counted = 0
+
+
+class ProgressTracker:
+    """
+    Потокобезопасный учет хода операции с вызовом функции обратного вызова по завершении каждой задачи и по мере
+    передачи данных (не чаще раза в interval секунд).
+    """
+
+    def __init__(self, callback: ProgressCallback, interval: float = PROGRESS_INTERVAL) -> None:
+        self._callback = callback
+        self._interval = interval
+        self._start = self._notified = time.perf_counter()
+        self._total_files = self._total_bytes = self._done_files = self._done_bytes = 0
+        self._lock = threading.Lock()
+
+    def add(self, files: int, size: int) -> TaskProgress:
+        with self._lock:
+            self._total_files += files
+            self._total_bytes += size
+        return TaskProgress(self, size)
+
+    def run(self, task: TaskProgress, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Метод выполнения функции fn в текущем потоке с отнесением переданных данных к задаче task.
+        """
+
+        previous = getattr(_current, 'task', None)
+        _current.task = task
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.task = previous
+
+    def advance(self, task: TaskProgress, size: int) -> None:
+        with self._lock:
+            size = min(size, task.size - task.counted)
+            if size <= 0:
+                return
+            task.counted += size
+            self._done_bytes += size
+            if time.perf_counter() - self._notified >= self._interval:
+                self._notify()
+
+    def done(self, files: int, task: TaskProgress) -> None:
+        with self._lock:
+            self._done_files += files
+            self._done_bytes += task.size - task.counted
+            task.counted = task.size
+            self._notify()
+
+    def _notify(self) -> None:
+        # Функция вызывается под блокировкой, чтобы сведения передавались в порядке их изменения
+        self._notified = time.perf_counter()
+        progress = TransferProgress(self._total_files, self._total_bytes, self._done_files, self._done_bytes,
+                                    self._notified - self._start)
+        try:
+            self._callback(progress)
+        except Exception as e:
+            logger.error(f'Ошибка "{e}" в функции обратного вызова хода операции')
+
+
+def report_progress(size: int) -> None:
+    """
+    Функция учета size байт, переданных текущим потоком, в ходе операции (если поток выполняет задачу операции
+    с функцией обратного вызова progress).
+    """
+
+    task = getattr(_current, 'task', None)
+    if task is not None:
+        task.tracker.advance(task, size)
+
+
+def bind_progress(fn: Callable[..., T]) -> Callable[..., T]:
+    """
+    Функция привязки fn к задаче, которую выполняет текущий поток: данные, переданные fn в другом потоке (например,
+    в пуле потоков передачи частей файла), учитываются в ходе операции этой задачи.
+    """
+
+    task = getattr(_current, 'task', None)
+    if task is None:
+        return fn
+
+    def bound(*args: Any, **kwargs: Any) -> T:
+        return task.tracker.run(task, fn, *args, **kwargs)
+
+    return bound
+
+
+class BandwidthLimiter:
+    """
+    Общее ограничение скорости отправки (upload_rate) и скачивания (download_rate) данных, байт в секунду
+    (None - без ограничения). Значения можно менять во время работы из любого потока.
+    """
+
+    def __init__(self, upload_rate: Optional[float] = None, download_rate: Optional[float] = None) -> None:
+        self._buckets: Dict[str, Optional[TokenBucket]] = {'upload': None, 'download': None}
+        self._lock = threading.Lock()
+        self.upload_rate = upload_rate
+        self.download_rate = download_rate
+
+    @property
+    def upload_rate(self) -> Optional[float]:
+        return self._rate('upload')
+
+    @upload_rate.setter
+    def upload_rate(self, rate: Optional[float]) -> None:
+        self._set_rate('upload', rate)
+
+    @property
+    def download_rate(self) -> Optional[float]:
+        return self._rate('download')
+
+    @download_rate.setter
+    def download_rate(self, rate: Optional[float]) -> None:
+        self._set_rate('download', rate)
+
+    def _rate(self, direction: str) -> Optional[float]:
+        bucket = self._buckets[direction]
+        return bucket.rate if bucket is not None else None
+
+    def _set_rate(self, direction: str, rate: Optional[float]) -> None:
+        with self._lock:
+            bucket = self._buckets[direction]
+            if rate is None:
+                self._buckets[direction] = None
+            elif bucket is None:
+                self._buckets[direction] = TokenBucket(rate)
+            else:
+                bucket.rate = rate
+
+    def acquire(self, direction: str, size: int) -> None:
+        """
+        Метод ожидания возможности передать size байт в направлении direction ('upload' или 'download').
+        """
+
+        bucket = self._buckets[direction]
+        if bucket is not None and size:
+            bucket.acquire(size)
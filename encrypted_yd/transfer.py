@@ -0,0 +1,351 @@
+"""Модуль со вспомогательными средствами для параллельной передачи файлов между локальным диском и YD.
+
+Передача отдельных файлов выполняется пулом рабочих потоков, а ошибки, возникшие при передаче конкретного файла,
+не прерывают всю операцию, а собираются в итоговую сводку "TransferResult".
+"""
+
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, as_completed, wait
+from dataclasses import dataclass, field
+from fnmatch import fnmatchcase
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from loguru import logger
+
+from .metrics import TransferReport
+from .scheduler import ProgressCallback, ProgressTracker, SchedulePolicy, TransferScheduler
+
+if TYPE_CHECKING:
+    import asyncio
+
+
+@dataclass
+class TransferResult:
+    """
+    Сводка по результатам отправки/скачивания файлов и директорий.
+
+    В списках хранятся пути к файлам/директориям на локальном диске.
+    """
+
+    # Успешно переданные файлы
+    transferred: List[str] = field(default_factory=list)
+    # Пропущенные файлы (например, уже имеющиеся на YD)
+    skipped: List[str] = field(default_factory=list)
+    # Файлы и директории, которые не удалось передать, вместе с возникшими исключениями
+    failed: List[Tuple[str, BaseException]] = field(default_factory=list)
+    # Сводка по производительности операции (длительность и, если включен сбор сведений, операции по видам)
+    report: TransferReport = field(default_factory=TransferReport)
+
+    @property
+    def ok(self) -> bool:
+        """
+        Признак того, что все файлы и директории переданы без ошибок.
+        """
+
+        return not self.failed
+
+
+class ListingCache:
+    """
+    Кеш списков файлов и директорий на YD в рамках одной операции отправки.
+
+    Каждая директория на YD запрашивается и расшифровывается не более одного раза (функцией loader, возвращающей
+    словарь в формате EncryptedYandexDisk.list_files_and_dirs). Созданные в ходе операции файлы и директории
+    добавляются в кеш на месте, а для новых директорий сразу заводится пустой список без обращения к YD.
+    """
+
+    def __init__(self, loader: Callable[[str], Dict[str, Dict]]) -> None:
+        self._loader = loader
+        self._listings: Dict[str, Dict[str, Dict]] = dict()
+        # Кеш пополняется как основным потоком, так и рабочими потоками пула
+        self._lock = threading.Lock()
+
+    def get(self, remote_dir_path: str) -> Dict[str, Dict]:
+        """
+        Метод получения списка файлов и директорий для директории на YD (запрашивается только при первом обращении).
+        """
+
+        with self._lock:
+            listing = self._listings.get(remote_dir_path)
+        if listing is None:
+            listing = self._loader(remote_dir_path)
+            with self._lock:
+                listing = self._listings.setdefault(remote_dir_path, listing)
+        return listing
+
+    def add(self, remote_dir_path: str, uuid: str, name: str, size: Any, obj_type: str,
+            meta: Optional[Dict] = None) -> None:
+        """
+        Метод добавления (обновления) в кеше файла/директории, созданной на YD в директории remote_dir_path.
+        """
+
+        with self._lock:
+            listing = self._listings.get(remote_dir_path)
+            if listing is not None:
+                listing['uuids'][uuid] = (name, str(size), obj_type)
+                # Пакет мелких файлов (см. модуль bundle) не имеет собственного имени - по именам доступны его члены
+                if obj_type != 'bundle':
+                    listing['names'].setdefault(name, set()).add(uuid)
+                listing['meta'][uuid] = meta or dict()
+            if obj_type == 'dir' and remote_dir_path + '/' + uuid not in self._listings:
+                # Только что созданная директория пуста
+                self._listings[remote_dir_path + '/' + uuid] = {'uuids': dict(), 'names': dict(), 'meta': dict()}
+
+    def discard(self, remote_dir_path: str, uuid: str) -> None:
+        """
+        Метод удаления из кеша файла/директории, удаленной с YD.
+        """
+
+        with self._lock:
+            listing = self._listings.get(remote_dir_path)
+            if listing is None or uuid not in listing['uuids']:
+                return
+            name = listing['uuids'].pop(uuid)[0]
+            listing['meta'].pop(uuid, None)
+            uuids = listing['names'].get(name)
+            if uuids is not None:
+                uuids.discard(uuid)
+                if not uuids:
+                    del listing['names'][name]
+
+
+class TransferPool:
+    """
+    Пул рабочих потоков для передачи файлов.
+
+    Задача передачи файла должна возвращать True, если файл передан, и False, если он пропущен. Результаты всех задач
+    собираются в TransferResult (по мере завершения задач или при выходе из контекстного менеджера). Одна задача может
+    передавать группу файлов (например, пакет мелких файлов) - ее результат относится ко всем файлам группы.
+
+    Если задан параметр pending_per_worker, то количество поставленных в очередь, но не завершенных задач не превышает
+    max_workers * pending_per_worker: постановка новой задачи ожидает завершения хотя бы одной из них. Так объем
+    памяти, занимаемой очередью, не зависит от количества передаваемых файлов.
+
+    Порядок выполнения задач и распределение рабочих потоков по очередям мелких и крупных объектов задаются политикой
+    policy (см. модуль scheduler), поэтому при постановке задачи указывается размер передаваемых данных. Если задана
+    функция progress, то по завершении каждой задачи и по мере передачи данных ей передаются сведения о ходе операции
+    (TransferProgress).
+    """
+
+    def __init__(self, max_workers: int, result: TransferResult, pending_per_worker: Optional[int] = None,
+                 policy: Optional[SchedulePolicy] = None, progress: Optional[ProgressCallback] = None) -> None:
+        if not isinstance(max_workers, int) or max_workers < 1:
+            error_str = f'Значение аргумента "max_workers" должно быть целым положительным числом, а не {max_workers}'
+            logger.error(error_str)
+            raise ValueError(error_str)
+        if pending_per_worker is not None and (not isinstance(pending_per_worker, int) or pending_per_worker < 1):
+            error_str = (f'Значение аргумента "pending_per_worker" должно быть целым положительным числом, '
+                         f'а не {pending_per_worker}')
+            logger.error(error_str)
+            raise ValueError(error_str)
+        self._scheduler = TransferScheduler(max_workers, policy or SchedulePolicy())
+        self._progress = ProgressTracker(progress) if progress is not None else None
+        self._futures: Dict[Future, List[str]] = dict()
+        self._max_pending = max_workers * pending_per_worker if pending_per_worker is not None else None
+        self.result = result
+
+    def submit(self, path: str, fn: Callable[..., bool], *args: Any, size: int = 0) -> None:
+        """
+        Метод для постановки в очередь задачи передачи файла path размером size байт.
+        """
+
+        self.submit_group([path], fn, *args, size=size)
+
+    def submit_group(self, paths: List[str], fn: Callable[..., bool], *args: Any, size: int = 0) -> None:
+        """
+        Метод для постановки в очередь задачи передачи группы файлов paths (общим размером size байт) одной задачей.
+        """
+
+        if self._max_pending is not None:
+            while len(self._futures) >= self._max_pending:
+                done, _ = wait(self._futures, return_when=FIRST_COMPLETED)
+                self._collect(done)
+        progress = self._progress
+        if progress is None:
+            future = self._scheduler.submit(size, fn, *args)
+        else:
+            # Данные, переданные задачей, учитываются по мере передачи; задача, отмененная до начала выполнения,
+            # учитывается как завершенная
+            task = progress.add(len(paths), size)
+            future = self._scheduler.submit(size, progress.run, task, fn, *args)
+            future.add_done_callback(lambda _: progress.done(len(paths), task))
+        self._futures[future] = paths
+
+    def _collect(self, futures: Iterable[Future]) -> None:
+        """
+        Метод учета результатов завершенных задач в сводке.
+        """
+
+        for future in futures:
+            paths = self._futures.pop(future)
+            try:
+                if future.result():
+                    self.result.transferred.extend(paths)
+                else:
+                    self.result.skipped.extend(paths)
+            except Exception as e:
+                for path in paths:
+                    self.fail(path, e)
+
+    def fail(self, path: str, error: BaseException) -> None:
+        """
+        Метод для регистрации ошибки, возникшей вне рабочих потоков (например, при создании директории).
+        """
+
+        logger.error(f'Ошибка "{error}" при передаче "{path}"')
+        self.result.failed.append((path, error))
+
+    def __enter__(self) -> 'TransferPool':
+        return self
+
+    def __exit__(self, exc_type: Any, *exc_info: Any) -> None:
+        if exc_type is not None:
+            # Операция прервана исключением - задачи, которые еще не начали выполняться, отменяем
+            for future in self._futures:
+                future.cancel()
+            self._scheduler.shutdown(cancel=True)
+            return
+        try:
+            self._collect(as_completed(list(self._futures)))
+        finally:
+            self._scheduler.shutdown()
+
+
+class PathFilter:
+    """
+    Отбор файлов и директорий при обходе дерева (например, при скачивании части дерева с YD).
+
+    Пути задаются относительно корня обхода, разделитель - "/". Шаблон без "/" сравнивается с именем файла или
+    директории на любом уровне, шаблон с "/" - с путем целиком, покомпонентно (символ "*" не совпадает с "/"),
+    см. модуль fnmatch. Директория, соответствующая шаблону include, отбирается вместе со всем содержимым.
+
+    Отбираются файлы и директории, соответствующие хотя бы одному шаблону include (если шаблоны include заданы)
+    и ни одному шаблону exclude. Директории, которые не могут содержать отбираемых файлов (соответствуют шаблону
+    exclude, вложены глубже max_depth или заведомо не подходят ни под один шаблон include), не обходятся.
+    Глубина содержимого корня равна 0: при max_depth=0 отбираются только файлы корневой директории.
+    """
+
+    def __init__(self, include: Optional[Iterable[str]] = None, exclude: Optional[Iterable[str]] = None,
+                 max_depth: Optional[int] = None) -> None:
+        if max_depth is not None and (not isinstance(max_depth, int) or max_depth < 0):
+            error_str = f'Значение аргумента "max_depth" должно быть целым неотрицательным числом, а не {max_depth}'
+            logger.error(error_str)
+            raise ValueError(error_str)
+        self._include = [pattern.strip('/') for pattern in include or ()]
+        self._exclude = [pattern.strip('/') for pattern in exclude or ()]
+        self._max_depth = max_depth
+
+    @property
+    def selects_all(self) -> bool:
+        """
+        Признак отсутствия шаблонов include (отбираются все файлы, кроме исключенных).
+        """
+
+        return not self._include
+
+    def is_included(self, rel_path: str) -> bool:
+        """
+        Метод проверки соответствия пути файла/директории хотя бы одному шаблону include.
+        """
+
+        return self.selects_all or any(_match(rel_path.split('/'), pattern) for pattern in self._include)
+
+    def is_excluded(self, rel_path: str) -> bool:
+        """
+        Метод проверки соответствия пути файла/директории хотя бы одному шаблону exclude.
+        """
+
+        return any(_match(rel_path.split('/'), pattern) for pattern in self._exclude)
+
+    def may_contain(self, rel_path: str) -> bool:
+        """
+        Метод проверки, может ли директория (не отобранная целиком) содержать файлы, отбираемые шаблонами include.
+        """
+
+        parts = rel_path.split('/')
+        for pattern in self._include:
+            if '/' not in pattern:
+                return True
+            pattern_parts = pattern.split('/')
+            if len(parts) < len(pattern_parts) and all(map(fnmatchcase, parts, pattern_parts)):
+                return True
+        return False
+
+    def enters(self, rel_path: str) -> bool:
+        """
+        Метод проверки, допускает ли глубина вложенности обход директории.
+        """
+
+        return self._max_depth is None or rel_path.count('/') < self._max_depth
+
+
+def _match(parts: List[str], pattern: str) -> bool:
+    if '/' not in pattern:
+        return fnmatchcase(parts[-1], pattern)
+    pattern_parts = pattern.split('/')
+    return len(parts) == len(pattern_parts) and all(map(fnmatchcase, parts, pattern_parts))
+
+
+class AsyncTransferPool:
+    """
+    Асинхронный аналог TransferPool: количество одновременно выполняемых задач передачи файлов ограничивается
+    семафором. Постановка новой задачи ожидает освобождения семафора, поэтому число созданных, но еще не завершенных
+    задач не превышает max_concurrency.
+
+    Модуль asyncio импортируется при создании пула, т. к. синхронному классу EncryptedYandexDisk он не нужен.
+    """
+
+    def __init__(self, max_concurrency: int, result: TransferResult) -> None:
+        import asyncio
+
+        if not isinstance(max_concurrency, int) or max_concurrency < 1:
+            error_str = (f'Значение аргумента "max_concurrency" должно быть целым положительным числом, '
+                         f'а не {max_concurrency}')
+            logger.error(error_str)
+            raise ValueError(error_str)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._tasks: Set['asyncio.Future'] = set()
+        self.result = result
+
+    async def submit(self, path: str, fn: Callable[..., Awaitable[bool]], *args: Any) -> None:
+        """
+        Метод для постановки в очередь задачи передачи файла path (fn - асинхронная функция).
+        """
+
+        import asyncio
+
+        await self._semaphore.acquire()
+        task = asyncio.ensure_future(self._run(path, fn, *args))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, path: str, fn: Callable[..., Awaitable[bool]], *args: Any) -> None:
+        try:
+            if await fn(*args):
+                self.result.transferred.append(path)
+            else:
+                self.result.skipped.append(path)
+        except Exception as e:
+            self.fail(path, e)
+        finally:
+            self._semaphore.release()
+
+    def fail(self, path: str, error: BaseException) -> None:
+        """
+        Метод для регистрации ошибки, возникшей вне задач передачи файлов (например, при создании директории).
+        """
+
+        logger.error(f'Ошибка "{error}" при передаче "{path}"')
+        self.result.failed.append((path, error))
+
+    async def __aenter__(self) -> 'AsyncTransferPool':
+        return self
+
+    async def __aexit__(self, exc_type: Any, *exc_info: Any) -> None:
+        import asyncio
+
+        if exc_type is not None:
+            # Операция прервана исключением - незавершенные задачи отменяем
+            for task in self._tasks:
+                task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
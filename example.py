@@ -3,8 +3,12 @@
 import getpass  # Для ручного ввода пароля пользователем
 
 from encrypted_yd.encrypted_yd import EncryptedYandexDisk
+from encrypted_yd.log import setup_logging
 
 if __name__ == '__main__':
+    # Выводим сообщения пакета в stderr и в файл logger.log (пакет сам журналирование не настраивает)
+    setup_logging()
+
     # Путь приложения на YD (в терминологии API YD)
     app_remote_base_path: str = '/Приложения/demo/'
 
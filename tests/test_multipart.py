@@ -0,0 +1,81 @@
+"""Тесты продолжения прерванной передачи больших файлов по частям (модуль multipart)."""
+
+import functools
+import os
+import shutil
+import tempfile
+import unittest
+from typing import Any, Optional, Set
+
+from encrypted_yd.connector import ConnectorLocalFS
+from encrypted_yd.cryptography import CryptodomeAES
+from encrypted_yd.encrypted_yd import EncryptedYandexDisk
+
+APP_PATH = '/Приложения/test'
+PASSWORD = 'password'
+
+
+class FlakyConnector(ConnectorLocalFS):
+    """
+    Коннектор, однократно прерывающий отправку частей с указанными именами.
+    """
+
+    fail_parts: Set[str] = set()
+
+    def upload_stream(self, data: Any, remote_path: str, properties: Optional[Any] = None) -> None:
+        name = remote_path.rsplit('/', 1)[-1]
+        if name in self.fail_parts:
+            self.fail_parts.discard(name)
+            raise IOError('Соединение прервано')
+        super().upload_stream(data, remote_path, properties)
+
+
+class ResumeTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.work_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.work_dir)
+        self.src = os.path.join(self.work_dir, 'src')
+        self.dst = os.path.join(self.work_dir, 'dst')
+        os.makedirs(self.src)
+        os.makedirs(self.dst)
+        os.makedirs(os.path.join(self.work_dir, 'remote', 'disk', *APP_PATH.strip('/').split('/')))
+        self.data = os.urandom(1_000_000)
+        with open(os.path.join(self.src, 'big'), 'wb') as f:
+            f.write(self.data)
+        self.token = CryptodomeAES(PASSWORD.encode('utf-8')).encrypt_data(b'token')
+
+    def _eyd(self, part_size: int) -> EncryptedYandexDisk:
+        return EncryptedYandexDisk(APP_PATH, self.token, PASSWORD,
+                                   connector=functools.partial(FlakyConnector, root=os.path.join(self.work_dir,
+                                                                                                 'remote')),
+                                   journal_path=os.path.join(self.work_dir, 'journal.db'), part_size=part_size,
+                                   part_workers=1)
+
+    def _send(self, eyd: EncryptedYandexDisk) -> Any:
+        return eyd.send_files_and_dirs(self.src, APP_PATH, multipart_threshold=1)
+
+    def _received(self, eyd: EncryptedYandexDisk) -> bytes:
+        result = eyd.receive_files_and_dirs(self.dst, APP_PATH)
+        self.assertEqual(result.failed, [])
+        with open(os.path.join(self.dst, 'big'), 'rb') as f:
+            return f.read()
+
+    def test_resume_same_part_size(self) -> None:
+        FlakyConnector.fail_parts = {'000005'}
+        self.assertEqual(len(self._send(self._eyd(65536)).failed), 1)
+        self.assertEqual(self._send(self._eyd(65536)).failed, [])
+        self.assertEqual(self._received(self._eyd(65536)), self.data)
+
+    def test_resume_different_part_size(self) -> None:
+        # Части, отправленные с прежним размером части, нельзя дополнить частями другого размера
+        FlakyConnector.fail_parts = {'000005'}
+        self.assertEqual(len(self._send(self._eyd(65536)).failed), 1)
+        eyd = self._eyd(100_000)
+        self.assertEqual(self._send(eyd).failed, [])
+        self.assertEqual(self._received(eyd), self.data)
+        self.assertEqual(len(eyd.list_files_and_dirs(APP_PATH)['uuids']), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+"""Тесты сообщения о ходе операции отправки/скачивания (модуль scheduler)."""
+
+import functools
+import os
+import shutil
+import tempfile
+import unittest
+from typing import List
+
+from encrypted_yd.connector import ConnectorLocalFS
+from encrypted_yd.cryptography import CryptodomeAES
+from encrypted_yd.encrypted_yd import EncryptedYandexDisk
+from encrypted_yd.scheduler import TransferProgress
+
+APP_PATH = '/Приложения/test'
+PASSWORD = 'password'
+SIZE = 2 * 1024 * 1024
+
+
+class ProgressTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.work_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.work_dir)
+        self.src = os.path.join(self.work_dir, 'src')
+        self.dst = os.path.join(self.work_dir, 'dst')
+        os.makedirs(self.src)
+        os.makedirs(self.dst)
+        root = os.path.join(self.work_dir, 'remote')
+        os.makedirs(os.path.join(root, 'disk', *APP_PATH.strip('/').split('/')))
+        with open(os.path.join(self.src, 'big'), 'wb') as f:
+            f.write(os.urandom(SIZE))
+        token = CryptodomeAES(PASSWORD.encode('utf-8')).encrypt_data(b'token')
+        # Скорость передачи ограничена, чтобы файл передавался дольше интервала между сообщениями о ходе операции
+        self.eyd = EncryptedYandexDisk(APP_PATH, token, PASSWORD,
+                                       connector=functools.partial(ConnectorLocalFS, root=root, bandwidth=SIZE // 2),
+                                       part_size=SIZE // 4, part_workers=2)
+
+    def _check(self, reports: List[TransferProgress]) -> None:
+        # О ходе передачи единственного файла сообщается до ее завершения
+        partial = [_ for _ in reports if not _.done_files]
+        self.assertTrue(partial)
+        self.assertTrue(all(0 < _.done_bytes <= SIZE and _.eta is not None for _ in partial))
+        self.assertEqual([_.done_bytes for _ in reports], sorted(_.done_bytes for _ in reports))
+        self.assertEqual((reports[-1].done_files, reports[-1].done_bytes), (1, SIZE))
+
+    def _transfer(self, multipart_threshold: int) -> None:
+        reports: List[TransferProgress] = []
+        self.eyd.send_files_and_dirs(self.src, APP_PATH, multipart_threshold=multipart_threshold,
+                                     progress=reports.append)
+        self._check(reports)
+        reports.clear()
+        self.eyd.receive_files_and_dirs(self.dst, APP_PATH, progress=reports.append)
+        self._check(reports)
+
+    def test_single_file(self) -> None:
+        self._transfer(multipart_threshold=2 * SIZE)
+
+    def test_multipart_file(self) -> None:
+        self._transfer(multipart_threshold=1)
+
+
+if __name__ == '__main__':
+    unittest.main()